@@ -0,0 +1,293 @@
+"""
+Пакетный векторный движок: K независимых реплик одной и той же дороги (разные зёрна, одна
+конфигурация) выполняются синхронно, с общими часами, в одном Fleet. У каждого авто есть
+номер реплики 'replication', а ключ его полосы (vector_road.VectorRoad.get_lane_keys) -
+replication * lanes_number + lane, поэтому авто разных реплик не видят друг друга, а смена
+полосы и продольное движение всех реплик вычисляются одними и теми же операциями над
+массивами. Накладные расходы шага на вызовы NumPy делятся между репликами, и число
+авто-шагов в секунду растёт по сравнению с последовательным прогоном реплик (см.
+tests/test_batch_road.py).
+По отдельности, но внутри того же шага, для каждой реплики выполняются только выпуск авто,
+обновление знаков (статистика секций всех реплик считается одним np.bincount) и запись
+поездок. Случайные числа каждой реплики берутся из её собственных генераторов в том же
+порядке, что и у vector_road.VectorRoad, а порядок авто реплики в Fleet совпадает с порядком
+в её собственном Fleet, поэтому результат каждой реплики в точности совпадает с отдельным
+прогоном vector_road.VectorRoad с тем же зерном. Реплика, завершившая работу, убирается из
+пакета на том же шаге, на котором остановился бы её отдельный прогон.
+Адаптивный шаг (step_control) и запись траекторий пакетом не поддерживаются.
+"""
+
+import numpy as np
+
+import clock
+import vector_road
+
+batch_columns = vector_road.fleet_columns + [('replication', np.int64, 1)]
+
+def get_complex_keys(keys, values):
+    """
+    Комплексные числа keys + 1j * values: NumPy сравнивает их лексикографически, сначала по
+    ключу, затем по значению, поэтому поиск и накопленный максимум внутри отрезков с одним
+    ключом выполняются одним вызовом и без потери точности.
+    """
+    result = np.empty(len(keys), dtype = complex)
+    result.real = keys
+    result.imag = values
+    return result
+
+class Replication(vector_road.VectorRoad):
+    """
+    Реплика пакета: свои контекст, генераторы, знаки, источники авто и статистика поездок,
+    но авто лежат в общем Fleet пакета.
+    """
+    def __init__(self, number, context, updater, adaptive_top_speed, consumption_grid = None):
+        vector_road.VectorRoad.__init__(self, context, updater, adaptive_top_speed,
+            consumption_grid)
+        self.number = number
+        self.finished = False
+
+    def add_car(self, new_car):
+        new_car['replication'] = self.number
+        self.fleet.add(new_car)
+
+    def get_rows(self):
+        n = self.fleet.size
+        return np.flatnonzero(self.fleet.replication[:n] == self.number)
+
+    def get_car_x(self, car_id):
+        # то же, что Fleet.find, среди авто реплики
+        rows = self.get_rows()
+        position = int(np.searchsorted(self.fleet.id[rows], car_id))
+        if (position < len(rows) and self.fleet.id[rows[position]] == car_id):
+            return self.fleet.x_coordinate[rows[position]]
+        return None
+
+    def is_finished(self):
+        rows = self.get_rows()
+        return self.is_production_finished() and not np.any(self.fleet.lane[rows] > 0)
+
+class BatchRoad(vector_road.VectorRoad):
+    def __init__(self, contexts, updaters, adaptive_top_speed, consumption_grid = None):
+        """
+        contexts и updaters - контексты и Updater реплик, построенные с одной конфигурацией
+        дороги (обычно они отличаются только зерном).
+        """
+        first = contexts[0]
+        for my_context in contexts:
+            if (my_context.lanes_number != first.lanes_number
+                    or my_context.road_length != first.road_length
+                    or my_context.sections_number != first.sections_number
+                    or len(my_context.on_ramps) != len(first.on_ramps)
+                    or len(my_context.off_ramps) != len(first.off_ramps)):
+                raise ValueError("BatchRoad requires replications of the same road")
+        vector_road.VectorRoad.__init__(self, first, updaters[0], adaptive_top_speed,
+            consumption_grid)
+        self.replications = [Replication(number, contexts[number], updaters[number],
+            adaptive_top_speed, consumption_grid) for number in range(len(contexts))]
+        self.vehicle_steps = 0
+
+    def init_state(self):
+        now = self.context.clock.now()
+        self.fleet = vector_road.Fleet(lanes_number = self.context.lanes_number,
+            columns = batch_columns)
+        for replication in self.replications:
+            replication.init_state()
+            replication.fleet = self.fleet
+        self.init_ramps()
+        self.cur_time = now
+        self.rows = []
+        self.vehicle_steps = 0
+
+    def get_active_replications(self):
+        return [replication for replication in self.replications if not replication.finished]
+
+    def get_lane_keys(self, lanes):
+        n = len(lanes)
+        return self.fleet.replication[:n] * self.context.lanes_number + lanes
+
+    def get_lane_keys_number(self):
+        return len(self.replications) * self.context.lanes_number
+
+    def get_replication_rows(self):
+        """
+        Номера строк Fleet каждой реплики в порядке возрастания.
+        """
+        n = self.fleet.size
+        replications = self.fleet.replication[:n]
+        order = np.argsort(replications, kind = 'stable')
+        bounds = np.searchsorted(replications[order], np.arange(len(self.replications) + 1))
+        return [order[bounds[number]:bounds[number + 1]]
+            for number in range(len(self.replications))]
+
+    def draw_random(self, name, size):
+        values = np.empty(size)
+        for replication, rows in zip(self.replications, self.rows):
+            if (len(rows) > 0):
+                values[rows] = getattr(replication.context.random, name).random_array(len(rows))
+        return values
+
+    def get_section_statistics(self):
+        """
+        Сумма скоростей и количество авто на секциях полос всех реплик (массивы формы
+        (replications_number, sections_number, lanes_number)), как в
+        speed_manager.Updater.get_section_statistics.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        replications_number = len(self.replications)
+        sections_number = self.context.sections_number
+        lanes_number = self.context.lanes_number
+        x_coordinates = fleet.x_coordinate[:n]
+        on_road = x_coordinates < self.context.road_length
+        section_numbers = (x_coordinates[on_road] / self.context.each_section_length).astype(int)
+        keys = ((fleet.replication[:n][on_road] * sections_number + section_numbers)
+            * lanes_number + fleet.lane[:n][on_road])
+        size = replications_number * sections_number * lanes_number
+        cars_number = np.bincount(keys, minlength = size).astype(float)
+        speeds_sum = np.bincount(keys, weights = fleet.speed[:n][on_road],
+            minlength = size).astype(float)
+        shape = (replications_number, sections_number, lanes_number)
+        return speeds_sum.reshape(shape), cars_number.reshape(shape)
+
+    def update_signs(self):
+        due = []
+        for replication in self.get_active_replications():
+            updater = replication.updater
+            if (updater.is_evaluation_time()
+                    and (updater.algorithm == 2 or updater.is_update_time())):
+                due.append(replication)
+        if (len(due) == 0):
+            return
+        speeds_sum, cars_number = self.get_section_statistics()
+        for replication in due:
+            replication.updater.update_speeds_on_statistics(speeds_sum[replication.number],
+                cars_number[replication.number])
+
+    def update_top_speeds(self, sections_max_speeds):
+        # знаки у каждой реплики свои, поэтому sections_max_speeds берутся из её контекста
+        fleet = self.fleet
+        n = fleet.size
+        times = fleet.top_speed_updated_times[:n]
+        rect_x = np.floor(fleet.x_coordinate[:n] + 0.5)
+        entered = ((self.context.each_section_length * times < rect_x) & (fleet.lane[:n] != 0)
+            & (times < len(sections_max_speeds)))
+        indices = np.flatnonzero(entered)
+        if (len(indices) == 0):
+            return
+        replications = fleet.replication[indices]
+        for number in np.unique(replications):
+            rows = indices[replications == number]
+            my_context = self.replications[number].context
+            for lane in range(1, self.context.lanes_number):
+                minimum = np.minimum(my_context.sections_max_speed[times[rows], lane],
+                    fleet.self_top_speed[rows])
+                fleet.cur_top_speed[rows, lane] = my_context.random.jitter.uniform_array(
+                    0.95 * minimum, 1.01 * minimum)
+        fleet.speed_increased[indices] = False
+        fleet.top_speed_updated_times[indices] += 1
+
+    def find_lane_change_targets(self, order, bounds, candidates, desirable_lane):
+        """
+        То же, что vector_road.VectorRoad.find_lane_change_targets, но полоса desirable_lane
+        берётся в реплике каждого кандидата: поиск ведётся сразу по всем отрезкам order с
+        ключами полос реплик.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        keys = self.get_lane_keys(fleet.lane[:n])[order]
+        x_sorted = fleet.x_coordinate[order]
+        sorted_cars = get_complex_keys(keys, x_sorted)
+        lane_ends = np.maximum.accumulate(get_complex_keys(keys,
+            x_sorted + fleet.width[order])).imag
+        target_keys = fleet.replication[candidates] * self.context.lanes_number + desirable_lane
+        lane_start = bounds[target_keys]
+        lane_end = bounds[target_keys + 1]
+        start = fleet.x_coordinate[candidates]
+        end = start + fleet.width[candidates]
+        position = np.searchsorted(sorted_cars, get_complex_keys(target_keys, start), 'left')
+        has_prev = position > lane_start
+        has_next = position < lane_end
+        prev_position = np.maximum(position - 1, lane_start)
+        intersection = ((has_prev & (lane_ends[np.minimum(prev_position, n - 1)] >= start))
+            | (np.searchsorted(sorted_cars, get_complex_keys(target_keys, end), 'right')
+            > position))
+        # на пустой полосе соседями, как и в VectorRoad, считается сам кандидат
+        empty = lane_start == lane_end
+        prev = np.where(empty, candidates, order[np.minimum(prev_position, n - 1)])
+        nextt = np.where(empty, candidates, order[np.minimum(position, lane_end - 1)])
+        return intersection, has_prev, has_next, prev, nextt
+
+    def record_trips(self, finished):
+        replications = self.fleet.replication[:self.fleet.size]
+        for number in np.unique(replications[finished]):
+            self.replications[number].record_trips(finished & (replications == number))
+
+    def retire_finished_replications(self):
+        """
+        Убирает из пакета реплики, отдельный прогон которых остановился бы перед этим шагом,
+        вместе с их оставшимися авто.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        main_lane_cars = np.bincount(fleet.replication[:n][fleet.lane[:n] > 0],
+            minlength = len(self.replications))
+        for replication in self.get_active_replications():
+            if (replication.is_production_finished() and main_lane_cars[replication.number] == 0):
+                replication.finished = True
+                fleet.remove(fleet.replication[:fleet.size] == replication.number)
+
+    def step(self):
+        now = self.context.clock.now()
+        self.context.delta_time = now - self.cur_time
+        self.cur_time = now
+        active = self.get_active_replications()
+        for replication in active:
+            replication.update_time(now)
+
+        # ----updating max speeds on sections----
+        self.update_signs()
+        # ---------------------------------------
+
+        for replication in active:
+            replication.produce_cars()
+            replication.add_cars()
+
+        if (self.fleet.size == 0):
+            return
+        self.vehicle_steps += self.fleet.size
+        self.rows = self.get_replication_rows()
+        self.update_lanes(now)
+        self.update_motion()
+        self.remove_finished_cars()
+
+    def is_finished(self):
+        return all(replication.finished for replication in self.replications)
+
+    def finish(self):
+        for replication in self.replications:
+            replication.finish()
+
+    def get_results(self):
+        """
+        Результаты vector_road.VectorRoad.get_results каждой реплики.
+        """
+        return [replication.get_results() for replication in self.replications]
+
+    def run(self, time_step = 0.05, max_time = None):
+        """
+        Безоконный прогон всех реплик с общим шагом time_step. Возвращает список результатов
+        реплик в порядке contexts.
+        """
+        simulated_clock = clock.SimulatedClock()
+        for replication in self.replications:
+            replication.context.clock = simulated_clock
+        self.init_state()
+        self.retire_finished_replications()
+        while not self.is_finished():
+            simulated_clock.advance(time_step)
+            self.step()
+            if (max_time != None and simulated_clock.now() >= max_time):
+                break
+            self.retire_finished_replications()
+        self.finish()
+        return self.get_results()
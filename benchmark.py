@@ -0,0 +1,229 @@
+"""
+Измерение производительности симуляции. Стандартные сценарии (свободное движение, затор
+у въезда, длинная дорога с большим количеством секций, длинная дорога с развязками через каждые
+'junction_interval': съезд, а за ним въезд) запускаются в безоконном режиме
+с фиксированным зерном для каждого из алгоритмов Updater, а сценарий 'merge' дополнительно
+запускается с разной плотностью потока, длиной дороги, длиной секций и количеством полос
+(кривые масштабирования).
+Каждый запуск выполняется трижды:
+    1. без замеров - для количества шагов и авто-шагов (сумма количеств авто на дороге
+       по всем шагам) в секунду;
+    2. с замером времени по фазам шага (в секундах на шаг) через
+       instrumentation.Instrumentation (Road.step_instrumented): появление авто, обновление
+       знаков, смена полосы, продольное движение и отрисовка каждого 'render_every'-го шага
+       (в окно драйвера SDL 'dummy', без ограничения частоты кадров). Замеры сами замедляют
+       симуляцию, поэтому скорость берётся из первого прогона;
+    3. под tracemalloc - для пикового объёма памяти, выделенной симуляцией.
+Результаты записываются в формате JSON вместе с версиями Python и библиотек, чтобы сравнивать
+их между версиями программы.
+
+Запуск: python benchmark.py results.json [max_time] [render_every]
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pygame
+
+import clock
+import context
+import demand
+import example
+import instrumentation
+import ramps
+import renderer
+import road
+import speed_manager
+
+"""
+Параметры сценариев; 'density' делит средние интервалы между появлениями авто 'mean_intervals'.
+"""
+scenarios = {'free_flow': {'road_length': 10000,
+                        'on_ramp_start': 2000,
+                        'on_ramp_end': 3000,
+                        'each_section_length': 1000.0,
+                        'mean_intervals': [[60.0, 8.0, 8.0]] * 3},
+            'merge': {'road_length': 10000,
+                    'on_ramp_start': 2000,
+                    'on_ramp_end': 3000,
+                    'each_section_length': 1000.0,
+                    'mean_intervals': example.time_intervals},
+            'corridor': {'road_length': 50000,
+                        'on_ramp_start': 2000,
+                        'on_ramp_end': 3000,
+                        'each_section_length': 250.0,
+                        'mean_intervals': [[9.0, 3.0, 3.0]] * 3},
+            'junctions': {'road_length': 50000,
+                        'on_ramp_start': 2000,
+                        'on_ramp_end': 3000,
+                        'each_section_length': 1000.0,
+                        'mean_intervals': [[9.0, 3.0, 3.0]] * 3,
+                        'junction_interval': 5000,
+                        'ramp_mean_interval': 12.0,
+                        'exit_fraction': 0.15}}
+
+default_parameters = {'algorithm': 2,
+                    'adaptive_top_speed': True,
+                    'density': 1.0,
+                    'seed': 0,
+                    'lanes_number': 3,
+                    'junction_interval': None,
+                    'time_step': example.time_step,
+                    'max_time': 300.0}
+
+algorithms = [0, 1, 2]
+
+scaling_curves = {'density': [0.5, 1.0, 2.0, 4.0],
+                'road_length': [5000, 10000, 20000, 40000],
+                'each_section_length': [2000.0, 1000.0, 500.0, 250.0],
+                'lanes_number': [3, 4, 5, 7]}
+
+phases = ['production', 'sign_update', 'lane_change', 'longitudinal', 'render']
+
+def make_runs(max_time):
+    runs = []
+    for name in scenarios:
+        for algorithm in algorithms:
+            parameters = dict(default_parameters)
+            parameters.update(scenarios[name])
+            parameters.update({'algorithm': algorithm, 'max_time': max_time})
+            runs.append((name, None, parameters))
+    for curve in scaling_curves:
+        for value in scaling_curves[curve]:
+            parameters = dict(default_parameters)
+            parameters.update(scenarios['merge'])
+            parameters.update({curve: value, 'max_time': max_time})
+            runs.append(('merge', curve, parameters))
+    return runs
+
+def make_road(parameters, my_instrumentation = None):
+    my_context = context.SimulationContext(parameters['road_length'],
+        parameters['on_ramp_start'], parameters['on_ramp_end'], 710, parameters['seed'],
+        parameters['lanes_number'])
+    mean_intervals = [[interval / parameters['density'] for interval in hour]
+        for hour in demand.extend_to_lanes(parameters['mean_intervals'], my_context.lanes_number)]
+    my_context.demand = demand.Demand(mean_intervals, my_context.random.arrivals)
+    my_context.demand.first_interval_scale[1] = 0.5
+    junction_interval = parameters['junction_interval']
+    if (junction_interval != None):
+        for junction in range(junction_interval, parameters['road_length'], junction_interval):
+            ramps.add_off_ramp(my_context, junction, parameters['exit_fraction'])
+            ramps.add_on_ramp(my_context, junction + 500, junction + 1300,
+                [parameters['ramp_mean_interval'] / parameters['density']] * 3)
+    updater = speed_manager.Updater(my_context, parameters['each_section_length'],
+        parameters['algorithm'], parameters['adaptive_top_speed'])
+    updater.fill_sections()
+    my_road = road.Road(my_context, updater, parameters['adaptive_top_speed'],
+        instrumentation = my_instrumentation)
+    my_road.context.clock = clock.SimulatedClock()
+    my_road.init_state()
+    return my_road
+
+def get_cars_number(my_road):
+    return sum(len(cars) for cars in my_road.pygame_cars_list)
+
+def run_plain(parameters):
+    my_road = make_road(parameters)
+    steps = 0
+    vehicle_steps = 0
+    start = time.perf_counter()
+    while (not my_road.is_finished() and my_road.context.clock.now() < parameters['max_time']):
+        my_road.context.clock.advance(parameters['time_step'])
+        my_road.step()
+        steps += 1
+        vehicle_steps += get_cars_number(my_road)
+    elapsed = time.perf_counter() - start
+    my_road.finish()
+    return steps, vehicle_steps, elapsed
+
+def get_phase_times(my_instrumentation, render_time):
+    """
+    Фазы бенчмарка из фаз Instrumentation: продольное движение - всё обновление авто, кроме
+    смены полосы (вместе с обновлением индекса полос).
+    """
+    times = my_instrumentation.times
+    return {'production': times['hour'] + times['produce_car'] + times['add_car_on_road'],
+            'sign_update': times['update_speeds'],
+            'lane_change': times['update_lane'],
+            'longitudinal': times['update'] - times['update_lane'],
+            'render': render_time}
+
+def run_profiled(parameters, render_every):
+    my_instrumentation = instrumentation.Instrumentation()
+    my_road = make_road(parameters, my_instrumentation)
+    road_renderer = None
+    screen = None
+    if (render_every > 0):
+        screen = pygame.display.set_mode(my_road.scr_size)
+        road_renderer = renderer.Renderer(my_road.context, my_road.scr_size, render_every, 0)
+    render_time = 0.0
+    while (not my_road.is_finished() and my_road.context.clock.now() < parameters['max_time']):
+        my_road.context.clock.advance(parameters['time_step'])
+        my_road.step()
+        if (road_renderer != None and road_renderer.is_due()):
+            start = time.perf_counter()
+            x_coordinates, y_coordinates, car_types = my_road.get_visible_cars(0,
+                screen.get_width())
+            road_renderer.draw(screen, 0, x_coordinates, y_coordinates, car_types,
+                pygame.Rect(0, 0, 0, 0), pygame.Rect(0, 0, 0, 0))
+            render_time += time.perf_counter() - start
+    my_road.finish()
+    return get_phase_times(my_instrumentation, render_time)
+
+def get_peak_memory(parameters):
+    tracemalloc.start()
+    run_plain(parameters)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run_benchmark(name, curve, parameters, render_every = 10):
+    steps, vehicle_steps, elapsed = run_plain(parameters)
+    times = run_profiled(parameters, render_every)
+    peak_memory = get_peak_memory(parameters)
+    return {'scenario': name,
+            'curve': curve,
+            'value': parameters[curve] if curve != None else None,
+            'parameters': parameters,
+            'steps': steps,
+            'vehicle_steps': vehicle_steps,
+            'time': elapsed,
+            'steps_per_second': steps / elapsed,
+            'vehicle_steps_per_second': vehicle_steps / elapsed,
+            'peak_memory': peak_memory,
+            'phases': dict((phase, times[phase] / max(steps, 1)) for phase in phases)}
+
+def get_versions():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'platform': platform.platform()}
+
+def main(output_path, max_time = default_parameters['max_time'], render_every = 10):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    results = []
+    for name, curve, parameters in make_runs(max_time):
+        result = run_benchmark(name, curve, parameters, render_every)
+        results.append(result)
+        print(name, curve, result['value'], parameters['algorithm'],
+            '%.1f steps/s' % result['steps_per_second'])
+    pygame.quit()
+    with open(output_path, 'w') as output:
+        json.dump({'versions': get_versions(), 'results': results}, output, indent = 1)
+
+if __name__ == '__main__':
+    if (len(sys.argv) < 2):
+        print ("Args : results.json [max_time] [render_every]")
+        sys.exit(0)
+    max_time = default_parameters['max_time']
+    if (len(sys.argv) > 2):
+        max_time = float(sys.argv[2])
+    render_every = 10
+    if (len(sys.argv) > 3):
+        render_every = int(sys.argv[3])
+    main(sys.argv[1], max_time, render_every)
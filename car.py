@@ -6,34 +6,32 @@
 движения, что имеет строгую математическую интерпретацию и выражается в математических формулах.
 Помимо этого класс car считает количество потребляемого топлива, опираясь на математическую
 модель VT-micro.
+Авто хранит только состояние симуляции (атрибуты перечислены в __slots__, без словаря
+атрибутов), изображений у авто нет: их по одному на тип авто создаёт renderer и только
+при отрисовке. Авто одной полосы хранятся в CarGroup.
 """
 
-import pygame
-import time
-import numpy as np
 import math
-import random
+
+import context as context_module
+import fuel
+import ramps
 
 jam_speed = 10.0
 trash_speed = 40.0
 
 max_acceleration = 8.34
 
+lane_check_speed_threshold = 5.0
+
 """
-Коэффициенты 'consumption_coefficients' были взяты из модели VT-micro, оценивающая расход топлива
-автомобиля в зависимости от текущих скорости и ускорения. 
+Коэффициенты модели VT-micro, оценивающей расход топлива автомобиля в зависимости от текущих
+скорости и ускорения, находятся в модуле fuel. Функции get_cons и calculate_consumption оставлены
+как эталонная реализация, при движении используется fuel.get_consumption_and_emissions.
 """
-consumption_coefficients = [[[-0.679439, 0.029665, -0.000276, 0.0000015],
-                            [0.135273, 0.004808, -0.000020, 5.5409E-8],
-                            [0.015946, 0.000083, 0.0000009, -2.47964E-8],
-                            [-0.001189, -0.000061, 0.0000003, -4.467234E-9]],
-                            
-                            [[0.887447, 0.070994, -0.000786, 0.0000046],
-                           [0.148841, 0.003870, 0.0000932, -0.0000007],
-                            [0.030550, -0.000926, 0.0000491, -0.0000003],
-                            [-0.001348, 0.0000461, -0.00000141, 8.1724E-9]]]
-
-coeff = [100.0 * 4.0, 1.0  * 3.6 / 1000.0]
+consumption_coefficients = fuel.consumption_coefficients
+
+coeff = fuel.coeff
 
 def get_cons(speed, acc, k):
     consumption = 0.0
@@ -42,8 +40,8 @@ def get_cons(speed, acc, k):
             consumption += (consumption_coefficients[k][i][j] * pow(acc, i) * pow(speed / 1.08, j))
     return consumption
 
-def calculate_consumption(prev_speed, new_speed, k):
-    acc = (new_speed - prev_speed) / Car.delta_time
+def calculate_consumption(prev_speed, new_speed, k, delta_time):
+    acc = (new_speed - prev_speed) / delta_time
     speed = new_speed
     consumption = 0.0
     if (abs(acc) > 10):
@@ -91,73 +89,138 @@ def get_safe_speed_agressive(speed, next_speed, x_coordinate, next_x_coordinate,
     safe_speed += dec * braking_time * braking_time / (2.0 * (braking_time + reaction_time))
     return safe_speed
 
+def get_braking_probability(speed, lane, x_coordinate, braking_end):
+    """
+    Вероятность случайного торможения авто на шаге; braking_end - конец полосы разгона въезда,
+    который управляет точкой x_coordinate (ramps.get_braking_end).
+    """
+    if (x_coordinate > braking_end or speed < 40.0):
+        return 0.05
+    if (lane >= 2):
+        return 0.08
+    return 0.3
+
+def get_rect_x(x_coordinate):
+    """
+    Координата, округлённая до целого пикселя так же, как её округляет pygame.Rect
+    (половины от нуля).
+    """
+    if (x_coordinate >= 0.0):
+        return int(math.floor(x_coordinate + 0.5))
+    return -int(math.floor(0.5 - x_coordinate))
+
+class CarGroup():
+    """
+    Авто одной полосы в порядке их добавления, как в pygame.sprite.Group.
+    """
+    def __init__(self):
+        self.cars = {}
+
+    def add(self, carr):
+        self.cars[carr] = None
+
+    def remove(self, carr):
+        self.cars.pop(carr, None)
+
+    def __len__(self):
+        return len(self.cars)
 
-class Car(pygame.sprite.Sprite):
-    def __init__(self, startX, startY, lane, self_top_speed, acceleration, deceleration, width,
-            height, nextt, prev, adaptive_top_speed, color, car_type):
-        pygame.sprite.Sprite.__init__(self)
+    def __iter__(self):
+        return iter(list(self.cars))
+
+    def update(self, cars_list):
+        for carr in list(self.cars):
+            carr.update(cars_list)
+
+class Car():
+    __slots__ = ('context', 'id', 'self_top_speed', 'speed', 'cur_top_speed', 'acceleration',
+        'deceleration', 'width', 'rect_x', 'x_coordinate', 'y_coordinate', 'lane', 'lanes_visited',
+        'start_time', 'life_time', 'prev', 'next', 'top_speed_updated_times', 'tracked_section',
+        'tracked_lane', 'tracked_end', 'adaptive_top_speed', 'consumption', 'emissions',
+        'consumption_number', 'movement_up', 'movement_down', 'car_type', 'braking_probability',
+        'time_on_left', 'speed_increased', 'br_pr', 'only_right', 'ramp', 'exit_ramp',
+        'lane_check_time', 'lane_check_next', 'lane_check_top_speed', 'lane_check_speed',
+        'lane_check_next_speed')
+
+    def __init__(self, context, startX, startY, lane, self_top_speed, acceleration, deceleration,
+            width, nextt, prev, adaptive_top_speed, car_type, ramp = None):
+        """
+        ramp - въезд (ramps.OnRamp), на полосе разгона которого появилось авто; съезд,
+        которым авто покинет дорогу (exit_ramp), назначает дорога.
+        """
+        self.context = context
+        self.id = -1
         self.self_top_speed = self_top_speed
         if (lane > 0):
             self.speed = self_top_speed
-            self.cur_top_speed = [self_top_speed, self_top_speed, self_top_speed]
+            self.cur_top_speed = [self_top_speed] * context.lanes_number
         else:
             self.speed = 0.8 * self_top_speed
-            self.cur_top_speed = [0.8 * self_top_speed, 0.8 * self_top_speed, 0.8 * self_top_speed]
-        self.acceleration = random.uniform(0.95 * acceleration, 1.05 * acceleration)
-        self.deceleration = random.uniform(0.95 * deceleration, 1.05 * deceleration)
+            self.cur_top_speed = [0.8 * self_top_speed] * context.lanes_number
+        jitter = self.context.random.jitter
+        self.acceleration = jitter.uniform(0.95 * acceleration, 1.05 * acceleration)
+        self.deceleration = jitter.uniform(0.95 * deceleration, 1.05 * deceleration)
         self.width = width
-        self.image = pygame.Surface((width, height))
-        self.image.fill(color)
-        self.rect = pygame.Rect(startX, startY, width, height)
-        self.startX = startX
+        self.rect_x = get_rect_x(startX)
         self.x_coordinate = 1.0 * startX
         self.y_coordinate = 1.0 * startY
         self.lane = lane
-        self.start_time = time.time()
+        self.lanes_visited = 1 << lane
+        self.start_time = self.context.clock.now()
         self.life_time = 0.0
         self.prev = prev
         self.next = nextt
         self.top_speed_updated_times = 0
+        self.tracked_section = None
+        self.tracked_lane = lane
+        self.tracked_end = 0.0
         self.adaptive_top_speed = adaptive_top_speed
         self.consumption = 0.0
         self.emissions = 0.0
-        self.consumption_number = 1
+        self.consumption_number = 0.0
         self.movement_up = False
         self.movement_down = False
         self.car_type = car_type
-        self.braking_probability = [0.0, 0.0, 0.0]
+        self.braking_probability = 0.0
         if (self.lane == 0):
-            self.braking_probability = [0.0, 0.2, 0.0]
-        self.time_on_left = time.time()
+            self.braking_probability = 0.2
+        self.time_on_left = self.context.clock.now()
         self.speed_increased = False
-        self.decel_start = time.time() - 10000.0
-        self.decel_duration = 0.0
-        self.decel_prev_attempt = time.time()
         self.br_pr = 0.3
         self.only_right = False
-        if (np.random.binomial(1, 0.2) == 1):
+        if (self.context.random.types.bernoulli(0.2)):
             self.only_right = True
+        self.ramp = ramp
+        self.exit_ramp = None
+        self.lane_check_time = -math.inf
+        self.lane_check_next = None
+        self.lane_check_top_speed = 0.0
+        self.lane_check_speed = 0.0
+        self.lane_check_next_speed = 0.0
 
     def find_next(self, cars_list):
-        for carr in cars_list[self.lane]:
-            if (carr != self):
-                if (self.next == None):
-                    self.next = carr
-                else:
-                    if (carr.x_coordinate < self.next.x_coordinate):
-                        self.next = carr
-        if (self.next != None):
-            self.next.prev = self
+        self.context.lane_index.add(self)
 
     def update_top_speed(self):
-        if (Car.each_section_length * self.top_speed_updated_times < self.rect.x
+        if (self.context.each_section_length * self.top_speed_updated_times < self.rect_x
                 and self.lane != 0):
-            for lane in range(1, 3):
-                minimum = min(Car.sections[self.top_speed_updated_times].max_speed[lane],
+            for lane in range(1, self.context.lanes_number):
+                minimum = min(self.context.sections[self.top_speed_updated_times].max_speed[lane],
                     self.self_top_speed)
-                self.cur_top_speed[lane] = random.uniform(0.95 * minimum, 1.01 * minimum)
+                self.cur_top_speed[lane] = self.context.random.jitter.uniform(0.95 * minimum,
+                    1.01 * minimum)
             self.speed_increased = False
             self.top_speed_updated_times += 1
+
+    def update_section_statistics(self):
+        """
+        Вызывается, когда авто въехало в новую секцию или сменило полосу.
+        """
+        if (self.context.section_tracker != None):
+            self.context.section_tracker.move(self)
+        else:
+            self.tracked_lane = self.lane
+            self.tracked_end = float('inf')
     
     def get_safe_speed(self):
         if (self.next == None or self.speed <= self.next.speed):
@@ -172,26 +235,20 @@ class Car(pygame.sprite.Sprite):
         return safe_speed
 
     def find_prev_next(self, desirable_lane, cars_list):
-        prev = None
-        nextt = None
-        intersection = False
-        start = self.x_coordinate
-        end = self.x_coordinate + self.width
-        for carr in cars_list[desirable_lane].sprites():
-            car_start = carr.x_coordinate
-            car_end = carr.x_coordinate + carr.width
-            if ((start >= car_start and start <= car_end) or (end >= car_start and end <= car_end)
-                    or (car_start >= start and car_start <= end) 
-                    or (car_end >= start and car_end <= end)):
-                intersection = True
-                break
-            if (car_end < start and (prev == None or car_start > prev.x_coordinate)):
-                prev = carr
-            if (car_start > end and (nextt == None or car_start < nextt.x_coordinate)):
-                nextt = carr
-        return prev, nextt, intersection
+        if (self.context.instrumentation != None):
+            self.context.instrumentation.count('find_prev_next')
+        return self.context.lane_index.find_prev_next(desirable_lane, self.x_coordinate,
+            self.x_coordinate + self.width)
+
+    def count_lane_change(self, from_lane):
+        if (self.context.instrumentation != None):
+            self.context.instrumentation.count('lane_changes')
+            if (from_lane == 0):
+                self.context.instrumentation.count('merges')
 
     def is_safe_moving(self, intersection, prev, nextt):
+        if (self.context.instrumentation != None):
+            self.context.instrumentation.count('lane_change_attempts')
         if (intersection == True):
             return False
         same_lane = True
@@ -220,36 +277,59 @@ class Car(pygame.sprite.Sprite):
         return not same_lane
 
     def make_movement_down(self):
-        self.y_coordinate += (Car.delta_time * 20)
-        if (self.y_coordinate >= Car.height / 2 + 10):
+        self.y_coordinate += (self.context.delta_time * 20)
+        lane_y = context_module.get_lane_y(self.lane, self.context.height)
+        if (self.y_coordinate >= lane_y):
             self.movement_down = False
-            self.y_coordinate = Car.height / 2 + 10
-        self.rect.y = self.y_coordinate
+            self.y_coordinate = lane_y
 
     def make_movement_up(self):
-        self.y_coordinate -= (Car.delta_time * 20)
-        if (self.lane == 1):
-            if (self.y_coordinate <= Car.height / 2 + 10):
-                self.movement_up = False
-                self.y_coordinate = Car.height / 2 + 10
+        self.y_coordinate -= (self.context.delta_time * 20)
+        lane_y = context_module.get_lane_y(self.lane, self.context.height)
+        if (self.y_coordinate <= lane_y):
+            self.movement_up = False
+            self.y_coordinate = lane_y
+            if (self.lane == 1):
                 if (self.speed < 40.0):
-                    self.braking_probability[1] = 0.01
-        elif (self.lane == 2):
-            if (self.y_coordinate <= Car.height / 2 - 15):
-                self.movement_up = False
-                self.y_coordinate = Car.height / 2 - 15
-                self.time_on_left = time.time()
+                    self.braking_probability = 0.01
+            else:
+                self.time_on_left = self.context.clock.now()
                 self.speed_increased = False
-        self.rect.y = self.y_coordinate
+
+    def change_lane(self, new_lane, cars_list):
+        old_lane = self.lane
+        self.lane = new_lane
+        self.context.lane_index.move(self, old_lane)
+        self.lanes_visited |= 1 << self.lane
+        self.lane_check_time = -math.inf
+        self.count_lane_change(old_lane)
+        cars_list[old_lane].remove(self)
+        cars_list[new_lane].add(self)
 
     def update(self, cars_list):
-        if (self.lane == 2 and not self.speed_increased and time.time() - self.time_on_left > 10.0):
+        instrumentation = self.context.instrumentation
+        if (instrumentation != None):
+            start = instrumentation.start()
+            self.update_lane(cars_list)
+            start = instrumentation.stop('update_lane', start)
+            self.update_motion(cars_list)
+            instrumentation.stop('update_motion', start)
+            return
+        self.update_lane(cars_list)
+        self.update_motion(cars_list)
+
+    def update_lane(self, cars_list):
+        """
+        Смена полосы: обновление желаемых скоростей, движение между полосами и решение о
+        перестроении.
+        """
+        if (self.lane >= 2 and not self.speed_increased and self.context.clock.now() - self.time_on_left > 10.0):
             self.cur_top_speed[self.lane] += 10.0
             self.speed_increased = True
-            self.time_on_left = time.time()
+            self.time_on_left = self.context.clock.now()
 
-        if (self.braking_probability[1] == 0.2 and self.x_coordinate > Car.on_ramp_end + 2000.0):
-            self.braking_probability[1] = 0.0
+        if (self.braking_probability == 0.2 and self.x_coordinate > self.ramp.end + 2000.0):
+            self.braking_probability = 0.0
 
         self.update_top_speed()
         
@@ -259,121 +339,169 @@ class Car(pygame.sprite.Sprite):
         if (self.movement_up):
             self.make_movement_up()
 
-        if (self.lane == 2 and not self.movement_down and not self.movement_up and self.x_coordinate > 50.0):
-            prev, nextt, intersection = self.find_prev_next(1, cars_list)
+        """
+        Со второй и более левых полос авто возвращается на полосу правее, если впереди на обеих
+        полосах свободно; с полос, левее которых есть полоса, оно обгоняет по полосе левее, если
+        впереди идущее мешает ехать с желаемой скоростью. Рассматриваются только соседние полосы.
+        Перед выбранным съездом авто перестраивается вправо при любой безопасной возможности и
+        не обгоняет.
+        Условия на собственной полосе проверяются раньше поиска соседей на соседней полосе,
+        поэтому авто, которому незачем перестраиваться, соседей не ищет. Неудавшаяся проверка
+        соседей может откладываться (см. is_lane_check_due).
+        """
+        exiting = (self.exit_ramp != None
+            and self.x_coordinate > self.exit_ramp.position - self.exit_ramp.approach)
+        check_due = self.lane_check_time == -math.inf or self.is_lane_check_due()
+        checked = False
+        skipped = False
+        if (self.lane >= 2 and not self.movement_down and not self.movement_up and self.x_coordinate > 50.0):
+            right_lane = self.lane - 1
             safe_speed = self.get_safe_speed()
-            safe_speed_other = 200.0
-            if (nextt != None):
-                safe_speed_other = get_safe_speed(self.speed, nextt.speed, self.x_coordinate,
-                    nextt.x_coordinate, self.width, self.deceleration)
-            if (safe_speed > self.cur_top_speed[2] and safe_speed_other > self.cur_top_speed[1]
-                    and self.is_safe_moving(intersection, prev, nextt)):
-                if (self.prev != None):
-                    self.prev.next = self.next
-                if (self.next != None):
-                    self.next.prev = self.prev
-                self.next = nextt
-                self.prev = prev
-                if (prev != None):
-                    prev.next = self
+            wants_right = exiting or safe_speed > self.cur_top_speed[self.lane]
+            if (wants_right and not check_due):
+                skipped = True
+            elif (wants_right):
+                checked = True
+                prev, nextt, intersection = self.find_prev_next(right_lane, cars_list)
+                safe_speed_other = 200.0
                 if (nextt != None):
-                    nextt.prev = self
-                self.lane = 1
-                cars_list[2].remove(self)
-                cars_list[1].add(self)
-                self.movement_down = True
-
-        if (self.lane == 1 and not self.movement_down and not self.movement_up and not self.only_right and self.x_coordinate > 50.0):
-            prev, nextt, intersection = self.find_prev_next(2, cars_list)
+                    safe_speed_other = get_safe_speed(self.speed, nextt.speed, self.x_coordinate,
+                        nextt.x_coordinate, self.width, self.deceleration)
+                if ((exiting or safe_speed_other > self.cur_top_speed[right_lane])
+                        and self.is_safe_moving(intersection, prev, nextt)):
+                    self.change_lane(right_lane, cars_list)
+                    self.movement_down = True
+
+        if (self.lane >= 1 and self.lane < self.context.lanes_number - 1 and not self.movement_down
+                and not self.movement_up and not self.only_right and not exiting
+                and self.x_coordinate > 50.0):
             safe_speed = self.get_safe_speed()
-            safe_speed_other = 200.0
-            if (nextt != None):
-                safe_speed_other = get_safe_speed(self.speed, nextt.speed, self.x_coordinate,
-                    nextt.x_coordinate, self.width, self.deceleration)
-            congested = (safe_speed < trash_speed) and (safe_speed_other < trash_speed)
-            if (safe_speed < self.cur_top_speed[1] and not congested
-                    and self.is_safe_moving(intersection, prev, nextt)):
-                if (self.prev != None):
-                    self.prev.next = self.next
-                if (self.next != None):
-                    self.next.prev = self.prev
-                self.next = nextt
-                self.prev = prev
-                if (prev != None):
-                    prev.next = self
+            wants_left = safe_speed < self.cur_top_speed[self.lane]
+            if (wants_left and not check_due):
+                skipped = True
+            elif (wants_left):
+                checked = True
+                prev, nextt, intersection = self.find_prev_next(self.lane + 1, cars_list)
+                safe_speed_other = 200.0
                 if (nextt != None):
-                    nextt.prev = self
-                self.lane = 2
-                cars_list[1].remove(self)
-                cars_list[2].add(self)
-                self.movement_up = True
+                    safe_speed_other = get_safe_speed(self.speed, nextt.speed, self.x_coordinate,
+                        nextt.x_coordinate, self.width, self.deceleration)
+                congested = (safe_speed < trash_speed) and (safe_speed_other < trash_speed)
+                if (not congested and self.is_safe_moving(intersection, prev, nextt)):
+                    self.change_lane(self.lane + 1, cars_list)
+                    self.movement_up = True
 
-        if (self.lane == 0 and self.x_coordinate > 50.0 + Car.on_ramp_start):
+        merging = self.lane == 0 and self.x_coordinate > 50.0 + self.ramp.start
+        if (merging and not check_due):
+            skipped = True
+        elif (merging):
+            checked = True
             prev, nextt, intersection = self.find_prev_next(1,cars_list)
             if (self.is_safe_moving(intersection, prev, nextt)):
-                if (self.prev != None):
-                    self.prev.next = self.next
-                if (self.next != None):
-                    self.next.prev = self.prev
-                self.next = nextt
-                self.prev = prev
-                if (prev != None):
-                    self.next = prev.next
-                    prev.next = self
-                if (nextt != None):
-                    self.prev = nextt.prev
-                    nextt.prev = self
-                self.lane = 1
-                cars_list[0].remove(self)
-                cars_list[1].add(self)
+                self.change_lane(1, cars_list)
                 self.movement_up = True
 
-        if (self.speed < 40.0):
-            self.br_pr = 0.05
-        else:
-            if (self.lane == 2):
-                self.br_pr = 0.08
-            else:
-                self.br_pr = 0.3
-        if (self.x_coordinate > Car.on_ramp_end):
-            self.br_pr = 0.05
+        if (checked and not self.movement_down and not self.movement_up):
+            self.postpone_lane_check()
+        if (skipped and self.context.instrumentation != None):
+            self.context.instrumentation.count('lane_checks_skipped')
+
+    def is_lane_check_due(self):
+        """
+        Если задан context.lane_change_cooldown, неудавшаяся проверка соседей для перестроения
+        повторяется не раньше, чем через lane_change_cooldown секунд, или раньше, если с момента
+        проверки сменилось впереди идущее авто, его или собственная скорость изменилась больше
+        чем на lane_check_speed_threshold или изменилась желаемая скорость на своей полосе.
+        Появление или уход ближайшего соседа на соседней полосе будит проверку сразу
+        (lane_index.LaneIndex.wake).
+        """
+        if (self.context.clock.now() >= self.lane_check_time
+                or self.next is not self.lane_check_next
+                or self.cur_top_speed[self.lane] != self.lane_check_top_speed
+                or abs(self.speed - self.lane_check_speed) > lane_check_speed_threshold
+                or (self.next != None and abs(self.next.speed - self.lane_check_next_speed)
+                > lane_check_speed_threshold)):
+            self.lane_check_time = -math.inf
+            return True
+        return False
+
+    def postpone_lane_check(self):
+        if (self.context.lane_change_cooldown == None):
+            return
+        self.lane_check_time = self.context.clock.now() + self.context.lane_change_cooldown
+        self.lane_check_next = self.next
+        self.lane_check_top_speed = self.cur_top_speed[self.lane]
+        self.lane_check_speed = self.speed
+        self.lane_check_next_speed = 0.0
+        if (self.next != None):
+            self.lane_check_next_speed = self.next.speed
+
+    def update_motion(self, cars_list):
+        """
+        Продольное движение: скорость, координата, расход топлива и выезд с дороги.
+        """
+        self.br_pr = get_braking_probability(self.speed, self.lane, self.x_coordinate,
+            ramps.get_braking_end(self.context, self.x_coordinate))
         
         new_speed = 0.0
         safe_speed = 0.0
         if (self.speed > self.cur_top_speed[self.lane]):
-            new_speed = self.speed - self.deceleration * Car.delta_time
+            new_speed = self.speed - self.deceleration * self.context.delta_time
         else:
-            if (self.lane == 0 and self.next == None):
-                    safe_speed = get_safe_speed(self.speed, 0.0, self.x_coordinate, Car.on_ramp_end,
+            if (self.lane == 0 and (self.next == None or self.next.ramp is not self.ramp)):
+                    safe_speed = get_safe_speed(self.speed, 0.0, self.x_coordinate, self.ramp.end,
                         self.width, self.deceleration)
             else:
                 safe_speed = self.get_safe_speed()
 
             new_speed = min(self.cur_top_speed[self.lane], self.speed
-                + self.acceleration * Car.delta_time, safe_speed)
-            if (np.random.binomial(1, self.br_pr) == 1):
-                new_speed -= self.deceleration * Car.delta_time
+                + self.acceleration * self.context.delta_time, safe_speed)
+            if (self.context.random.braking.bernoulli(self.br_pr)):
+                new_speed -= self.deceleration * self.context.delta_time
 
             if (self.lane > 0):
                 new_speed = max(new_speed, 10.0)
             else:
                 new_speed = max(new_speed, 0.0)
 
-        self.consumption += calculate_consumption(self.speed, new_speed, 0)
-        self.emissions += calculate_consumption(self.speed, new_speed, 1)
-        self.consumption_number += 1
+        consumption, emissions = fuel.get_consumption_and_emissions(self.speed, new_speed,
+            self.context.delta_time)
+        # расход и выбросы взвешиваются длительностью шага, чтобы при адаптивном шаге
+        # короткие шаги в заторе не весили больше длинных
+        self.consumption += consumption * self.context.delta_time
+        self.emissions += emissions * self.context.delta_time
+        self.consumption_number += self.context.delta_time
         self.speed = new_speed
-        self.consumption_number += 1
+        self.consumption_number += self.context.delta_time
 
-        self.x_coordinate += self.speed * Car.delta_time
-        self.rect.x = self.x_coordinate
+        self.x_coordinate += self.speed * self.context.delta_time
+        self.rect_x = get_rect_x(self.x_coordinate)
+        if (self.x_coordinate >= self.tracked_end or self.lane != self.tracked_lane):
+            self.update_section_statistics()
 
-        if (self.rect.x > Car.road_length):
-            self.life_time = time.time() - self.start_time
-            self.consumption /= self.consumption_number
-            self.emissions /= self.consumption_number
-            self.x_coordinate = 100000.0
-            cars_list[self.lane].remove(self)
-    
-    def draw(self, screen):
-        screen.blit(self.image, (self.rect.x, self.rect.y))
\ No newline at end of file
+        if (self.rect_x > self.context.road_length):
+            self.leave_road(cars_list)
+        elif (self.exit_ramp != None and self.x_coordinate >= self.exit_ramp.position):
+            if (self.lane == 1):
+                if (self.context.instrumentation != None):
+                    self.context.instrumentation.count('exits')
+                self.leave_road(cars_list)
+            else:
+                # не успело перестроиться и проезжает съезд
+                self.exit_ramp = None
+
+    def record_trip(self):
+        self.life_time = self.context.clock.now() - self.start_time
+        self.consumption /= self.consumption_number
+        self.emissions /= self.consumption_number
+        if (self.context.trips != None):
+            self.context.trips.record(self.car_type, self.lanes_visited, self.start_time,
+                self.start_time + self.life_time, self.consumption, self.emissions)
+
+    def leave_road(self, cars_list):
+        self.record_trip()
+        self.context.lane_index.remove(self, self.lane)
+        if (self.context.section_tracker != None):
+            self.context.section_tracker.remove(self)
+        self.x_coordinate = 100000.0
+        cars_list[self.lane].remove(self)
@@ -0,0 +1,259 @@
+"""
+Контрольные точки симуляции road.Road. В файл .npz (сжатый архив массивов NumPy) записывается
+всё изменяемое состояние дороги между шагами:
+    - авто на дороге (в порядке их обновления), авто в очередях появления и последние
+      выпущенные авто источников: все атрибуты из car.Car.__slots__ по столбцу на атрибут,
+      ссылки prev/next заменяются номерами строк, въезд и съезд - номерами в context.on_ramps
+      и context.off_ramps, порядок авто в индексе полос сохраняется;
+    - время часов, шаг времени, час, таймеры появления авто и счётчики выпущенных авто;
+    - значения знаков и время их изменения на секциях, таймеры Updater;
+    - состояние генераторов случайных чисел и потоков появления авто (вместе с ещё
+      не использованными числами из их буферов);
+    - накопленная статистика поездок.
+Конфигурация (длина дороги, въезды и съезды, секции, алгоритм знаков, средние интервалы)
+в контрольную точку не входит: при восстановлении дорога строится так же, как при обычном
+запуске, после чего restore заменяет её состояние. Поэтому от одной точки можно продолжить
+несколько вариантов с разными алгоритмами знаков или, задав seed, разными случайными
+последовательностями (реплики), не повторяя разгон дороги.
+Продолжение с контрольной точки без смены зерна совпадает с непрерывным прогоном в точности.
+"""
+
+import json
+import numpy as np
+
+import car
+import clock
+import random_streams
+
+"""
+Атрибуты авто - ссылки на другие авто (сохраняются номерами строк) и несохраняемые атрибуты;
+кроме них особо обрабатываются въезд, съезд, секция учёта и желаемые скорости по полосам,
+остальные атрибуты из __slots__ - числа или логические значения.
+"""
+car_links = ['prev', 'next', 'lane_check_next']
+car_skipped = ['context']
+
+"""
+Ссылка на авто, которое уже покинуло дорогу (номер строки -2): при восстановлении она заменяется
+объектом, не совпадающим ни с одним авто.
+"""
+departed_car = object()
+
+def get_demands(context):
+    """
+    Потоки появления авто: общий поток context.demand и собственные потоки въездов.
+    """
+    demands = [context.demand]
+    for ramp in context.on_ramps:
+        if (ramp.demand != None):
+            demands.append(ramp.demand)
+    return demands
+
+def get_index(values, value):
+    if (value == None):
+        return -1
+    return values.index(value)
+
+def collect_cars(my_road):
+    """
+    Все авто, которые нужно сохранить, и их расположение: -1 - на дороге, номер источника -
+    в очереди появления, -2 - уже покинувшие дорогу последние авто источников.
+    """
+    cars = []
+    places = []
+    for cars_group in my_road.pygame_cars_list:
+        for carr in cars_group:
+            cars.append(carr)
+            places.append(-1)
+    for source in range(len(my_road.sources)):
+        for carr in list(my_road.cars_queue[source].queue):
+            cars.append(carr)
+            places.append(source)
+    known = set(id(carr) for carr in cars)
+    for carr in my_road.last_car:
+        if (carr != None and id(carr) not in known):
+            known.add(id(carr))
+            cars.append(carr)
+            places.append(-2)
+    return cars, places
+
+def save(my_road, path):
+    my_context = my_road.context
+    cars, places = collect_cars(my_road)
+    rows = dict((id(carr), row) for row, carr in enumerate(cars))
+    arrays = {'car_place': np.array(places, dtype = np.int64)}
+    for name in car.Car.__slots__:
+        if (name in car_skipped):
+            continue
+        values = [getattr(carr, name) for carr in cars]
+        if (name in car_links):
+            values = [rows.get(id(value), -2) if value != None else -1 for value in values]
+        elif (name == 'ramp'):
+            values = [get_index(my_context.on_ramps, value) for value in values]
+        elif (name == 'exit_ramp'):
+            values = [get_index(my_context.off_ramps, value) for value in values]
+        elif (name == 'tracked_section'):
+            values = [-1 if value == None else value for value in values]
+        if (name == 'cur_top_speed'):
+            arrays['car_' + name] = np.array(values, dtype = np.float64).reshape(len(cars),
+                my_context.lanes_number)
+        else:
+            arrays['car_' + name] = np.array(values)
+    index_lanes = []
+    index_rows = []
+    for lane in range(len(my_context.lane_index.lanes)):
+        for carr in my_context.lane_index.lanes[lane]:
+            index_lanes.append(lane)
+            index_rows.append(rows[id(carr)])
+    arrays['index_lane'] = np.array(index_lanes, dtype = np.int64)
+    arrays['index_row'] = np.array(index_rows, dtype = np.int64)
+    arrays['sections_max_speed'] = my_context.sections_max_speed
+    arrays['sections_last_update'] = my_context.sections_last_update
+
+    random_state = {}
+    for name in random_streams.stream_names:
+        stream = getattr(my_context.random, name)
+        random_state[name] = stream.generator.bit_generator.state
+        arrays['random_' + name] = np.array(stream.buffer[stream.position:], dtype = np.float64)
+    demands_state = []
+    for number, demand in enumerate(get_demands(my_context)):
+        for lane in range(len(demand.units)):
+            arrays['demand_%d_%d' % (number, lane)] = np.array(
+                demand.units[lane][demand.positions[lane]:], dtype = np.float64)
+        demands_state.append({'current_units': demand.current_units,
+                            'produced': demand.produced,
+                            'first_interval_scale': demand.first_interval_scale})
+
+    trips = my_context.trips
+    arrays['trips'] = trips.get_records()
+    meta = {'time': my_context.clock.now(),
+            'delta_time': my_context.delta_time,
+            'hour': my_road.hour,
+            'start_time': my_road.start_time,
+            'cur_time': my_road.cur_time,
+            'next_id': my_road.next_id,
+            'cars_number': my_road.cars_number,
+            'produced': my_road.produced,
+            'prev_car_time': my_road.prev_car_time,
+            'last_car': [rows[id(carr)] if carr != None else -1 for carr in my_road.last_car],
+            'max_width': my_context.lane_index.max_width,
+            'last_update_time': my_road.updater.last_update_time,
+            'last_update_time_each_lane': my_road.updater.last_update_time_each_lane,
+            'last_evaluation_time': my_road.updater.last_evaluation_time,
+            'random': random_state,
+            'demands': demands_state,
+            'statistics': [[statistics.count, statistics.mean, statistics.m2]
+                for statistics in [trips.time, trips.consumption, trips.emissions]]}
+    np.savez_compressed(path, meta = np.array(json.dumps(meta)), **arrays)
+
+def restore_cars(my_road, data):
+    my_context = my_road.context
+    places = data['car_place']
+    cars = [car.Car.__new__(car.Car) for row in range(len(places))]
+    columns = dict((name, data['car_' + name].tolist()) for name in car.Car.__slots__
+        if name not in car_skipped)
+    for row in range(len(cars)):
+        carr = cars[row]
+        carr.context = my_context
+        for name in columns:
+            value = columns[name][row]
+            if (name in car_links):
+                if (value >= 0):
+                    value = cars[value]
+                else:
+                    value = departed_car if value == -2 else None
+            elif (name == 'ramp'):
+                value = my_context.on_ramps[value] if value >= 0 else None
+            elif (name == 'exit_ramp'):
+                value = my_context.off_ramps[value] if value >= 0 else None
+            elif (name == 'tracked_section'):
+                value = value if value >= 0 else None
+            setattr(carr, name, value)
+    return cars, places.tolist()
+
+def restore(my_road, path, seed = None):
+    """
+    Восстанавливает состояние дороги my_road из контрольной точки path. Дорога должна быть
+    построена с той же конфигурацией и подготовлена init_state. Если задано зерно seed,
+    генераторы случайных чисел после восстановления порождаются от него заново.
+    """
+    my_context = my_road.context
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        cars, places = restore_cars(my_road, data)
+
+        my_road.pygame_cars_list = [car.CarGroup() for lane in range(my_context.lanes_number)]
+        for source in range(len(my_road.sources)):
+            my_road.cars_queue[source].queue.clear()
+        for carr, place in zip(cars, places):
+            if (place == -1):
+                my_road.pygame_cars_list[carr.lane].add(carr)
+            elif (place >= 0):
+                my_road.cars_queue[place].put(carr)
+        lane_index = my_context.lane_index
+        lane_index.lanes = [[] for lane in range(my_context.lanes_number)]
+        for lane, row in zip(data['index_lane'].tolist(), data['index_row'].tolist()):
+            lane_index.lanes[lane].append(cars[row])
+        lane_index.max_width = meta['max_width']
+        if (my_context.section_tracker != None):
+            tracker = my_context.section_tracker
+            tracker.cars_number[:] = 0
+            for carr, place in zip(cars, places):
+                if (place == -1 and carr.tracked_section != None):
+                    tracker.cars_number[carr.tracked_section, carr.tracked_lane] += 1
+
+        my_context.sections_max_speed[:] = data['sections_max_speed']
+        my_context.sections_last_update[:] = data['sections_last_update']
+
+        for name in random_streams.stream_names:
+            stream = getattr(my_context.random, name)
+            stream.generator.bit_generator.state = meta['random'][name]
+            stream.buffer = data['random_' + name].tolist()
+            stream.position = 0
+        for number, demand in enumerate(get_demands(my_context)):
+            state = meta['demands'][number]
+            demand.units = [data['demand_%d_%d' % (number, lane)].tolist()
+                for lane in range(len(demand.units))]
+            demand.positions = [0] * len(demand.units)
+            demand.current_units = state['current_units']
+            demand.produced = state['produced']
+            demand.first_interval_scale = state['first_interval_scale']
+
+        trips = my_context.trips
+        trips.set_records(data['trips'])
+
+    for statistics, values in zip([trips.time, trips.consumption, trips.emissions],
+            meta['statistics']):
+        statistics.count, statistics.mean, statistics.m2 = values
+    my_context.clock = clock.SimulatedClock(meta['time'])
+    my_context.delta_time = meta['delta_time']
+    my_road.hour = meta['hour']
+    my_road.start_time = meta['start_time']
+    my_road.cur_time = meta['cur_time']
+    my_road.next_id = meta['next_id']
+    my_road.cars_number = meta['cars_number']
+    my_road.produced = meta['produced']
+    my_road.prev_car_time = meta['prev_car_time']
+    my_road.last_car = [cars[row] if row >= 0 else None for row in meta['last_car']]
+    my_road.updater.last_update_time = meta['last_update_time']
+    my_road.updater.last_update_time_each_lane = meta['last_update_time_each_lane']
+    my_road.updater.last_evaluation_time = meta['last_evaluation_time']
+    if (seed != None):
+        reseed(my_context, seed)
+
+def reseed(my_context, seed):
+    """
+    Заново порождает генераторы случайных чисел от зерна seed. Объекты потоков сохраняются,
+    поэтому потоки появления авто продолжают брать числа из них же; заготовленные числа
+    отбрасываются, кроме уже выбранных интервалов до следующего авто.
+    """
+    new_random = random_streams.RandomStreams(seed)
+    my_context.random.seed = seed
+    for name in random_streams.stream_names:
+        stream = getattr(my_context.random, name)
+        stream.generator = getattr(new_random, name).generator
+        stream.buffer = []
+        stream.position = 0
+    for demand in get_demands(my_context):
+        demand.units = [[] for lane in range(len(demand.units))]
+        demand.positions = [0] * len(demand.units)
@@ -0,0 +1,22 @@
+"""
+Часы симуляции. Все модули берут текущее время через объект часов, а не через time.time(),
+поэтому симуляцию можно запускать как в реальном времени (с отрисовкой), так и в безоконном
+режиме с модельным временем и фиксированным шагом, который выполняется так быстро, как позволяет
+процессор, и даёт воспроизводимый результат.
+"""
+
+import time
+
+class RealClock():
+    def now(self):
+        return time.time()
+
+class SimulatedClock():
+    def __init__(self, start_time = 0.0):
+        self.time = start_time
+
+    def now(self):
+        return self.time
+
+    def advance(self, delta_time):
+        self.time += delta_time
@@ -0,0 +1,75 @@
+"""
+Контекст симуляции. Всё состояние, общее для автомобилей, дороги и системы знаков одной
+симуляции (часы, генераторы случайных чисел, шаг времени, параметры дороги, въезды и съезды,
+секции со знаками, поток появления авто, индекс полос), хранится в объекте SimulationContext,
+а не в атрибутах классов Car и Road.
+Поэтому в одном процессе можно независимо (в том числе из разных потоков) выполнять несколько
+дорог, у каждой из которых свой контекст.
+"""
+
+import clock
+import ramps
+import random_streams
+
+"""
+Геометрия полос: полоса 0 - полоса разгона съезда, полосы 1, ..., lanes_number - 1 - полосы
+дороги справа налево; ширина полосы на экране 'lane_width' пикселей. Полосы, по которым ехало
+авто, хранятся битовой маской в uint8, поэтому полос не больше 'max_lanes_number'.
+"""
+lane_width = 25
+max_lanes_number = 8
+
+def get_lane_top(lane, height):
+    return height / 2 + lane_width - lane_width * lane
+
+def get_lane_y(lane, height):
+    """
+    Координата y авто на полосе lane (работает и для массивов полос).
+    """
+    return get_lane_top(lane, height) + 10
+
+class SimulationContext():
+    def __init__(self, road_length, on_ramp_start, on_ramp_end, height = 710, seed = None,
+            lanes_number = 3):
+        if (lanes_number < 2 or lanes_number > max_lanes_number):
+            raise ValueError("Lanes number must be from 2 to " + str(max_lanes_number))
+        self.clock = clock.RealClock()
+        self.random = random_streams.RandomStreams(seed)
+        self.delta_time = 0.0
+
+        # ----road----
+        self.road_length = road_length
+        self.on_ramp_start = on_ramp_start
+        self.on_ramp_end = on_ramp_end
+        self.height = height
+        self.lanes_number = lanes_number
+        """
+        Въезды (ramps.OnRamp) и съезды (ramps.OffRamp, в порядке возрастания position).
+        Первый въезд задаётся on_ramp_start и on_ramp_end и использует полосу 0 потока demand.
+        """
+        self.on_ramps = [ramps.OnRamp(on_ramp_start, on_ramp_end)]
+        self.off_ramps = []
+        """
+        Через сколько секунд авто повторяет неудавшуюся проверку соседей для перестроения
+        (см. car.Car.is_lane_check_due); None - проверка выполняется на каждом шаге.
+        Поддерживается только объектным движком (road.Road и hybrid_road.HybridRoad).
+        """
+        self.lane_change_cooldown = None
+        # ------------
+
+        # ----sections----
+        self.sections = []
+        self.sections_number = 0
+        self.each_section_length = 0.0
+        self.sections_max_speed = None
+        self.sections_last_update = None
+        self.section_tracker = None
+        # ----------------
+
+        # ----cars production----
+        self.demand = None
+        # -----------------------
+
+        self.lane_index = None
+        self.trips = None
+        self.instrumentation = None
@@ -0,0 +1,76 @@
+"""
+Поток появления автомобилей. Интервалы между появлениями авто на каждой полосе генерируются
+по мере надобности, а не заранее, поэтому память не зависит от длительности сценария и
+интервалы не заканчиваются в длинных прогонах.
+Средний интервал задаётся для каждого часа и каждой полосы ('mean_intervals[hour][lane]'),
+сам интервал равен среднему, умноженному на случайную величину со средним 1:
+    'uniform' - равномерно распределённую на [0.9, 1.1];
+    'poisson' - экспоненциально распределённую (пуассоновский поток авто).
+Такие величины генерируются блоками по 'chunk_size' штук для каждой полосы, а масштабируются
+средним интервалом того часа, в который они используются.
+"""
+
+distributions = ['uniform', 'poisson']
+
+def get_mean_intervals_from_counts(cars_numbers, hour_durations):
+    """
+    Средние интервалы по количеству авто каждого типа ('cars_numbers[hour][lane][car_type]'),
+    появляющихся на полосе за час длительностью 'hour_durations[hour]' секунд.
+    """
+    mean_intervals = []
+    for hour in range(len(cars_numbers)):
+        mean_intervals.append([hour_durations[hour] / sum(cars_numbers[hour][lane])
+            for lane in range(len(cars_numbers[hour]))])
+    return mean_intervals
+
+def extend_to_lanes(mean_intervals, lanes_number):
+    """
+    Средние интервалы для lanes_number полос: полосы, которых нет в таблице, получают интервалы
+    последней полосы таблицы.
+    """
+    return [list(hour) + [hour[-1]] * (lanes_number - len(hour)) for hour in mean_intervals]
+
+class Demand():
+    def __init__(self, mean_intervals, stream, distribution = 'uniform', chunk_size = 1024):
+        if (distribution not in distributions):
+            raise ValueError("Unknown distribution: " + str(distribution))
+        self.mean_intervals = mean_intervals
+        self.stream = stream
+        self.distribution = distribution
+        self.chunk_size = chunk_size
+        lanes_number = len(mean_intervals[0])
+        """
+        Первый интервал на полосе lane дополнительно умножается на 'first_interval_scale[lane]'.
+        """
+        self.first_interval_scale = [1.0] * lanes_number
+        self.units = [[] for lane in range(lanes_number)]
+        self.positions = [0] * lanes_number
+        self.current_units = [None] * lanes_number
+        self.produced = [0] * lanes_number
+
+    def draw_units(self, size):
+        if (self.distribution == 'poisson'):
+            return self.stream.generator.exponential(1.0, size)
+        return self.stream.generator.uniform(0.9, 1.1, size)
+
+    def get_unit(self, lane):
+        if (self.positions[lane] == len(self.units[lane])):
+            self.units[lane] = self.draw_units(self.chunk_size).tolist()
+            self.positions[lane] = 0
+        unit = self.units[lane][self.positions[lane]]
+        self.positions[lane] += 1
+        return unit
+
+    def get_interval(self, hour, lane):
+        """
+        Интервал до появления следующего авто на полосе lane в час hour.
+        """
+        if (self.current_units[lane] == None):
+            self.current_units[lane] = self.get_unit(lane)
+            if (self.produced[lane] == 0):
+                self.current_units[lane] *= self.first_interval_scale[lane]
+        return self.current_units[lane] * self.mean_intervals[hour][lane]
+
+    def next_car(self, lane):
+        self.current_units[lane] = None
+        self.produced[lane] += 1
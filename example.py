@@ -1,63 +1,75 @@
 import sys
-import numpy as np
-import random
-import matplotlib.pyplot as plt
-from matplotlib.legend_handler import HandlerLine2D
 
+import context
+import demand
 import road
-import car
 import speed_manager
 
 """
-Временные интервалы 'time_intervals' задают частоту появления автомобилей на дороге.
+Временные интервалы 'time_intervals' задают средние интервалы между появлениями автомобилей
+на каждой полосе в каждый час (см. demand).
 """
 time_intervals = [[9.0, 3.6, 3.6],
                 [9.0, 2.0, 2.0],
                 [9.0, 3.6, 3.6]]
 
-def fill_time_intervals():
-    road.Road.time_intervals = [[[], [], []],
-                                [[], [], []],
-                                [[], [], []]]
-    for hour in range(3):
-        for lane in range(3):
-            for production_times in range(10000):
-                time_interval = time_intervals[hour][lane]
-                road.Road.time_intervals[hour][lane].append(random.uniform(0.9 * time_interval,
-                    1.1 * time_interval))
-    road.Road.time_intervals[0][1][0] /= 2.0
+def fill_demand(my_context, distribution = 'uniform', profile = 'intervals'):
+    """
+    При profile == 'counts' средние интервалы берутся из количеств авто road.total_cars_number
+    за часы длительностью road.delta_time_for_hour, иначе из таблицы 'time_intervals'. Полосы
+    левее последней полосы таблицы получают её интервалы.
+    """
+    mean_intervals = time_intervals
+    if (profile == 'counts'):
+        mean_intervals = demand.get_mean_intervals_from_counts(road.total_cars_number,
+            road.delta_time_for_hour)
+    mean_intervals = demand.extend_to_lanes(mean_intervals, my_context.lanes_number)
+    my_context.demand = demand.Demand(mean_intervals, my_context.random.arrivals, distribution)
+    my_context.demand.first_interval_scale[1] = 0.5
 
+"""
+Шаг модельного времени (в секундах) для безоконного режима.
+"""
+time_step = 0.05
+
+"""
+Отрисовка каждого 'render_every'-го шага в оконном режиме (см. renderer).
+"""
+render_every = 1
 
-def run_road(road_length, adaptive_top_speed, on_ramp_start, on_ramp_end):
+def run_road(my_context, adaptive_top_speed, headless):
     each_section_length = 1000.0
     algorithm = 2
-    updater = speed_manager.Updater(road_length, each_section_length, algorithm, adaptive_top_speed)
+    updater = speed_manager.Updater(my_context, each_section_length, algorithm, adaptive_top_speed)
     updater.fill_sections()
 
-    my_road = road.Road(updater, road_length, 710, adaptive_top_speed, on_ramp_start, on_ramp_end)
+    my_road = road.Road(my_context, updater, adaptive_top_speed)
+    if (headless):
+        result = my_road.run_headless(time_step)
+    else:
+        result = my_road.run(render_every)
     avg_time, sd_time, avg_consumption, sd_consumption, avg_emissions, sd_emissions, cars_number \
-        = my_road.run()
-
-def main(road_length, pandus_start, pandus_end):
-    car.Car.on_ramp_end = on_ramp_end
-    car.Car.on_ramp_start = on_ramp_start
-    car.Car.road_length = road_length
-    car.Car.height = 710
-    fill_time_intervals()
+        = result
 
+def main(road_length, on_ramp_start, on_ramp_end, headless, seed = None):
     avg_times = []
     sd_times = []
     avg_consumptions = []
     sd_consumptions = []
     for adaptive_top_speed in [False]:
-        road.Road.production_times = [0, 0, 0]
-        run_road(road_length, adaptive_top_speed, on_ramp_start, on_ramp_end)
+        my_context = context.SimulationContext(road_length, on_ramp_start, on_ramp_end, 710, seed)
+        fill_demand(my_context)
+        run_road(my_context, adaptive_top_speed, headless)
 
 if __name__ == '__main__':
     if (len(sys.argv) < 4):
-        print ("Args : road_length, on_ramp_start, on_ramp_end")
+        print ("Args : road_length, on_ramp_start, on_ramp_end [headless] [seed]")
         sys.exit(0)
     road_length = int(sys.argv[1])
     on_ramp_start = int(sys.argv[2])
     on_ramp_end = int(sys.argv[3])
-    main(road_length, on_ramp_start, on_ramp_end)
\ No newline at end of file
+    headless = (len(sys.argv) > 4 and sys.argv[4] == 'headless')
+    seed = None
+    if (len(sys.argv) > 5):
+        seed = int(sys.argv[5])
+    main(road_length, on_ramp_start, on_ramp_end, headless, seed)
\ No newline at end of file
@@ -0,0 +1,404 @@
+"""
+Гибридная (мезо/микро) модель длинной дороги. Авто моделируются поштучно (car.Car со всеми
+правилами следования и перестроения) только в микроскопических зонах: в начале дороги, вокруг
+въездов и съездов (с запасом 'margin') и, если задано 'follow_signs', на секциях, где знаки
+понижают скорость. Остальные секции моделируются макроскопически, моделью передачи ячеек
+(cell transmission model): ячейка - секция одной полосы с треугольной фундаментальной
+диаграммой, где скорость свободного движения - значение знака, расстояние между авто
+в заторе - 'jam_spacing', а пропускная способность соответствует движению со скоростью
+свободного движения на безопасной дистанции car.get_safe_distance.
+Ячейка хранит очередь своих авто (FIFO) в виде самих объектов car.Car вместе со временем
+въезда в ячейку и самым ранним временем выезда из неё (проезд ячейки со средней желаемой
+скоростью авто, см. get_desired_speed). За шаг из ячейки выезжает не больше авто, чем
+позволяют поток передачи ячеек и время выезда головного авто. Авто, въехавшее из
+микроскопической зоны в макроскопическую секцию, убирается с полос в очередь ячейки своей
+полосы; авто, выезжающее из ячейки в микроскопическую зону, ставится на свою полосу в начало
+зоны, если там есть место на безопасной дистанции, иначе ждёт в ячейке. За время в ячейках
+к расходу топлива и выбросам авто добавляется движение со средней скоростью проезда с учётом
+случайных торможений (см. get_cruise_consumption), умноженное на множители типа авто
+'calibrated_cruise_factors' (calibrate_cruise_factors): без них расход в ячейках ниже, чем
+в поштучной модели, где авто ещё догоняют друг друга и перестраиваются. Полос разгона
+в макроскопических секциях нет, перестроений в них тоже: авто едет по своей полосе.
+Знаки обновляются по статистике авто в зонах вместе с количеством авто и скоростями ячеек.
+Контрольные точки (checkpoint) и отрисовка авто в ячейках не поддерживаются.
+"""
+
+import bisect
+import collections
+import math
+import os
+import tempfile
+import numpy as np
+
+import car
+import context as context_module
+import fuel
+import lane_index
+import ramps
+import road
+import speed_manager
+import stats
+
+"""
+Средний множитель желаемой скорости (car.Car.update_top_speed выбирает его равномерно
+от 0.95 до 1.01) и надбавка к желаемой скорости на левых полосах (car.Car.update_lane).
+"""
+desired_speed_factor = 0.98
+left_lane_bonus = 10.0
+
+"""
+Множители расхода и выбросов get_cruise_consumption по типам авто: get_cruise_consumption
+учитывает только случайные торможения, а в поштучной модели авто ещё догоняют, перестраиваются
+и меняют желаемую скорость на каждой секции. Получены calibrate_cruise_factors на дороге
+20 км с въездом на 2-3 км (example.fill_demand, алгоритм знаков 2, зерно 9, 900 с).
+"""
+calibrated_cruise_factors = [[1.30, 1.33, 1.02, 1.52],
+                            [2.71, 1.49, 0.78, 1.40]]
+
+def get_cruise_consumption(carr, speed, braking_probability, delta_time):
+    """
+    Средние за шаг расход и выбросы авто, едущего со скоростью speed по свободной полосе:
+    на каждом шаге с вероятностью braking_probability оно случайно тормозит на
+    deceleration * delta_time и затем разгоняется, пока не восстановит скорость. Доля шагов
+    разгона равна braking_probability * deceleration / acceleration, торможения на таких шагах
+    происходят на фоне разгона, остальные шаги авто едет равномерно.
+    """
+    recovery = min(braking_probability * carr.deceleration / carr.acceleration, 1.0)
+    weights = [braking_probability * (1.0 - recovery), braking_probability * recovery,
+        (1.0 - braking_probability) * recovery, (1.0 - braking_probability) * (1.0 - recovery)]
+    acceleration = carr.acceleration * delta_time
+    deceleration = carr.deceleration * delta_time
+    speeds = [(speed, speed - deceleration), (speed - acceleration, speed - deceleration),
+        (speed - acceleration, speed), (speed, speed)]
+    consumption = 0.0
+    emissions = 0.0
+    for weight, (prev_speed, new_speed) in zip(weights, speeds):
+        step_consumption, step_emissions = fuel.get_consumption_and_emissions(prev_speed,
+            new_speed, delta_time)
+        consumption += weight * step_consumption
+        emissions += weight * step_emissions
+    return consumption, emissions
+
+def get_type_means(trips):
+    """
+    Средние расход и выбросы поездок каждого типа авто, массив формы (2, количество типов).
+    """
+    means = np.full((2, len(road.max_speeds)), np.nan)
+    for car_type in range(len(road.max_speeds)):
+        selected = trips['car_type'] == car_type
+        if (np.any(selected)):
+            means[0, car_type] = np.mean(trips['consumption'][selected])
+            means[1, car_type] = np.mean(trips['emissions'][selected])
+    return means
+
+def calibrate_cruise_factors(make_context, make_updater, adaptive_top_speed, max_time = None,
+        time_step = 0.05, **hybrid_parameters):
+    """
+    Множители cruise_factors, при которых средние расход и выбросы поездок каждого типа авто
+    в HybridRoad совпадают с поштучной моделью road.Road на той же дороге. Множители не влияют
+    на движение, поэтому расход в ячейках отделяется от расхода в зонах прогонами HybridRoad
+    с нулевыми и единичными множителями. make_context() и make_updater(context) создают
+    контекст и Updater (incremental = False) каждого прогона; для типов авто без поездок
+    в ячейках множитель равен 1.
+    """
+    means = []
+    with tempfile.TemporaryDirectory() as directory:
+        trips_path = os.path.join(directory, 'trips.npy')
+        for factor in [None, 0.0, 1.0]:
+            my_context = make_context()
+            updater = make_updater(my_context)
+            if (factor == None):
+                my_road = road.Road(my_context, updater, adaptive_top_speed, trips_path)
+            else:
+                my_road = HybridRoad(my_context, updater, adaptive_top_speed,
+                    cruise_factors = np.full((2, len(road.max_speeds)), factor),
+                    trips_path = trips_path, **hybrid_parameters)
+            my_road.run_headless(time_step, max_time)
+            means.append(get_type_means(stats.read_trips(trips_path)))
+    micro, zones, cells = means
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        factors = (micro - zones) / (cells - zones)
+    factors[~np.isfinite(factors)] = 1.0
+    return factors
+
+class HybridRoad(road.Road):
+    def __init__(self, context, updater, adaptive_top_speed, micro_zones = None, margin = 1000.0,
+            follow_signs = True, jam_spacing = 30.0, cruise_factors = None, trips_path = None,
+            recorder = None, instrumentation = None):
+        """
+        micro_zones - список отрезков дороги (start, end), которые моделируются поштучно, вместо
+        зон по умолчанию (начало дороги, въезды и съезды); первая секция моделируется поштучно
+        всегда, потому что в ней появляются авто. cruise_factors - множители расхода
+        и выбросов в ячейках по типам авто (см. calibrate_cruise_factors), по умолчанию
+        'calibrated_cruise_factors'.
+        """
+        road.Road.__init__(self, context, updater, adaptive_top_speed, trips_path, recorder,
+            instrumentation)
+        if (updater.incremental):
+            raise ValueError("HybridRoad requires an Updater with incremental = False")
+        self.micro_zones = micro_zones
+        self.margin = margin
+        self.follow_signs = follow_signs
+        self.jam_spacing = jam_spacing
+        if (cruise_factors is None):
+            cruise_factors = calibrated_cruise_factors
+        self.cruise_factors = np.array(cruise_factors, dtype = float)
+
+    def get_micro_zones(self):
+        if (self.micro_zones != None):
+            return self.micro_zones
+        zones = []
+        for ramp in self.context.on_ramps:
+            zones.append((ramp.start - self.margin, ramp.end + self.margin))
+        for off_ramp in self.context.off_ramps:
+            zones.append((off_ramp.position - off_ramp.approach - self.margin,
+                off_ramp.position + self.margin))
+        return zones
+
+    def init_state(self):
+        road.Road.init_state(self)
+        sections = self.context.sections
+        lanes_number = self.context.lanes_number
+        self.starts = np.array([section.start for section in sections], dtype = float)
+        self.lengths = np.array([section.end - section.start for section in sections],
+            dtype = float)
+        self.fixed_micro = np.zeros(len(sections), dtype = bool)
+        self.fixed_micro[0] = True
+        for start, end in self.get_micro_zones():
+            self.fixed_micro |= (self.starts < end) & (self.starts + self.lengths > start)
+        self.cells = [[collections.deque() for lane in range(lanes_number)]
+            for section in sections]
+        self.cars_in_cells = np.zeros((len(sections), lanes_number))
+        self.credits = np.zeros((len(sections), lanes_number))
+        self.ready_times = np.full((len(sections), lanes_number), np.inf)
+        self.set_micro(self.fixed_micro.copy())
+
+    def set_micro(self, micro):
+        self.micro = micro
+        # макроскопические секции, перед которыми находится микроскопическая зона
+        self.entry_sections = np.flatnonzero(~micro[1:] & micro[:-1]) + 1
+
+    def get_cell_parameters(self):
+        """
+        Скорость свободного движения, пропускная способность и скорость волны затора
+        каждой ячейки.
+        """
+        free_speeds = self.context.sections_max_speed
+        capacities = free_speeds / (self.jam_spacing + car.get_safe_distance(free_speeds))
+        wave_speeds = capacities / (1.0 / self.jam_spacing - capacities / free_speeds)
+        return free_speeds, capacities, wave_speeds
+
+    def get_cell_speeds(self):
+        free_speeds, capacities, wave_speeds = self.get_cell_parameters()
+        densities = self.cars_in_cells / self.lengths[:, np.newaxis]
+        speeds = free_speeds.copy()
+        congested = densities > 0.0
+        speeds[congested] = np.minimum(free_speeds[congested], np.maximum(wave_speeds[congested]
+            * (1.0 / self.jam_spacing - densities[congested]) / densities[congested], 0.0))
+        return speeds
+
+    def update_signs(self):
+        """
+        То же, что speed_manager.Updater.update_speeds, но в статистику секций добавляются авто
+        в ячейках, движущиеся со скоростью своей ячейки.
+        """
+        updater = self.updater
+        if (updater.is_evaluation_time() and (updater.algorithm == 2 or updater.is_update_time())):
+            lanes, x_coordinates, speeds = speed_manager.get_cars_state(self.pygame_cars_list)
+            speeds_sum, cars_number = updater.get_section_statistics(lanes, x_coordinates, speeds)
+            cars_number += self.cars_in_cells
+            speeds_sum += self.cars_in_cells * self.get_cell_speeds()
+            updater.update_speeds_on_statistics(speeds_sum, cars_number)
+
+    def update_cars(self):
+        road.Road.update_cars(self)
+        now = self.context.clock.now()
+        self.aggregate_crossing_cars(now)
+        self.update_cells(now)
+        if (self.follow_signs):
+            self.update_zones(now)
+
+    # ----cells----
+    def get_desired_speed(self, carr, section, lane):
+        """
+        Средняя желаемая скорость авто в ячейке: как в car.Car.update_top_speed, меньшее из знака
+        и собственной максимальной скорости со средним случайным множителем, и на полосах левее
+        первой основной - надбавка car.Car.update_lane за время на левой полосе.
+        """
+        speed = desired_speed_factor * min(self.context.sections_max_speed[section, lane],
+            carr.self_top_speed)
+        if (lane >= 2):
+            speed += left_lane_bonus
+        return speed
+
+    def add_to_cell(self, carr, section, lane, now):
+        free_speed = self.get_desired_speed(carr, section, lane)
+        distance = self.starts[section] + self.lengths[section] - carr.x_coordinate
+        cell = self.cells[section][lane]
+        cell.append((now, now + max(distance, 0.0) / free_speed, carr))
+        self.cars_in_cells[section, lane] += 1
+        if (len(cell) == 1):
+            self.ready_times[section, lane] = cell[0][1]
+
+    def pop_from_cell(self, section, lane, x_coordinate, now):
+        """
+        Убирает головное авто из ячейки и добавляет к его расходу и выбросам движение
+        от точки въезда в ячейку до x_coordinate. Возвращает авто и его среднюю скорость.
+        """
+        cell = self.cells[section][lane]
+        entry_time, ready_time, carr = cell.popleft()
+        self.cars_in_cells[section, lane] -= 1
+        self.ready_times[section, lane] = cell[0][1] if len(cell) > 0 else np.inf
+        duration = now - entry_time
+        speed = carr.speed
+        if (duration > 0.0):
+            speed = min(max(x_coordinate - carr.x_coordinate, 0.0) / duration,
+                self.get_desired_speed(carr, section, lane))
+            consumption, emissions = get_cruise_consumption(carr, speed,
+                car.get_braking_probability(speed, lane, x_coordinate,
+                ramps.get_braking_end(self.context, x_coordinate)), self.context.delta_time)
+            # расход и выбросы car.Car.update_motion взвешиваются длительностью шага
+            carr.consumption += self.cruise_factors[0, carr.car_type] * consumption * duration
+            carr.emissions += self.cruise_factors[1, carr.car_type] * emissions * duration
+            carr.consumption_number += 2 * duration
+        return carr, speed
+
+    def update_cells(self, now):
+        """
+        Шаг модели передачи ячеек: поток из ячейки - меньшее из того, что она может отправить
+        и что может принять следующая ячейка (микроскопическая зона и конец дороги принимают всё,
+        место в зоне проверяется при выезде). Поток накапливается в 'credits', и авто выезжают,
+        пока накоплено целое авто, а головное авто проехало ячейку.
+        """
+        delta_time = self.context.delta_time
+        free_speeds, capacities, wave_speeds = self.get_cell_parameters()
+        densities = self.cars_in_cells / self.lengths[:, np.newaxis]
+        sending = np.minimum(free_speeds * densities, capacities) * delta_time
+        receiving = np.maximum(np.minimum(capacities, wave_speeds
+            * (1.0 / self.jam_spacing - densities)), 0.0) * delta_time
+        flows = sending.copy()
+        flows[:-1] = np.where(self.micro[1:, np.newaxis], sending[:-1],
+            np.minimum(sending[:-1], receiving[1:]))
+        flows[self.micro] = 0.0
+        # поток, накопленный, пока головное авто ещё не проехало ячейку, не теряется, иначе
+        # авто, въехавшие группой, выезжали бы по одному за время накопления целого авто
+        self.credits = np.minimum(self.credits + flows, np.maximum(self.cars_in_cells, 1.0))
+        movers = np.argwhere((self.credits >= 1.0) & (self.ready_times <= now))
+        # сначала ячейки ниже по течению, чтобы авто не проезжало две ячейки за шаг
+        for section, lane in movers[::-1].tolist():
+            while (self.credits[section, lane] >= 1.0 and self.ready_times[section, lane] <= now
+                    and self.move_from_cell(section, lane, now)):
+                pass
+
+    def move_from_cell(self, section, lane, now):
+        next_section = section + 1
+        end = self.starts[section] + self.lengths[section]
+        if (next_section == len(self.cells)):
+            carr, speed = self.pop_from_cell(section, lane, end, now)
+            carr.x_coordinate = end
+            carr.record_trip()
+        elif (self.micro[next_section]):
+            head = self.cells[section][lane][0][2]
+            if (not self.has_room(lane, end, head)):
+                return False
+            carr, speed = self.pop_from_cell(section, lane, end, now)
+            self.materialize(carr, lane, end, min(speed, self.get_entry_speed(lane, end)))
+        else:
+            carr, speed = self.pop_from_cell(section, lane, end, now)
+            carr.x_coordinate = end
+            self.add_to_cell(carr, next_section, lane, now)
+        self.credits[section, lane] -= 1.0
+        return True
+    # -------------
+
+    # ----zones----
+    def get_next_car(self, lane, x_coordinate):
+        cars = self.context.lane_index.lanes[lane]
+        position = bisect.bisect_left(cars, x_coordinate, key = lane_index.get_x)
+        if (position < len(cars)):
+            return cars[position]
+        return None
+
+    def has_room(self, lane, x_coordinate, carr):
+        nextt = self.get_next_car(lane, x_coordinate)
+        if (nextt == None):
+            return True
+        speed = min(carr.speed, nextt.speed)
+        return (nextt.x_coordinate - x_coordinate - carr.width
+            >= car.get_safe_distance(speed))
+
+    def get_entry_speed(self, lane, x_coordinate):
+        nextt = self.get_next_car(lane, x_coordinate)
+        if (nextt == None):
+            return math.inf
+        return nextt.speed
+
+    def materialize(self, carr, lane, x_coordinate, speed):
+        """
+        Ставит авто из ячейки на полосу lane в точку x_coordinate.
+        """
+        carr.x_coordinate = x_coordinate
+        carr.rect_x = car.get_rect_x(x_coordinate)
+        carr.y_coordinate = context_module.get_lane_y(lane, self.height)
+        carr.speed = speed
+        carr.movement_up = False
+        carr.movement_down = False
+        carr.lane_check_time = -math.inf
+        # желаемые скорости обновятся по знаку этой секции на следующем шаге
+        carr.top_speed_updated_times = int(x_coordinate / self.context.each_section_length)
+        self.context.lane_index.add(carr)
+        self.pygame_cars_list[lane].add(carr)
+
+    def aggregate(self, carr, section, now):
+        self.context.lane_index.remove(carr, carr.lane)
+        self.pygame_cars_list[carr.lane].remove(carr)
+        self.add_to_cell(carr, section, carr.lane, now)
+
+    def get_section_cars(self, lane, section):
+        cars = self.context.lane_index.lanes[lane]
+        first = bisect.bisect_left(cars, self.starts[section], key = lane_index.get_x)
+        last = bisect.bisect_left(cars, self.starts[section] + self.lengths[section], lo = first,
+            key = lane_index.get_x)
+        return cars[first:last]
+
+    def aggregate_crossing_cars(self, now):
+        """
+        Авто, въехавшие из микроскопической зоны в макроскопическую секцию, переходят в ячейки
+        (переднее первым, чтобы сохранить порядок очереди).
+        """
+        for lane in range(1, self.context.lanes_number):
+            for section in self.entry_sections:
+                for carr in reversed(self.get_section_cars(lane, section)):
+                    self.aggregate(carr, section, now)
+
+    def update_zones(self, now):
+        """
+        Секции, на которых знак хотя бы одной полосы понижает скорость, моделируются поштучно:
+        авто их ячеек расставляются по секции равномерно; после восстановления знаков секция
+        снова моделируется макроскопически.
+        """
+        micro = self.fixed_micro | np.any(self.context.sections_max_speed[:, 1:]
+            < self.updater.max_speed, axis = 1)
+        if (np.array_equal(micro, self.micro)):
+            return
+        speeds = self.get_cell_speeds()
+        for section in np.flatnonzero(micro & ~self.micro):
+            for lane in range(1, self.context.lanes_number):
+                cell = self.cells[section][lane]
+                spacing = self.lengths[section] / max(len(cell), 1)
+                end = self.starts[section] + self.lengths[section]
+                for number in range(len(cell)):
+                    x_coordinate = end - (number + 0.5) * spacing
+                    carr, speed = self.pop_from_cell(section, lane, x_coordinate, now)
+                    self.materialize(carr, lane, x_coordinate, min(speed, speeds[section, lane]))
+                self.credits[section, lane] = 0.0
+        for section in np.flatnonzero(~micro & self.micro):
+            for lane in range(1, self.context.lanes_number):
+                for carr in reversed(self.get_section_cars(lane, section)):
+                    self.aggregate(carr, section, now)
+            self.credits[section] = 0.0
+        self.set_micro(micro)
+    # -------------
+
+    def is_finished(self):
+        return road.Road.is_finished(self) and not np.any(self.cars_in_cells > 0)
@@ -0,0 +1,78 @@
+"""
+Замеры времени и счётчики симуляции. Включаются передачей объекта Instrumentation в Road;
+без него дорога и авто выполняют только проверку 'context.instrumentation == None', поэтому
+выключенные замеры почти ничего не стоят.
+Накапливаются:
+    - время по фазам шага (см. phases) в секундах; 'update_lane' и 'update_motion' - части
+      фазы 'update': смена полосы и продольное движение авто (car.Car.update);
+    - счётчики событий: попытки перестроения (проверки его безопасности)
+      'lane_change_attempts', перестроения 'lane_changes', въезды с полосы разгона 'merges',
+      поиски соседей 'find_prev_next', выезды через съезды 'exits', отложенные проверки
+      соседей для перестроения 'lane_checks_skipped';
+    - количество шагов и количество авто на каждой полосе после последнего шага.
+Каждые 'snapshot_interval' секунд модельного времени (если задан) снимок накопленных
+значений (см. get_snapshot) добавляется в 'snapshots' и передаётся в 'callback' (если задан).
+"""
+
+import time
+
+phases = ['hour', 'update_speeds', 'produce_car', 'add_car_on_road', 'events', 'update',
+    'update_lane', 'update_motion', 'draw']
+
+counters = ['lane_change_attempts', 'lane_changes', 'merges', 'find_prev_next', 'exits',
+    'lane_checks_skipped']
+
+class Instrumentation():
+    def __init__(self, snapshot_interval = None, callback = None):
+        self.snapshot_interval = snapshot_interval
+        self.callback = callback
+        self.timer = time.perf_counter
+        self.reset()
+
+    def reset(self):
+        self.times = dict((phase, 0.0) for phase in phases)
+        self.counters = dict((name, 0) for name in counters)
+        self.steps = 0
+        self.cars_on_road = []
+        self.snapshots = []
+        self.next_snapshot_time = None
+
+    def start(self):
+        return self.timer()
+
+    def stop(self, phase, start):
+        """
+        Добавляет к фазе phase время с момента start и возвращает текущий момент, чтобы
+        с него можно было отсчитывать следующую фазу.
+        """
+        now = self.timer()
+        self.times[phase] += now - start
+        return now
+
+    def count(self, name, number = 1):
+        self.counters[name] += number
+
+    def end_step(self, now, cars_on_road):
+        self.steps += 1
+        self.cars_on_road = cars_on_road
+        if (self.snapshot_interval == None):
+            return
+        if (self.next_snapshot_time == None):
+            self.next_snapshot_time = now + self.snapshot_interval
+        if (now >= self.next_snapshot_time):
+            while (self.next_snapshot_time <= now):
+                self.next_snapshot_time += self.snapshot_interval
+            snapshot = self.get_snapshot(now)
+            self.snapshots.append(snapshot)
+            if (self.callback != None):
+                self.callback(snapshot)
+
+    def get_snapshot(self, now = None):
+        """
+        Накопленные с начала симуляции значения на момент модельного времени now.
+        """
+        return {'time': now,
+                'steps': self.steps,
+                'times': dict(self.times),
+                'counters': dict(self.counters),
+                'cars_on_road': list(self.cars_on_road)}
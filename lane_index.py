@@ -0,0 +1,119 @@
+"""
+Индекс полос. Для каждой полосы хранится список автомобилей, отсортированный по координате,
+поэтому поиск соседей при перестроении (find_prev_next) выполняется двоичным поиском за
+O(log n), а не перебором всех авто полосы. Ссылки prev/next у автомобилей выставляются самим
+индексом при добавлении, удалении и перестроении авто, а также при восстановлении порядка
+в конце шага (refresh).
+Если включено wake_neighbours, появление авто на полосе и уход с неё будят отложенные проверки
+перестроения (car.Car.is_lane_check_due) у авто соседних полос, для которых это авто стало или
+перестало быть ближайшим соседом на полосе.
+"""
+
+import bisect
+import math
+
+def get_x(carr):
+    return carr.x_coordinate
+
+class LaneIndex():
+    def __init__(self, lanes_number = 3, wake_neighbours = False):
+        self.lanes = [[] for lane in range(lanes_number)]
+        self.max_width = 0.0
+        self.wake_neighbours = wake_neighbours
+
+    def link(self, lane, position):
+        cars = self.lanes[lane]
+        carr = cars[position]
+        carr.prev = None
+        carr.next = None
+        if (position > 0):
+            carr.prev = cars[position - 1]
+            carr.prev.next = carr
+        if (position + 1 < len(cars)):
+            carr.next = cars[position + 1]
+            carr.next.prev = carr
+
+    def position(self, carr, lane):
+        cars = self.lanes[lane]
+        position = bisect.bisect_left(cars, carr.x_coordinate, key = get_x)
+        while (position < len(cars) and cars[position].x_coordinate == carr.x_coordinate):
+            if (cars[position] is carr):
+                return position
+            position += 1
+        # порядок полосы мог нарушиться внутри шага, тогда ищем перебором
+        return cars.index(carr)
+
+    def add(self, carr):
+        self.max_width = max(self.max_width, carr.width)
+        cars = self.lanes[carr.lane]
+        position = bisect.bisect_right(cars, carr.x_coordinate, key = get_x)
+        cars.insert(position, carr)
+        self.link(carr.lane, position)
+        if (self.wake_neighbours):
+            self.wake(carr.lane, carr.prev, carr.next)
+
+    def remove(self, carr, lane):
+        cars = self.lanes[lane]
+        position = self.position(carr, lane)
+        del cars[position]
+        prev = cars[position - 1] if position > 0 else None
+        nextt = cars[position] if position < len(cars) else None
+        if (prev != None):
+            prev.next = nextt
+        if (nextt != None):
+            nextt.prev = prev
+        carr.prev = None
+        carr.next = None
+        if (self.wake_neighbours):
+            self.wake(lane, prev, nextt)
+
+    def wake(self, lane, prev, nextt):
+        """
+        Будит авто соседних с lane полос, стоящие между prev и nextt: ближайшие к ним соседи на
+        полосе lane изменились.
+        """
+        start = -math.inf
+        if (prev != None):
+            start = prev.x_coordinate - self.max_width
+        end = math.inf
+        if (nextt != None):
+            end = nextt.x_coordinate + self.max_width
+        for other_lane in [lane - 1, lane + 1]:
+            if (other_lane < 0 or other_lane >= len(self.lanes)):
+                continue
+            cars = self.lanes[other_lane]
+            first = 0
+            if (start != -math.inf):
+                first = bisect.bisect_left(cars, start, key = get_x)
+            for position in range(first, len(cars)):
+                if (cars[position].x_coordinate > end):
+                    break
+                cars[position].lane_check_time = -math.inf
+
+    def move(self, carr, from_lane):
+        self.remove(carr, from_lane)
+        self.add(carr)
+
+    def refresh(self):
+        for lane in range(len(self.lanes)):
+            cars = self.lanes[lane]
+            before = cars[:]
+            cars.sort(key = get_x)
+            if (cars != before):
+                for position in range(len(cars)):
+                    self.link(lane, position)
+
+    def find_prev_next(self, lane, start, end):
+        """
+        Возвращает ближайшее сзади авто, ближайшее спереди авто на полосе lane для отрезка
+        [start, end] и признак того, что отрезок пересекается с каким-либо авто полосы.
+        """
+        cars = self.lanes[lane]
+        position = bisect.bisect_left(cars, start - self.max_width, key = get_x)
+        while (position < len(cars) and cars[position].x_coordinate <= end):
+            if (cars[position].x_coordinate + cars[position].width >= start):
+                return None, None, True
+            position += 1
+        prev = cars[position - 1] if position > 0 else None
+        nextt = cars[position] if position < len(cars) else None
+        return prev, nextt, False
@@ -0,0 +1,511 @@
+"""
+Экспериментальный параллельный векторный движок для длинных дорог. Дорога делится на отрезки
+из целого числа секций знаков (speed_manager), у каждого отрезка свой Fleet в разделяемой
+памяти (multiprocessing.shared_memory) и свои генераторы случайных чисел. Шаг отрезка
+выполняется в 'processes' рабочих процессах в четыре раунда, между которыми процессы ждут
+друг друга (multiprocessing.Barrier):
+    'gather' - отрезок дописывает в конец своего Fleet авто предыдущего отрезка, пересёкшие
+        границу, и копии авто соседних отрезков, находящихся не дальше 'halo' от его границ;
+    'lanes' - отрезок переставляет свои строки (свои авто, пришедшие авто, копии) и
+        выполняет смену полосы (vector_road.VectorRoad.update_lanes);
+    'ghosts' - копии получают полосы, выбранные авто в их собственных отрезках;
+    'motion' - продольное движение (vector_road.VectorRoad.update_motion), удаление копий и
+        покинувших дорогу авто, сумма скоростей и количество авто по секциям отрезка.
+Главный процесс только выпускает авто, обновляет знаки по сумме статистик отрезков и
+записывает поездки, которые отрезки вернули после раунда 'motion'.
+Продольное движение у границы считается по тем же соседям, что и в vector_road. Отличия
+возможны только при перестроениях у границы: копия может не увидеть своих соседей за
+пределами halo, и два авто из разных отрезков могут перестроиться в один и тот же промежуток
+на соседней полосе.
+Результат определяется зерном и количеством отрезков и не зависит от количества процессов;
+при processes = 0 отрезки выполняются в главном процессе. Рабочие процессы запускаются методом
+fork, поэтому движок работает только там, где он доступен (Linux, macOS).
+Движок экспериментальный: ускорения по сравнению с vector_road.VectorRoad он пока не даёт.
+На каждом шаге процессы четыре раза ждут друг друга у барьера, а поездки передаются главному
+процессу через канал после каждого раунда 'motion'; на дорогах с несколькими тысячами авто
+эти расходы сравнимы с самим шагом отрезка. Поэтому sweep его не запускает.
+"""
+
+import copy
+import multiprocessing
+import os
+import threading
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+
+import clock
+import random_streams
+import vector_road
+
+phases = ['gather', 'lanes', 'ghosts', 'motion']
+
+class SharedFleet(vector_road.Fleet):
+    """
+    Fleet, все столбцы которого лежат в одном блоке разделяемой памяти. Если задано имя блока
+    name, Fleet подключается к существующему блоку (так рабочий процесс видит отрезок после
+    увеличения его ёмкости главным процессом), иначе создаёт новый.
+    """
+    def __init__(self, capacity = 1024, lanes_number = 3, name = None):
+        self.name = name
+        self.blocks = []
+        vector_road.Fleet.__init__(self, capacity, lanes_number)
+
+    def get_layout(self, capacity):
+        layout = []
+        size = 0
+        for name, dtype, count in self.columns:
+            shape = (capacity,) if count == 1 else (capacity, count)
+            layout.append((name, dtype, shape, size))
+            size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+            size += -size % 8
+        return layout, size
+
+    def allocate(self, capacity):
+        layout, size = self.get_layout(capacity)
+        if (self.name == None):
+            block = shared_memory.SharedMemory(create = True, size = max(size, 1))
+        else:
+            block = shared_memory.SharedMemory(name = self.name)
+            self.name = None
+        self.blocks.append(block)
+        for name, dtype, shape, offset in layout:
+            setattr(self, name, np.ndarray(shape, dtype = dtype, buffer = block.buf,
+                offset = offset))
+
+    def grow(self, capacity = None):
+        vector_road.Fleet.grow(self, capacity)
+        for block in self.blocks[:-1]:
+            block.close()
+            block.unlink()
+        self.blocks = self.blocks[-1:]
+
+    def get_name(self):
+        return self.blocks[-1].name
+
+    def close(self, unlink = False):
+        for name, dtype, count in self.columns:
+            setattr(self, name, None)
+        for block in self.blocks:
+            block.close()
+            if (unlink):
+                block.unlink()
+        self.blocks = []
+
+def get_segments(starts, x_coordinates):
+    segments = np.searchsorted(starts, x_coordinates, 'right') - 1
+    return np.clip(segments, 0, len(starts) - 1)
+
+class SegmentRoad(vector_road.VectorRoad):
+    """
+    Векторная дорога одного отрезка. roads - дороги всех отрезков (соседи читаются из их
+    Fleet), sizes и statistics - массивы в разделяемой памяти: количество авто каждого
+    отрезка между шагами и сумма скоростей и количество авто по секциям (форма
+    (отрезки, 2, sections_number, lanes_number)).
+    """
+    def __init__(self, context, updater, adaptive_top_speed, consumption_grid, number, roads,
+            starts, halo, sizes, statistics):
+        vector_road.VectorRoad.__init__(self, context, updater, adaptive_top_speed,
+            consumption_grid)
+        self.number = number
+        self.roads = roads
+        self.starts = starts
+        self.halo = halo
+        self.sizes = sizes
+        self.statistics = statistics
+        self.order = np.zeros(0, dtype = int)
+        self.real_size = 0
+        self.ghosts = []
+        self.finished_trips = []
+
+    def gather(self):
+        """
+        Дописывает после своих авто авто предыдущего отрезка, пересёкшие границу, затем копии
+        соседей в пределах halo. Соседи в этом раунде только дописывают авто после своих,
+        поэтому их первые sizes строк не меняются. Для копий запоминаются их индексы в
+        отрезках-владельцах после раунда 'lanes'.
+        """
+        number = self.number
+        fleet = self.fleet
+        size = int(self.sizes[number])
+        fleet.size = size
+        leaving = get_segments(self.starts, fleet.x_coordinate[:size]) != number
+        sources = []
+        arrived = 0
+        self.ghosts = []
+        if (number > 0):
+            upstream = self.roads[number - 1].fleet
+            x = upstream.x_coordinate[:int(self.sizes[number - 1])]
+            owners = get_segments(self.starts, x)
+            staying = owners == number - 1
+            indices = np.flatnonzero(owners == number)
+            sources.append((upstream, indices))
+            arrived = len(indices)
+            indices = np.flatnonzero(staying & (x >= self.starts[number] - self.halo))
+            sources.append((upstream, indices))
+            self.ghosts.append((number - 1, indices - np.cumsum(~staying)[indices]))
+        if (number + 1 < len(self.roads)):
+            downstream = self.roads[number + 1].fleet
+            x = downstream.x_coordinate[:int(self.sizes[number + 1])]
+            staying = get_segments(self.starts, x) == number + 1
+            indices = np.flatnonzero(staying & (x < self.starts[number + 1] + self.halo))
+            sources.append((downstream, indices))
+            # ушедшие авто остаются копиями, в следующем отрезке они встанут после его авто
+            self.ghosts.insert(0, (number + 1,
+                np.count_nonzero(staying) + np.arange(np.count_nonzero(leaving))))
+            self.ghosts.append((number + 1, indices - np.cumsum(~staying)[indices]))
+        for source, indices in sources:
+            if (len(indices) > 0):
+                fleet.append_from(source, indices)
+        self.real_size = size - int(np.count_nonzero(leaving)) + arrived
+        self.order = np.zeros(0, dtype = int)
+        if (self.real_size != size + arrived):
+            self.order = np.concatenate((np.flatnonzero(~leaving),
+                np.arange(size, size + arrived), np.flatnonzero(leaving),
+                np.arange(size + arrived, fleet.size)))
+
+    def reorder(self):
+        """
+        Строки отрезка: свои авто, пришедшие авто, затем копии (в том числе ушедшие авто).
+        Пустой order - строки уже в этом порядке.
+        """
+        fleet = self.fleet
+        if (len(self.order) == 0):
+            return
+        for name, dtype, count in fleet.columns:
+            column = getattr(fleet, name)
+            column[:fleet.size] = column[self.order]
+
+    def update_ghosts(self):
+        fleet = self.fleet
+        start = self.real_size
+        for source, indices in self.ghosts:
+            end = start + len(indices)
+            fleet.lane[start:end] = self.roads[source].fleet.lane[indices]
+            start = end
+
+    def finish_step(self):
+        """
+        Удаляет копии и покинувшие дорогу авто, записывает статистику секций и количество авто.
+        """
+        fleet = self.fleet
+        fleet.size = self.real_size
+        self.remove_finished_cars()
+        n = fleet.size
+        speeds_sum, cars_number = self.updater.get_section_statistics(fleet.lane[:n],
+            fleet.x_coordinate[:n], fleet.speed[:n])
+        self.statistics[self.number, 0] = speeds_sum
+        self.statistics[self.number, 1] = cars_number
+        self.sizes[self.number] = n
+
+    def record_trips(self, finished):
+        """
+        Откладывает поездки авто, отмеченных маской finished; их записывает главный процесс.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        consumption_number = fleet.consumption_number[:n][finished]
+        self.finished_trips.append((fleet.car_type[:n][finished],
+            fleet.lanes_visited[:n][finished], fleet.start_time[:n][finished],
+            np.full(len(consumption_number), self.context.clock.now()),
+            fleet.consumption[:n][finished] / consumption_number,
+            fleet.emissions[:n][finished] / consumption_number))
+
+    def pop_trips(self):
+        trips = self.finished_trips
+        self.finished_trips = []
+        return trips
+
+def step_segment(segment_road, phase, now, delta_time):
+    segment_road.context.delta_time = delta_time
+    if (phase == 'gather'):
+        segment_road.gather()
+    elif (phase == 'lanes'):
+        segment_road.reorder()
+        if (segment_road.fleet.size > 0):
+            segment_road.update_lanes(now)
+    elif (phase == 'ghosts'):
+        segment_road.update_ghosts()
+    else:
+        if (segment_road.fleet.size > 0):
+            segment_road.update_motion()
+        segment_road.finish_step()
+
+def run_worker(connection, segment_roads, segments, barrier):
+    """
+    Цикл рабочего процесса: по сообщению (время, шаг времени, [(имя блока, ёмкость)] всех
+    отрезков) выполняет раунды шага для отрезков segments и возвращает [(отрезок, поездки)]
+    или текст исключения; None - завершение.
+    """
+    while True:
+        message = connection.recv()
+        if (message == None):
+            break
+        now, delta_time, fleets = message
+        try:
+            for segment_road, (name, capacity) in zip(segment_roads, fleets):
+                if (name != segment_road.fleet.get_name()):
+                    old_fleet = segment_road.fleet
+                    segment_road.fleet = SharedFleet(capacity,
+                        segment_road.context.lanes_number, name)
+                    old_fleet.close()
+            for segment in segments:
+                segment_roads[segment].context.clock = clock.SimulatedClock(now)
+            for phase in phases:
+                if (phase != phases[0]):
+                    barrier.wait()
+                for segment in segments:
+                    step_segment(segment_roads[segment], phase, now, delta_time)
+            connection.send([(segment, segment_roads[segment].pop_trips())
+                for segment in segments])
+        except threading.BrokenBarrierError:
+            # исключение другого процесса; его текст вернёт тот процесс
+            connection.send('')
+        except Exception:
+            barrier.abort()
+            connection.send(traceback.format_exc())
+    connection.close()
+
+class ParallelRoad(vector_road.VectorRoad):
+    def __init__(self, context, updater, adaptive_top_speed, segments_number = 4,
+            processes = None, halo = 500.0, consumption_grid = None, trips_path = None,
+            recorder = None):
+        """
+        segments_number - количество отрезков (не больше количества секций), processes -
+        количество рабочих процессов (по умолчанию по числу ядер, но не больше количества
+        отрезков), halo - расстояние от границы отрезка, в пределах которого авто соседнего
+        отрезка копируются в него.
+        """
+        vector_road.VectorRoad.__init__(self, context, updater, adaptive_top_speed,
+            consumption_grid, trips_path, recorder)
+        self.segments_number = segments_number
+        self.processes = processes
+        if (self.processes == None):
+            self.processes = os.cpu_count()
+        self.halo = halo
+        self.segments = []
+        self.workers = []
+        self.signs_block = None
+        self.state_block = None
+
+    def init_state(self):
+        vector_road.VectorRoad.init_state(self)
+        self.fleet = None
+        self.share_signs()
+        sections_number = self.context.sections_number
+        sections_per_segment = int(np.ceil(sections_number / self.segments_number))
+        segments_number = int(np.ceil(sections_number / sections_per_segment))
+        self.starts = (np.arange(segments_number) * sections_per_segment
+            * self.context.each_section_length)
+        self.share_state(segments_number)
+        self.segments = []
+        for segment in range(segments_number):
+            self.segments.append(self.make_segment(segment))
+        self.entry_segments = {}
+        self.start_workers()
+
+    def share_signs(self):
+        """
+        Переносит значения знаков в разделяемую память, чтобы рабочие процессы видели
+        изменения, которые вносит updater главного процесса.
+        """
+        signs = self.context.sections_max_speed
+        self.signs_block = shared_memory.SharedMemory(create = True, size = max(signs.nbytes, 1))
+        shared_signs = np.ndarray(signs.shape, dtype = signs.dtype, buffer = self.signs_block.buf)
+        shared_signs[:] = signs
+        self.set_signs(shared_signs)
+
+    def set_signs(self, signs):
+        self.context.sections_max_speed = signs
+        for i in range(len(self.context.sections)):
+            self.context.sections[i].max_speed = signs[i]
+
+    def share_state(self, segments_number):
+        """
+        Количество авто отрезков и статистика их секций в одном блоке разделяемой памяти.
+        """
+        shape = (segments_number, 2, self.context.sections_number, self.context.lanes_number)
+        sizes_bytes = segments_number * np.dtype(np.int64).itemsize
+        self.state_block = shared_memory.SharedMemory(create = True,
+            size = sizes_bytes + int(np.prod(shape)) * np.dtype(float).itemsize)
+        self.sizes = np.ndarray(segments_number, dtype = np.int64, buffer = self.state_block.buf)
+        self.statistics = np.ndarray(shape, dtype = float, buffer = self.state_block.buf,
+            offset = sizes_bytes)
+        self.sizes[:] = 0
+        self.statistics[:] = 0.0
+
+    def make_segment(self, segment):
+        """
+        Дорога отрезка: копия контекста со своими генераторами случайных чисел и Fleet
+        в разделяемой памяти.
+        """
+        segment_context = copy.copy(self.context)
+        seed = self.context.random.seed
+        if (seed != None):
+            seed = [seed, segment]
+        segment_context.random = random_streams.RandomStreams(seed)
+        segment_road = SegmentRoad(segment_context, self.updater, self.adaptive_top_speed,
+            self.consumption_grid, segment, self.segments, self.starts, self.halo, self.sizes,
+            self.statistics)
+        segment_road.init_ramps()
+        segment_road.fleet = SharedFleet(lanes_number = self.context.lanes_number)
+        return segment_road
+
+    def start_workers(self):
+        processes = min(self.processes, len(self.segments))
+        if (processes <= 0):
+            return
+        fork = multiprocessing.get_context('fork')
+        barrier = fork.Barrier(processes)
+        for worker in range(processes):
+            segments = list(range(worker, len(self.segments), processes))
+            connection, worker_connection = fork.Pipe()
+            process = fork.Process(target = run_worker,
+                args = (worker_connection, self.segments, segments, barrier), daemon = True)
+            process.start()
+            worker_connection.close()
+            self.workers.append((process, connection, segments))
+
+    def stop_workers(self):
+        for process, connection, segments in self.workers:
+            connection.send(None)
+            connection.close()
+            process.join()
+        self.workers = []
+
+    def get_segments(self, x_coordinates):
+        return get_segments(self.starts, x_coordinates)
+
+    def add_car(self, new_car):
+        segment = int(self.get_segments(new_car['x_coordinate']))
+        fleet = self.segments[segment].fleet
+        fleet.add(new_car)
+        self.sizes[segment] = fleet.size
+        # отрезки въезда нужны только для последних выпущенных авто источников
+        self.entry_segments[new_car['id']] = segment
+        self.entry_segments = dict((car_id, self.entry_segments[car_id])
+            for car_id in self.last_car if car_id in self.entry_segments)
+
+    def get_car_x(self, car_id):
+        """
+        Авто только движутся вперёд, поэтому поиск идёт по отрезкам, начиная с отрезка въезда.
+        """
+        for segment_road in self.segments[self.entry_segments.get(car_id, 0):]:
+            fleet = segment_road.fleet
+            indices = np.flatnonzero(fleet.id[:fleet.size] == car_id)
+            if (len(indices) > 0):
+                return fleet.x_coordinate[indices[0]]
+        return None
+
+    def get_column(self, name):
+        """
+        Столбец name всех авто дороги (по отрезкам).
+        """
+        return np.concatenate([getattr(segment_road.fleet, name)[:segment_road.fleet.size]
+            for segment_road in self.segments])
+
+    def get_motion_arrays(self):
+        lanes = self.get_column('lane')
+        return (lanes, self.get_column('x_coordinate'), self.get_column('speed'),
+            self.get_column('width'),
+            np.where(lanes == 0, self.ramp_ends[self.get_column('ramp')], np.inf))
+
+    def get_cars_number(self):
+        return int(np.sum(self.sizes))
+
+    def step(self):
+        now = self.context.clock.now()
+        self.update_time(now)
+
+        # ----updating max speeds on sections----
+        self.update_signs()
+        # ---------------------------------------
+
+        self.produce_cars()
+        self.add_cars()
+
+        if (self.get_cars_number() == 0):
+            return
+        self.reserve_capacity()
+        for segment, trips in self.run_segments(now):
+            for values in trips:
+                self.context.trips.record_arrays(*values)
+        for segment_road, size in zip(self.segments, self.sizes):
+            segment_road.fleet.size = int(size)
+
+        if (self.recorder != None and self.recorder.is_due(now)):
+            self.record_frame(now)
+
+    def update_signs(self):
+        """
+        Знаки обновляются по сумме статистик секций, которые отрезки посчитали в конце
+        предыдущего шага.
+        """
+        updater = self.updater
+        if (updater.is_evaluation_time() and (updater.algorithm == 2 or updater.is_update_time())):
+            statistics = np.sum(self.statistics, axis = 0)
+            updater.update_speeds_on_statistics(statistics[0], statistics[1])
+
+    def reserve_capacity(self):
+        """
+        В раунде 'gather' отрезок дописывает не больше авто, чем есть у его соседей, поэтому
+        ёмкость увеличивает только главный процесс, пока рабочие процессы ждут сообщения.
+        """
+        for segment, segment_road in enumerate(self.segments):
+            fleet = segment_road.fleet
+            needed = int(np.sum(self.sizes[max(segment - 1, 0):segment + 2]))
+            if (fleet.capacity < needed):
+                fleet.grow(max(2 * fleet.capacity, needed))
+
+    def run_segments(self, now):
+        """
+        Раунды шага всех отрезков; возвращает [(отрезок, поездки)] по возрастанию отрезков.
+        """
+        delta_time = self.context.delta_time
+        if (len(self.workers) == 0):
+            for phase in phases:
+                for segment_road in self.segments:
+                    step_segment(segment_road, phase, now, delta_time)
+            return [(segment_road.number, segment_road.pop_trips())
+                for segment_road in self.segments]
+        fleets = [(segment_road.fleet.get_name(), segment_road.fleet.capacity)
+            for segment_road in self.segments]
+        for process, connection, segments in self.workers:
+            connection.send((now, delta_time, fleets))
+        replies = [connection.recv() for process, connection, segments in self.workers]
+        errors = [reply for reply in replies if isinstance(reply, str)]
+        if (len(errors) > 0):
+            raise RuntimeError('parallel_road worker failed:\n' + ''.join(errors))
+        return sorted(sum(replies, []), key = lambda item: item[0])
+
+    def record_frame(self, now):
+        self.recorder.record(now, self.get_column('id'), self.get_column('x_coordinate'),
+            self.get_column('y_coordinate'), self.get_column('speed'), self.get_column('lane'),
+            self.get_column('car_type'), self.context.sections_max_speed)
+
+    def is_finished(self):
+        return (self.is_production_finished()
+            and not any(np.any(segment_road.fleet.lane[:segment_road.fleet.size] > 0)
+            for segment_road in self.segments))
+
+    def finish(self):
+        self.stop_workers()
+        for segment_road in self.segments:
+            segment_road.fleet.close(unlink = True)
+        if (self.signs_block != None):
+            self.set_signs(np.array(self.context.sections_max_speed))
+            for segment_road in self.segments:
+                segment_road.context.sections_max_speed = self.context.sections_max_speed
+            self.signs_block.close()
+            self.signs_block.unlink()
+            self.signs_block = None
+        if (self.state_block != None):
+            self.sizes = np.array(self.sizes)
+            self.statistics = np.array(self.statistics)
+            for segment_road in self.segments:
+                segment_road.sizes = self.sizes
+                segment_road.statistics = self.statistics
+            self.state_block.close()
+            self.state_block.unlink()
+            self.state_block = None
+        vector_road.VectorRoad.finish(self)
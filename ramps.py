@@ -0,0 +1,79 @@
+"""
+Въезды и съезды дороги.
+Въезд (OnRamp) - участок полосы разгона (полоса 0) от start до end. Авто появляются в его
+начале по своему потоку 'demand' и перестраиваются на полосу 1 после start + 50, а в конце
+полосы разгона останавливаются, если перестроиться не удалось. Полосы разгона разных въездов
+не должны пересекаться. Случайное торможение на основной дороге чаще до конца полосы разгона
+въезда, который управляет участком (get_braking_end).
+Съезд (OffRamp) находится в точке position. Появившееся авто по очереди рассматривает съезды
+впереди себя (в порядке возрастания position) и выбирает съезд с вероятностью 'exit_fraction'.
+За 'approach' до выбранного съезда авто перестраивается вправо при любой безопасной
+возможности и не обгоняет, а доехав до position по полосе 1, покидает дорогу. Авто, не
+успевшее перестроиться, проезжает съезд и едет до конца дороги.
+"""
+
+import demand as demand_module
+
+class OnRamp():
+    def __init__(self, start, end, demand = None, demand_lane = 0):
+        """
+        demand - поток появления авто (demand.Demand), интервалы берутся для его полосы
+        demand_lane; если поток не задан, используется полоса 0 потока context.demand.
+        """
+        self.start = start
+        self.end = end
+        self.demand = demand
+        self.demand_lane = demand_lane
+
+    def get_demand(self, context):
+        if (self.demand == None):
+            return context.demand
+        return self.demand
+
+class OffRamp():
+    def __init__(self, position, exit_fraction, approach = 1000.0):
+        self.position = position
+        self.exit_fraction = exit_fraction
+        self.approach = approach
+
+def add_on_ramp(context, start, end, mean_intervals, distribution = 'uniform'):
+    """
+    Добавляет въезд со своим потоком появления авто: mean_intervals[hour] - средний интервал
+    между появлениями авто в час hour.
+    """
+    ramp_demand = demand_module.Demand([[interval] for interval in mean_intervals],
+        context.random.arrivals, distribution)
+    context.on_ramps.append(OnRamp(start, end, ramp_demand))
+
+def add_off_ramp(context, position, exit_fraction, approach = 1000.0):
+    context.off_ramps.append(OffRamp(position, exit_fraction, approach))
+    context.off_ramps.sort(key = lambda off_ramp: off_ramp.position)
+
+def get_braking_end(context, x_coordinate):
+    """
+    Конец полосы разгона въезда, который управляет точкой x_coordinate: последнего въезда,
+    начало которого не дальше x_coordinate, или самого первого въезда, если точка находится
+    до начала всех въездов. До этого конца авто чаще случайно тормозит
+    (car.get_braking_probability).
+    """
+    first = None
+    governing = None
+    for on_ramp in context.on_ramps:
+        if (first == None or on_ramp.start < first.start):
+            first = on_ramp
+        if (on_ramp.start <= x_coordinate
+                and (governing == None or on_ramp.start > governing.start)):
+            governing = on_ramp
+    if (governing == None):
+        governing = first
+    return governing.end
+
+def choose_off_ramp(context, x_coordinate):
+    """
+    Съезд, которым воспользуется авто, появившееся в точке x_coordinate, или None.
+    """
+    for off_ramp in context.off_ramps:
+        if (off_ramp.position > x_coordinate
+                and context.random.routes.bernoulli(off_ramp.exit_fraction)):
+            return off_ramp
+    return None
@@ -0,0 +1,55 @@
+"""
+Генераторы случайных чисел симуляции. У каждой симуляции свой numpy.random.Generator,
+порождённый от зерна 'seed', поэтому при одинаковом зерне прогоны совпадают в точности
+и не зависят от глобального состояния модулей random и numpy.random.
+Для каждого вида случайных величин (торможения, разброс характеристик авто, типы авто,
+интервалы появления авто, выбор съезда с дороги) заводится отдельный поток, чтобы, например,
+изменение числа торможений не сдвигало последовательность типов появляющихся авто.
+Скалярные значения берутся из заранее вычисленных блоков: вызов генератора numpy на одно
+значение дорог, а взять следующее число из списка дёшево.
+"""
+
+import numpy as np
+
+class BufferedStream():
+    def __init__(self, generator, block_size = 4096):
+        self.generator = generator
+        self.block_size = block_size
+        self.buffer = []
+        self.position = 0
+
+    def random(self):
+        """
+        Равномерно распределённое на [0, 1) число.
+        """
+        if (self.position == len(self.buffer)):
+            self.buffer = self.generator.random(self.block_size).tolist()
+            self.position = 0
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def bernoulli(self, probability):
+        return self.random() < probability
+
+    def random_array(self, size):
+        return self.generator.random(size)
+
+    def uniform_array(self, low, high, size = None):
+        return self.generator.uniform(low, high, size)
+
+"""
+Потоки в порядке их порождения от зерна: новые потоки добавляются только в конец, чтобы
+последовательности существующих не менялись.
+"""
+stream_names = ['braking', 'jitter', 'types', 'arrivals', 'routes']
+
+class RandomStreams():
+    def __init__(self, seed = None, block_size = 4096):
+        self.seed = seed
+        children = np.random.SeedSequence(seed).spawn(len(stream_names))
+        for name, child in zip(stream_names, children):
+            setattr(self, name, BufferedStream(np.random.default_rng(child), block_size))
@@ -0,0 +1,152 @@
+"""
+Запись траекторий автомобилей. Через каждые 'sample_interval' секунд модельного времени
+состояние авто (время, id, координаты, скорость, полоса, тип) добавляется в текущий блок;
+блок из не более чем 'chunk_rows' строк (кадр целиком всегда попадает в один блок)
+записывается фоновым потоком, поэтому запись не останавливает симуляцию, а в памяти
+одновременно находится не более 'max_pending_chunks' блоков.
+При 'compress' блок сжимается в файл chunk_NNNNN.npz, иначе каждый столбец блока пишется
+в отдельный файл chunk_NNNNN/<столбец>.npy, который можно отображать в память (см. replay).
+Кроме авто для каждого кадра записываются значения знаков на секциях (столбец 'signs',
+одна строка на кадр) в том же типе float64, что и context.sections_max_speed, поэтому replay
+показывает те же значения, что и симуляция. При закрытии записывается индекс кадров frames.npy: время кадра, номер
+блока, смещение первой строки кадра в блоке и количество строк; параметры дороги
+записываются в meta.json при начале записи.
+Необязательный 'vehicle_filter' по массиву id возвращает маску записываемых авто.
+"""
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+
+trajectory_columns = [('time', np.float64),
+                    ('id', np.int64),
+                    ('x_coordinate', np.float32),
+                    ('y_coordinate', np.float32),
+                    ('speed', np.float32),
+                    ('lane', np.int8),
+                    ('car_type', np.int8)]
+
+frame_dtype = np.dtype([('time', np.float64),
+                        ('chunk', np.int64),
+                        ('offset', np.int64),
+                        ('rows', np.int64)])
+
+def every_nth_vehicle(n):
+    def vehicle_filter(ids):
+        return ids % n == 0
+    return vehicle_filter
+
+def get_chunk_path(path, chunk, compress):
+    if (compress):
+        return os.path.join(path, 'chunk_%05d.npz' % chunk)
+    return os.path.join(path, 'chunk_%05d' % chunk)
+
+class TrajectoryRecorder():
+    def __init__(self, path, sample_interval = 1.0, vehicle_filter = None, chunk_rows = 1 << 20,
+            max_pending_chunks = 4, compress = True):
+        self.path = path
+        self.compress = compress
+        self.sample_interval = sample_interval
+        self.vehicle_filter = vehicle_filter
+        self.chunk_rows = chunk_rows
+        self.max_pending_chunks = max_pending_chunks
+        self.thread = None
+
+    def start(self, context):
+        os.makedirs(self.path, exist_ok = True)
+        meta = {'road_length': context.road_length,
+                'on_ramp_start': context.on_ramp_start,
+                'on_ramp_end': context.on_ramp_end,
+                'on_ramps': [[ramp.start, ramp.end] for ramp in context.on_ramps],
+                'off_ramps': [[ramp.position, ramp.exit_fraction, ramp.approach]
+                    for ramp in context.off_ramps],
+                'height': context.height,
+                'lanes_number': context.lanes_number,
+                'each_section_length': context.each_section_length,
+                'sections_number': context.sections_number,
+                'sample_interval': self.sample_interval,
+                'compress': self.compress}
+        with open(os.path.join(self.path, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file)
+        self.next_sample_time = None
+        self.frames = []
+        self.chunk = 0
+        self.parts = []
+        self.signs = []
+        self.rows = 0
+        self.error = None
+        self.chunks_queue = queue.Queue(self.max_pending_chunks)
+        self.thread = threading.Thread(target = self.write_chunks, daemon = True)
+        self.thread.start()
+
+    def write_chunks(self):
+        while True:
+            item = self.chunks_queue.get()
+            if (item == None):
+                break
+            chunk, columns = item
+            try:
+                chunk_path = get_chunk_path(self.path, chunk, self.compress)
+                if (self.compress):
+                    np.savez_compressed(chunk_path, **columns)
+                else:
+                    os.makedirs(chunk_path, exist_ok = True)
+                    for name, column in columns.items():
+                        np.save(os.path.join(chunk_path, name + '.npy'), column)
+            except Exception as error:
+                self.error = error
+
+    def is_due(self, now):
+        # допуск на ошибку округления модельного времени, накопленного по шагам
+        tolerance = 1e-6 * self.sample_interval
+        if (self.next_sample_time == None):
+            self.next_sample_time = now
+        if (now < self.next_sample_time - tolerance):
+            return False
+        while (self.next_sample_time <= now + tolerance):
+            self.next_sample_time += self.sample_interval
+        return True
+
+    def record(self, now, ids, x_coordinates, y_coordinates, speeds, lanes, car_types, signs):
+        values = [np.full(len(ids), now), ids, x_coordinates, y_coordinates, speeds, lanes,
+            car_types]
+        if (self.vehicle_filter != None):
+            mask = self.vehicle_filter(np.asarray(ids))
+            values = [np.asarray(value)[mask] for value in values]
+        rows = len(values[0])
+        if (self.rows > 0 and self.rows + rows > self.chunk_rows):
+            self.submit_chunk()
+        self.frames.append((now, self.chunk, self.rows, rows))
+        self.parts.append([np.asarray(value, dtype = dtype)
+            for value, (name, dtype) in zip(values, trajectory_columns)])
+        self.signs.append(np.array(signs, dtype = np.float64))
+        self.rows += rows
+
+    def submit_chunk(self):
+        if (self.error != None):
+            raise self.error
+        columns = {}
+        for k in range(len(trajectory_columns)):
+            name, dtype = trajectory_columns[k]
+            columns[name] = np.concatenate([part[k] for part in self.parts])
+        columns['signs'] = np.array(self.signs)
+        # блокируется, если фоновый поток не успевает записывать блоки
+        self.chunks_queue.put((self.chunk, columns))
+        self.chunk += 1
+        self.parts = []
+        self.signs = []
+        self.rows = 0
+
+    def close(self):
+        if (self.thread == None):
+            return
+        if (len(self.parts) > 0):
+            self.submit_chunk()
+        self.chunks_queue.put(None)
+        self.thread.join()
+        self.thread = None
+        np.save(os.path.join(self.path, 'frames.npy'), np.array(self.frames, dtype = frame_dtype))
+        if (self.error != None):
+            raise self.error
@@ -0,0 +1,105 @@
+"""
+Отрисовка дороги. Рисуется только видимая часть дороги шириной с окно, а не вся дорога:
+    - фон с полотном дороги и разметкой вычисляется один раз (разметка повторяется через
+      каждые 15 пикселей, поэтому достаточно куска шириной окно + 15) и затем только
+      копируется со сдвигом;
+    - шрифт создаётся один раз, надписи со значениями знаков кэшируются по тексту значения,
+      округлённого до десятых (так число надписей ограничено), изображения авто - по типу
+      авто;
+    - рисуются только знаки и авто, попадающие в окно.
+Отрисовка выполняется на каждом 'render_every'-м шаге симуляции, остальные шаги симуляция
+выполняет без отрисовки. Частота кадров ограничивается 'fps' кадрами в секунду (0 - без
+ограничения).
+"""
+
+import pygame
+
+import context as context_module
+import road
+
+class Renderer():
+    def __init__(self, context, screen_size, render_every = 1, fps = 20):
+        self.context = context
+        self.screen_size = screen_size
+        self.render_every = render_every
+        self.fps = fps
+        self.steps = 0
+        self.pygame_clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 20)
+        self.labels = {}
+        self.background = self.get_background()
+        self.car_images = []
+        for car_type in range(len(road.cars_sizes)):
+            image = pygame.Surface((road.cars_sizes[car_type], 6))
+            image.fill(road.cars_colors[car_type])
+            self.car_images.append(image)
+
+    def get_background(self):
+        height = self.context.height
+        lanes_number = self.context.lanes_number
+        background = pygame.Surface((self.screen_size[0] + 15, height))
+        background.fill(road.background_color)
+        road_top = context_module.get_lane_top(lanes_number - 1, height)
+        pygame.draw.rect(background, (80, 80, 80), [0, road_top, background.get_width(),
+            context_module.lane_width * (lanes_number - 1)])
+        for lane in range(1, lanes_number - 1):
+            y = context_module.get_lane_top(lane, height)
+            for i in range(int(background.get_width() / 15) + 1):
+                pygame.draw.rect(background, (230, 230, 230), [15 * i, y - 1, 5, 2])
+        return background
+
+    def get_label(self, value):
+        text = str(round(float(value), 1))
+        if (text not in self.labels):
+            self.labels[text] = self.font.render(text, 1, (255, 255, 255))
+        return self.labels[text]
+
+    def is_due(self):
+        self.steps += 1
+        return self.steps % self.render_every == 0
+
+    def draw(self, screen, left, x_coordinates, y_coordinates, car_types, track, knob):
+        """
+        Рисует часть дороги, начинающуюся с координаты left, авто с заданными координатами
+        и типами (авто вне окна можно не передавать) и полосу прокрутки.
+        """
+        left = int(left)
+        right = left + self.screen_size[0]
+        height = self.context.height
+        lanes_number = self.context.lanes_number
+        screen.blit(self.background, (-(left % 15), 0))
+
+        ramp_top = context_module.get_lane_top(0, height)
+        ramp_bottom = ramp_top + context_module.lane_width
+        for ramp in self.context.on_ramps:
+            if (ramp.start < right and ramp.end + 100 > left):
+                pygame.draw.rect(screen, (50, 50, 50), [ramp.start - left, ramp_top,
+                    ramp.end - ramp.start, context_module.lane_width])
+                pygame.draw.polygon(screen, (50, 50, 50), [(ramp.end - left, ramp_top),
+                    (ramp.end - left, ramp_bottom), (ramp.end + 100 - left, ramp_top)])
+        for off_ramp in self.context.off_ramps:
+            position = off_ramp.position
+            if (position - 300 < right and position > left):
+                pygame.draw.polygon(screen, (50, 50, 50), [(position - 300 - left, ramp_top),
+                    (position - 200 - left, ramp_bottom), (position - left, ramp_bottom),
+                    (position - left, ramp_top)])
+
+        each_section_length = self.context.each_section_length
+        road_top = context_module.get_lane_top(lanes_number - 1, height)
+        if (self.context.sections_number > 0):
+            first = max(0, int((left - 100) / each_section_length))
+            last = min(self.context.sections_number - 1, int(right / each_section_length))
+            for i in range(first, last + 1):
+                x = i * each_section_length + 2 - left
+                max_speed = self.context.sections_max_speed[i]
+                for lane in range(1, lanes_number):
+                    screen.blit(self.get_label(max_speed[lane]),
+                        (x, road_top - 25 - 30 * (lane - 1)))
+
+        for x, y, car_type in zip(x_coordinates, y_coordinates, car_types):
+            screen.blit(self.car_images[car_type], (int(x) - left, int(y)))
+
+        pygame.draw.rect(screen, road.buff, track, 0)
+        pygame.draw.rect(screen, road.blue, knob.inflate(0, -5), 2)
+        pygame.display.update()
+        self.pygame_clock.tick(self.fps)
@@ -0,0 +1,170 @@
+"""
+Просмотр записанной симуляции (см. recorder) без её повторного выполнения. Кадры рисуются тем же
+renderer.Renderer, что и при симуляции: дорога, въезды и съезды, значения знаков на секциях,
+полоса прокрутки.
+Блоки, записанные без сжатия (compress = False), отображаются в память, и с диска читаются только
+строки текущего кадра, причём из них только авто, попадающие в видимую часть дороги; сжатый
+блок распаковывается целиком при первом обращении к нему.
+
+Управление: стрелки влево/вправо - перемотка на 'seek_step' секунд назад/вперёд, стрелки
+вверх/вниз - ускорение/замедление воспроизведения в 2 раза, пробел - пауза.
+Запуск: python replay.py path [skip_frames]
+"""
+
+import json
+import os
+import sys
+import numpy as np
+import pygame
+
+import context
+import ramps
+import recorder
+import renderer
+import road
+import speed_manager
+
+seek_step = 60.0
+
+class TrajectoryReader():
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        self.frames = np.load(os.path.join(path, 'frames.npy'))
+        self.chunk_number = -1
+        self.chunk = None
+        self.first_frame = 0
+
+    def get_frames_number(self):
+        return len(self.frames)
+
+    def find_frame(self, time):
+        """
+        Номер первого кадра, записанного не раньше момента time.
+        """
+        number = int(np.searchsorted(self.frames['time'], time))
+        return max(0, min(number, len(self.frames) - 1))
+
+    def get_chunk(self, chunk):
+        if (chunk != self.chunk_number):
+            chunk_path = recorder.get_chunk_path(self.path, chunk, self.meta['compress'])
+            names = [name for name, dtype in recorder.trajectory_columns] + ['signs']
+            if (self.meta['compress']):
+                with np.load(chunk_path) as data:
+                    self.chunk = dict((name, data[name]) for name in names)
+            else:
+                self.chunk = dict((name, np.load(os.path.join(chunk_path, name + '.npy'),
+                    mmap_mode = 'r')) for name in names)
+            self.chunk_number = chunk
+            self.first_frame = int(np.searchsorted(self.frames['chunk'], chunk))
+        return self.chunk
+
+    def get_frame(self, number, start = None, end = None):
+        """
+        Столбцы авто кадра number (только авто с координатой от start до end, если они заданы)
+        и значения знаков на секциях в этом кадре.
+        """
+        frame = self.frames[number]
+        chunk = self.get_chunk(int(frame['chunk']))
+        rows = slice(int(frame['offset']), int(frame['offset'] + frame['rows']))
+        x_coordinates = np.asarray(chunk['x_coordinate'][rows])
+        visible = np.ones(len(x_coordinates), dtype = bool)
+        if (start != None):
+            visible &= x_coordinates >= start
+        if (end != None):
+            visible &= x_coordinates <= end
+        indices = np.flatnonzero(visible) + rows.start
+        cars = {}
+        for name, dtype in recorder.trajectory_columns:
+            cars[name] = np.asarray(chunk[name][indices])
+        signs = np.asarray(chunk['signs'][number - self.first_frame])
+        return cars, signs
+
+class Replay():
+    def __init__(self, path):
+        self.reader = TrajectoryReader(path)
+        meta = self.reader.meta
+        self.context = context.SimulationContext(meta['road_length'], meta['on_ramp_start'],
+            meta['on_ramp_end'], meta['height'], lanes_number = meta.get('lanes_number', 3))
+        if ('on_ramps' in meta):
+            self.context.on_ramps = [ramps.OnRamp(start, end) for start, end in meta['on_ramps']]
+            self.context.off_ramps = [ramps.OffRamp(position, exit_fraction, approach)
+                for position, exit_fraction, approach in meta['off_ramps']]
+        speed_manager.Updater(self.context, meta['each_section_length'], 2, False).fill_sections()
+        self.road = road.Road(self.context, None, False)
+
+    def run(self, skip_frames = 0):
+        pygame.init()
+        screen = pygame.display.set_mode(self.road.scr_size)
+        screen_rect = screen.get_rect()
+        road_renderer = renderer.Renderer(self.context, self.road.scr_size)
+        pygame.display.set_caption('Replay')
+
+        # ----scrolling----
+        ratio = (1.0 * screen_rect.width) / self.road.width
+        scroll_thick = 20
+        track = pygame.Rect(screen_rect.left, screen_rect.bottom
+            - scroll_thick, screen_rect.width, scroll_thick)
+        knob = pygame.Rect(track)
+        knob.width = track.width * ratio
+        scrolling = False
+        # -----------------
+
+        number = 0
+        speed = 1
+        paused = False
+        frames_number = self.reader.get_frames_number()
+        running_process = frames_number > 0
+        while running_process:
+            # ----events----
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running_process = False
+                elif (event.type == pygame.KEYDOWN):
+                    now = self.reader.frames['time'][number]
+                    if (event.key == pygame.K_RIGHT):
+                        number = self.reader.find_frame(now + seek_step)
+                    elif (event.key == pygame.K_LEFT):
+                        number = self.reader.find_frame(now - seek_step)
+                    elif (event.key == pygame.K_UP):
+                        speed *= 2
+                    elif (event.key == pygame.K_DOWN):
+                        speed = max(1, speed // 2)
+                    elif (event.key == pygame.K_SPACE):
+                        paused = not paused
+                elif (event.type == pygame.MOUSEMOTION and scrolling):
+                    if event.rel[0] != 0:
+                        move = max(event.rel[0], track.left - knob.left)
+                        move = min(move, track.right - knob.right)
+                        if move != 0:
+                            knob.move_ip((move, 0))
+                elif (event.type == pygame.MOUSEBUTTONDOWN
+                        and knob.collidepoint(event.pos)):
+                    scrolling = True
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    scrolling = False
+            # --------------
+
+            # ----drawing----
+            start = knob.left / ratio
+            cars, signs = self.reader.get_frame(number, start - max(road.cars_sizes),
+                start + screen_rect.width)
+            self.context.sections_max_speed[:] = signs
+            road_renderer.draw(screen, start, cars['x_coordinate'], cars['y_coordinate'],
+                cars['car_type'], track, knob)
+            # ---------------
+
+            if (not paused):
+                number = min(number + speed * (1 + skip_frames), frames_number - 1)
+
+        pygame.quit()
+
+if __name__ == '__main__':
+    if (len(sys.argv) < 2):
+        print ("Args : path [skip_frames]")
+        sys.exit(0)
+    skip_frames = 0
+    if (len(sys.argv) > 2):
+        skip_frames = int(sys.argv[2])
+    Replay(sys.argv[1]).run(skip_frames)
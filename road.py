@@ -4,17 +4,21 @@
 и непосредственно отрисовку дороги и автомобилей.
 """
 
+import bisect
+import numpy as np
 import pygame
-import random
-import time
 import queue
-import matplotlib.pyplot as plt
-import numpy as np
-import multiprocessing as mp
 import os
 
 import car
+import checkpoint
+import clock
+import context as context_module
+import lane_index
+import ramps
+import renderer
 import speed_manager
+import stats
 
 #----colors----
 background_color = (0, 150, 10)
@@ -46,6 +50,14 @@ total_cars_number = [[[200, 200], [720, 80], [720, 80]],
                     [[200, 200], [720, 80], [720, 80]]]
 #-----------------------
 
+def get_cars_numbers(hour, lane):
+    """
+    Количества авто типов A и B на полосе lane в час hour; для полос левее последней полосы
+    таблицы 'total_cars_number' берутся значения последней полосы.
+    """
+    hour_numbers = total_cars_number[hour]
+    return hour_numbers[min(lane, len(hour_numbers) - 1)]
+
 #----max_speeds----
 max_speeds = [100.0, 95.0, 85.0, 90.0]
 #------------------
@@ -54,17 +66,28 @@ max_speeds = [100.0, 95.0, 85.0, 90.0]
 delta_time_for_hour = [900.0, 1800.0, 900.0]
 #------------------
 
-def draw_text(text, coords, screen):
-   font = pygame.font.Font(None, 20)
-   text_to_draw = font.render(text, 1, (255, 255, 255))
-   screen.blit(text_to_draw, coords)
+def get_sources(context):
+    """
+    Места появления авто: полосы разгона всех въездов (в порядке context.on_ramps), затем полосы
+    дороги с первой. Источник - пара (полоса, въезд), для полос дороги въезд None.
+    """
+    return ([(0, ramp) for ramp in context.on_ramps]
+        + [(lane, None) for lane in range(1, context.lanes_number)])
 
 class Road:
-    def __init__(self, updater, width, height, adaptive_top_speed, on_ramp_start, on_ramp_end):
+    def __init__(self, context, updater, adaptive_top_speed, trips_path = None, recorder = None,
+            instrumentation = None):
+        """
+        Если задан trips_path, записи о поездках всех авто сохраняются в этот файл
+        (см. stats.TripStatistics). Если задан recorder (recorder.TrajectoryRecorder),
+        в него записываются траектории авто. Если задан instrumentation
+        (instrumentation.Instrumentation), в нём накапливаются время по фазам шага и счётчики.
+        """
+        self.context = context
         self.updater = updater
-        self.scr_size = (1290, height)
-        self.width = width
-        self.height = height
+        self.scr_size = (1290, context.height)
+        self.width = context.road_length
+        self.height = context.height
         self.avg_time = 0.0
         self.sd_time = 0.0
         self.avg_consumption = 0.0
@@ -72,82 +95,242 @@ class Road:
         self.avg_emissions = 0.0
         self.sd_emissions = 0.0
         self.adaptive_top_speed = adaptive_top_speed
-        self.on_ramp_start = on_ramp_start
-        self.on_ramp_end = on_ramp_end
+        self.trips_path = trips_path
+        self.recorder = recorder
+        self.instrumentation = instrumentation
 
-    def produce_car(self, prev_car_time, hour, lane, cars_number, cars, pygame_cars_list,
-            cars_queue, last_car):
+    def produce_car(self, source):
         # ----cars production----
-        time_interval = Road.time_intervals[hour][lane][Road.production_times[lane]]
-        if (time.time() - prev_car_time[lane] > time_interval):
-            A_B_type_probability = (1.0 * total_cars_number[hour][lane][0]
-                / (total_cars_number[hour][lane][0] + total_cars_number[hour][lane][1]))
-            A_B = np.random.binomial(1, 1.0 - A_B_type_probability)
-            first_or_second = np.random.binomial(1, 0.5)
+        lane, ramp = self.sources[source]
+        if (ramp == None):
+            source_demand = self.context.demand
+            demand_lane = lane
+        else:
+            source_demand = ramp.get_demand(self.context)
+            demand_lane = ramp.demand_lane
+        time_interval = source_demand.get_interval(self.hour, demand_lane)
+        if (self.context.clock.now() - self.prev_car_time[source] > time_interval):
+            hour = self.hour
+            cars_numbers = get_cars_numbers(hour, lane)
+            A_B_type_probability = 1.0 * cars_numbers[0] / (cars_numbers[0] + cars_numbers[1])
+            A_B = int(self.context.random.types.bernoulli(1.0 - A_B_type_probability))
+            first_or_second = int(self.context.random.types.bernoulli(0.5))
             car_type = 2 * A_B + first_or_second
             startX = -cars_sizes[car_type]
-            if (lane == 0):
-                startX += self.on_ramp_start
-            cars[lane].append(car.Car(startX, self.height / 2 - 25 * lane + 35,
+            if (ramp != None):
+                startX += ramp.start
+            new_car = car.Car(self.context, startX, context_module.get_lane_y(lane, self.height),
                 lane, max_speeds[car_type], accelerations[car_type], decelerations[car_type],
-                cars_sizes[car_type], 6, None, None, self.adaptive_top_speed, cars_colors[car_type], car_type))
-            if (last_car[lane] == None):
-                last_car[lane] = cars[lane][-1]
-                pygame_cars_list[lane].add(last_car[lane])
+                cars_sizes[car_type], None, None, self.adaptive_top_speed, car_type, ramp)
+            if (len(self.context.off_ramps) > 0):
+                new_car.exit_ramp = ramps.choose_off_ramp(self.context, startX)
+            new_car.id = self.next_id
+            self.next_id += 1
+            if (self.last_car[source] == None):
+                self.last_car[source] = new_car
+                self.context.lane_index.add(self.last_car[source])
+                self.pygame_cars_list[lane].add(self.last_car[source])
             else:
-                cars_queue[lane].put(cars[lane][-1])
-            cars_number[hour][lane][A_B] += 1
-            prev_car_time[lane] = time.time()
-            Road.production_times[lane] += 1
+                self.cars_queue[source].put(new_car)
+            self.cars_number[hour][lane][A_B] += 1
+            self.produced[lane] += 1
+            self.prev_car_time[source] = self.context.clock.now()
+            source_demand.next_car(demand_lane)
         # -----------------------
 
-    def add_car_on_road(self, cars_queue, lane, last_car, pygame_cars_list):
+    def add_car_on_road(self, source):
         # ----cars adding----
+        lane, ramp = self.sources[source]
         dist = 25.0
-        if (lane == 0):
-            dist += self.on_ramp_start
-        if (not cars_queue[lane].empty() and last_car[lane].rect.x > dist):
-            new_car = cars_queue[lane].get()
-            last_car[lane] = new_car
-            new_car.find_next(pygame_cars_list)
-            pygame_cars_list[lane].add(new_car)
+        if (ramp != None):
+            dist += ramp.start
+        if (not self.cars_queue[source].empty() and self.last_car[source].rect_x > dist):
+            new_car = self.cars_queue[source].get()
+            self.last_car[source] = new_car
+            new_car.find_next(self.pygame_cars_list)
+            self.pygame_cars_list[lane].add(new_car)
         # -------------------
 
-    def draw(self, full_road, pygame_cars_list, screen, knob, ratio, track, pygame_clock):
-        # ----drawing----
-        full_road.fill(background_color)
-        pygame.draw.rect(full_road, (80, 80, 80), [0, self.height / 2 - 25, self.width, 50])
-        for i in range(int(self.width / 15) + 5):
-            pygame.draw.rect(full_road, (230, 230, 230), [15 * i, self.height / 2 - 1, 5, 2])
-        pygame.draw.rect(full_road, (50, 50, 50), [self.on_ramp_start, self.height / 2 + 25,
-            self.on_ramp_end - self.on_ramp_start, 25])
-        pygame.draw.polygon(full_road, (50, 50, 50), [(self.on_ramp_end, self.height / 2 + 25),
-            (self.on_ramp_end, self.height / 2 + 50), (self.on_ramp_end + 100,
-            self.height / 2 + 25)])
-        for i in range (car.Car.sections_number):
-            draw_text(str(car.Car.sections[i].max_speed[1]), (i * car.Car.each_section_length + 2,
-                full_road.get_height() / 2 - 50), full_road)
-            draw_text(str(car.Car.sections[i].max_speed[2]), (i * car.Car.each_section_length + 2,
-                full_road.get_height() / 2 - 80), full_road)
-        for i in range(3):
-            pygame_cars_list[i].draw(full_road)
-        screen.blit(full_road, ((knob.left / ratio) * -1 , 0))
-        pygame.draw.rect(screen, buff, track, 0)
-        pygame.draw.rect(screen, blue, knob.inflate(0, -5), 2)
-        pygame.display.update()
-        pygame_clock.tick(20)
-        # ---------------
-
-    def run(self):
+    def get_visible_cars(self, start, end):
+        """
+        Координаты и типы авто, попадающих в отрезок дороги [start, end].
+        """
+        lanes = self.context.lane_index.lanes
+        start -= self.context.lane_index.max_width
+        cars = []
+        for lane in range(len(lanes)):
+            first = bisect.bisect_left(lanes[lane], start, key = lane_index.get_x)
+            last = bisect.bisect_right(lanes[lane], end, key = lane_index.get_x)
+            cars.extend(lanes[lane][first:last])
+        return ([carr.x_coordinate for carr in cars], [carr.y_coordinate for carr in cars],
+            [carr.car_type for carr in cars])
+
+    def get_motion_arrays(self):
+        """
+        Полосы, координаты, скорости и длины авто на дороге и координаты, перед которыми они
+        должны остановиться (см. step_control).
+        """
+        cars = [carr for cars in self.context.lane_index.lanes for carr in cars]
+        return (np.array([carr.lane for carr in cars], dtype = np.int64),
+            np.array([carr.x_coordinate for carr in cars]),
+            np.array([carr.speed for carr in cars]), np.array([carr.width for carr in cars]),
+            np.array([carr.ramp.end if carr.lane == 0 else np.inf for carr in cars]))
+
+    def init_state(self):
+        now = self.context.clock.now()
+        # ----cars----
+        lanes_number = self.context.lanes_number
+        self.cars_number = [[[0, 0] for lane in range(lanes_number)]
+            for hour in range(len(delta_time_for_hour))]
+        self.produced = [0] * lanes_number
+        self.next_id = 0
+        self.pygame_cars_list = [car.CarGroup() for lane in range(lanes_number)]
+        self.sources = get_sources(self.context)
+        self.prev_car_time = [now] * len(self.sources)
+        self.cur_time = now
+        self.cars_queue = [queue.Queue() for source in self.sources]
+        self.last_car = [None] * len(self.sources)
+        self.context.lane_index = lane_index.LaneIndex(lanes_number,
+            self.context.lane_change_cooldown != None)
+        trips_output = None
+        if (self.trips_path != None):
+            trips_output = open(self.trips_path, 'wb')
+        self.context.trips = stats.TripStatistics(output = trips_output)
+        if (self.recorder != None):
+            self.recorder.start(self.context)
+        self.context.instrumentation = self.instrumentation
+        if (self.instrumentation != None):
+            self.instrumentation.reset()
+        # ------------
+
+        #----timing----
+        self.hour = 0
+        self.start_time = now
+        self.updater.reset_timers()
+        self.updater.reset_statistics()
+        #--------------
+
+    def step(self):
+        """
+        За один шаг выполняются следующие действия:
+            1. Обнавляются значения знаков ограничения скорости на каждом из отрезков дороги.
+            2. Добавляются новые авто в начало дороги.
+            3. Обновляются координаты и скорости авто, находящихся на дороге.
+        Время шага берётся из часов контекста симуляции.
+        """
+        now = self.context.clock.now()
+        if (self.context.instrumentation != None):
+            self.step_instrumented(now, self.context.instrumentation)
+        else:
+            self.update_time(now)
+
+            # ----updating max speeds on sections----
+            self.update_signs()
+            # ---------------------------------------
+
+            self.produce_cars()
+            self.add_cars()
+            self.update_cars()
+
+        if (self.recorder != None and self.recorder.is_due(now)):
+            self.record_frame(now)
+
+    def step_instrumented(self, now, instrumentation):
+        """
+        Тот же шаг с замером времени каждой фазы.
+        """
+        start = instrumentation.start()
+        self.update_time(now)
+        start = instrumentation.stop('hour', start)
+        self.update_signs()
+        start = instrumentation.stop('update_speeds', start)
+        self.produce_cars()
+        start = instrumentation.stop('produce_car', start)
+        self.add_cars()
+        start = instrumentation.stop('add_car_on_road', start)
+        self.update_cars()
+        instrumentation.stop('update', start)
+        instrumentation.end_step(now, [len(cars) for cars in self.pygame_cars_list])
+
+    def update_time(self, now):
+        #----update hour----
+        if (self.hour < 3 and now - self.start_time > delta_time_for_hour[self.hour]):
+            self.hour += 1
+            self.start_time = now
+        #-------------------
+
+        self.context.delta_time = now - self.cur_time
+        self.cur_time = now
+
+    def update_signs(self):
+        self.updater.update_speeds(self.pygame_cars_list)
+
+    def produce_cars(self):
+        # ----cars production----
+        if (self.hour < 3):
+            for source in range(len(self.sources)):
+                self.produce_car(source)
+        # -----------------------
+
+    def add_cars(self):
+        # ----cars adding----
+        for source in range(len(self.sources)):
+            self.add_car_on_road(source)
+        # -------------------
+
+    def update_cars(self):
+        for cars in self.pygame_cars_list:
+            cars.update(self.pygame_cars_list)
+        self.context.lane_index.refresh()
+
+    def record_frame(self, now):
+        cars = [carr for cars in self.pygame_cars_list for carr in cars]
+        self.recorder.record(now, [carr.id for carr in cars], [carr.x_coordinate for carr in cars],
+            [carr.y_coordinate for carr in cars], [carr.speed for carr in cars],
+            [carr.lane for carr in cars], [carr.car_type for carr in cars],
+            self.context.sections_max_speed)
+
+    def is_finished(self):
+        """
+        Симуляция закончена, когда на полосы дороги (кроме полосы разгона) уже выпускались авто
+        и все они покинули дорогу.
+        """
+        lanes = range(1, self.context.lanes_number)
+        return (any(self.produced[lane] > 0 for lane in lanes)
+            and all(len(self.pygame_cars_list[lane]) == 0 for lane in lanes)
+            and all(self.cars_queue[source].empty()
+            for source in range(len(self.sources)) if self.sources[source][1] == None))
+
+    def finish(self):
+        if (self.recorder != None):
+            self.recorder.close()
+        self.context.trips.close()
+        if (self.context.trips.output != None):
+            self.context.trips.output.close()
+
+    def get_results(self):
+        """
+        Средние и стандартные отклонения берутся из статистики уже покинувших дорогу авто,
+        поэтому результаты можно получить и посреди симуляции.
+        """
+        (self.avg_time, self.sd_time, self.avg_consumption, self.sd_consumption, self.avg_emissions,
+            self.sd_emissions) = self.context.trips.get_results()
+        return (self.avg_time, self.sd_time, self.avg_consumption, self.sd_consumption,
+            self.avg_emissions, self.sd_emissions, self.cars_number)
+
+    def run(self, render_every = 1):
+        """
+        Отрисовка выполняется на каждом render_every-м шаге симуляции (см. renderer).
+        """
+        self.context.clock = clock.RealClock()
         pygame.init()
-        pygame_clock = pygame.time.Clock()
         screen = pygame.display.set_mode(self.scr_size)
         screen_rect = screen.get_rect()
-        full_road = pygame.Surface((self.width, self.height))
+        road_renderer = renderer.Renderer(self.context, self.scr_size, render_every)
         pygame.display.set_caption('Road')
 
         # ----scrolling----
-        ratio = (1.0 * screen_rect.width) / full_road.get_width()
+        ratio = (1.0 * screen_rect.width) / self.width
         scroll_thick = 20
         track = pygame.Rect(screen_rect.left, screen_rect.bottom
             - scroll_thick, screen_rect.width, scroll_thick)   
@@ -155,57 +338,21 @@ class Road:
         knob.width = track.width * ratio
         scrolling = False
         # -----------------
-        
-        # ----cars----
-        cars_number = [[[0, 0], [0, 0], [0, 0]],
-                        [[0, 0], [0, 0], [0, 0]],
-                        [[0, 0], [0, 0], [0, 0]]]
-        cars = [[],[], []]
-        pygame_cars_list = [pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group()]
-        running_process = True
-        prev_car_time = [time.time(), time.time(), time.time()]
-        cur_time = time.time()
-        cars_queue = [queue.Queue(), queue.Queue(), queue.Queue()]
-        last_car = [None, None, None]
-        # ------------
 
-        #----timing----
-        hour = 0
-        start_time = time.time()
-        #--------------
+        self.init_state()
+        running_process = True
 
         """
         В каждый момент времени в этом цикле выполняются при возможности несколько действий:
-            1. Обнавляются значения знаков ограничения скорости на каждом из отрезков дороги.
-            2. Добавляются новые авто в начало дороги.
-            3. Обрабатываются действия пользователя(нажатие каких-то клавиш, закрытие окна).
-            4. Выполняется отрисовка дороги, автомобилей.
+            1. Выполняется шаг симуляции (см. step).
+            2. Обрабатываются действия пользователя(нажатие каких-то клавиш, закрытие окна).
+            3. Выполняется отрисовка дороги, автомобилей.
         """
         while running_process:
-            #----update hour----
-            if (hour < 3 and time.time() - start_time > delta_time_for_hour[hour]):
-                hour += 1
-                start_time = time.time()
-            #-------------------
-
-            # ----updating max speeds on sections----
-            self.updater.update_speeds(pygame_cars_list)
-            # ---------------------------------------
-
-            car.Car.delta_time = time.time() - cur_time
-            cur_time = time.time()
-
-            # ----cars production----
-            if (hour < 3):
-                for lane in range(3):
-                    self.produce_car(prev_car_time, hour, lane, cars_number, cars,
-                        pygame_cars_list, cars_queue, last_car)
-            # -----------------------
-
-            # ----cars adding----
-            for lane in range(3):
-                self.add_car_on_road(cars_queue, lane, last_car, pygame_cars_list)
-            # -------------------
+            self.step()
+            instrumentation = self.context.instrumentation
+            if (instrumentation != None):
+                start_time = instrumentation.start()
 
             # ----events----
             for event in pygame.event.get():
@@ -223,18 +370,48 @@ class Road:
                 elif event.type == pygame.MOUSEBUTTONUP:
                     scrolling = False
             # --------------
+            if (instrumentation != None):
+                start_time = instrumentation.stop('events', start_time)
 
-            for i in range(3):
-                pygame_cars_list[i].update(pygame_cars_list)
             # ----drawing----
-            self.draw(full_road, pygame_cars_list, screen, knob, ratio, track, pygame_clock)
+            if (road_renderer.is_due()):
+                start = knob.left / ratio
+                x_coordinates, y_coordinates, car_types = self.get_visible_cars(start,
+                    start + screen_rect.width)
+                road_renderer.draw(screen, start, x_coordinates, y_coordinates, car_types, track,
+                    knob)
             # ---------------
+            if (instrumentation != None):
+                instrumentation.stop('draw', start_time)
 
-            if ((len(cars[1]) > 0 or len(cars[2]) > 0) and cars_queue[1].empty()
-                    and pygame_cars_list[1].__len__() == 0 and cars_queue[2].empty()
-                    and pygame_cars_list[2].__len__() == 0):
+            if (self.is_finished()):
                 running_process = False
 
         pygame.quit()
-        return (self.avg_time, self.sd_time, self.avg_consumption, self.sd_consumption,
-            self.avg_emissions, self.sd_emissions, cars_number)
\ No newline at end of file
+        self.finish()
+        return self.get_results()
+
+    def run_headless(self, time_step = 0.05, max_time = None, checkpoint_path = None,
+            seed = None, time_stepper = None):
+        """
+        Безоконный режим: модельное время продвигается на фиксированный шаг time_step,
+        отрисовки и ограничения частоты кадров нет, поэтому симуляция идёт так быстро, как
+        позволяет процессор. max_time ограничивает модельное время симуляции (в секундах).
+        Если задан checkpoint_path, симуляция продолжается с контрольной точки (см. checkpoint),
+        а seed задаёт новое зерно генераторов случайных чисел после восстановления.
+        Если задан time_stepper (step_control.AdaptiveStep), шаг выбирается им перед каждым
+        шагом.
+        """
+        self.context.clock = clock.SimulatedClock()
+        self.init_state()
+        if (checkpoint_path != None):
+            checkpoint.restore(self, checkpoint_path, seed)
+        while not self.is_finished():
+            if (time_stepper != None):
+                time_step = time_stepper.get_step(self)
+            self.context.clock.advance(time_step)
+            self.step()
+            if (max_time != None and self.context.clock.now() >= max_time):
+                break
+        self.finish()
+        return self.get_results()
@@ -7,17 +7,21 @@
 скорости.
 """
 
-import time
+import bisect
 import numpy as np
 
-import car
+import lane_index as lane_index_module
 
 class Section():
-    def __init__(self, start, end, max_speed):
+    """
+    Значения знаков и времена их последнего обновления хранятся в общих для всех секций массивах
+    контекста sections_max_speed и sections_last_update, секция держит ссылки на свои строки.
+    """
+    def __init__(self, start, end, max_speed, last_update):
         self.start = start
         self.end = end
-        self.max_speed = [max_speed, max_speed, max_speed]
-        self.last_update = [time.time(), time.time(), time.time()]
+        self.max_speed = max_speed
+        self.last_update = last_update
 
 def get_reducing_coefficient(max_speed):
     if (max_speed < 80):
@@ -27,9 +31,11 @@ def get_reducing_coefficient(max_speed):
     return 0.85
 
 class Updater():
-    def __init__(self, road_length, each_section_length, algorithm, adaptive_top_speed,
-            max_speed = 100.0, slow_cars_coefficient = 0.7, steps_backword = 1):
-        self.road_length = road_length
+    def __init__(self, context, each_section_length, algorithm, adaptive_top_speed,
+            max_speed = 100.0, slow_cars_coefficient = 0.7, steps_backword = 1, update_interval = 0.0,
+            incremental = False):
+        self.context = context
+        self.road_length = context.road_length
         self.each_section_length = each_section_length
         self.max_speed = max_speed
         self.algorithm = algorithm
@@ -37,137 +43,278 @@ class Updater():
         self.slow_cars_coefficient = slow_cars_coefficient
         self.reducing_coefficient = get_reducing_coefficient(max_speed)
         self.steps_backword = steps_backword
-        self.last_update_time = time.time()
-        self.last_update_time_each_lane = [time.time(), time.time(), time.time()]
+        """
+        Знаки пересчитываются не чаще, чем раз в 'update_interval' секунд. При 'incremental'
+        количество авто на секциях поддерживает SectionTracker, а скорости суммируются только
+        на секциях, где знак может измениться (см. update_speeds_incrementally).
+        """
+        self.update_interval = update_interval
+        self.incremental = incremental
+        now = context.clock.now()
+        self.last_update_time = now
+        self.last_update_time_each_lane = [now] * context.lanes_number
+        self.last_evaluation_time = now
         self.reduced = False
 
+    def reset_timers(self):
+        now = self.context.clock.now()
+        self.last_update_time = now
+        self.last_update_time_each_lane = [now] * self.context.lanes_number
+        self.last_evaluation_time = now
+        if (self.context.sections_last_update is not None):
+            self.context.sections_last_update[:] = now
+
     def fill_sections(self):
-        car.Car.sections = []
-        car.Car.sections_number = 0
-        car.Car.each_section_length = self.each_section_length
+        self.context.sections = []
+        self.context.sections_number = int(np.ceil(self.road_length / self.each_section_length))
+        self.context.each_section_length = self.each_section_length
+        lanes_number = self.context.lanes_number
+        self.context.sections_max_speed = np.full((self.context.sections_number, lanes_number),
+            self.max_speed)
+        self.context.sections_last_update = np.full((self.context.sections_number, lanes_number),
+            self.context.clock.now())
         cur_section_start = 0
-        cur_section_end = car.Car.each_section_length
-        while (cur_section_start < self.road_length):
-            car.Car.sections_number += 1
-            car.Car.sections.append(Section(cur_section_start, min(cur_section_end,
-                self.road_length), self.max_speed))
-            cur_section_start += car.Car.each_section_length
-            cur_section_end += car.Car.each_section_length
+        cur_section_end = self.context.each_section_length
+        for i in range(self.context.sections_number):
+            self.context.sections.append(Section(cur_section_start, min(cur_section_end,
+                self.road_length), self.context.sections_max_speed[i],
+                self.context.sections_last_update[i]))
+            cur_section_start += self.context.each_section_length
+            cur_section_end += self.context.each_section_length
+
+    def reset_statistics(self):
+        self.context.section_tracker = None
+        if (self.incremental):
+            self.context.section_tracker = SectionTracker(self.context)
+
+    def is_update_time(self):
+        return self.context.clock.now() - self.last_update_time > 20.0
+
+    def is_evaluation_time(self):
+        now = self.context.clock.now()
+        if (now - self.last_evaluation_time < self.update_interval):
+            return False
+        self.last_evaluation_time = now
+        return True
 
     def update_speeds(self, cars):
+        if (not self.is_evaluation_time()):
+            return
+        tracker = self.context.section_tracker
+        if (tracker != None):
+            self.update_speeds_incrementally(tracker)
+        elif (self.algorithm == 2 or self.is_update_time()):
+            lanes, x_coordinates, speeds = get_cars_state(cars)
+            speeds_sum, cars_number = self.get_section_statistics(lanes, x_coordinates, speeds)
+            self.update_speeds_on_statistics(speeds_sum, cars_number)
+
+    def update_speeds_on_arrays(self, lanes, x_coordinates, speeds):
+        """
+        То же, что update_speeds, но состояние авто задано массивами полос, координат и скоростей.
+        """
+        if (self.is_evaluation_time() and (self.algorithm == 2 or self.is_update_time())):
+            speeds_sum, cars_number = self.get_section_statistics(lanes, x_coordinates, speeds)
+            self.update_speeds_on_statistics(speeds_sum, cars_number)
+
+    def update_speeds_incrementally(self, tracker):
+        """
+        Алгоритм 2 рассматривает только секции, на которых знак может измениться: там больше
+        4 авто или истекло удержание пониженной скорости. Для остальных секций он не изменил
+        бы значение знака. Алгоритмы 0 и 1 раз в 20 секунд берут статистику по всем секциям.
+        """
+        lanes_number = self.context.lanes_number
+        if (self.algorithm == 2):
+            for lane in range(1, lanes_number):
+                sections = self.get_candidate_sections(tracker.cars_number[:, lane], lane)
+                if (len(sections) > 0):
+                    speeds_sum, cars_number = tracker.get_statistics(sections, lane)
+                    self.updated_speeds_on_sections_many_times_each_lane(get_avg_speeds(speeds_sum,
+                        cars_number), cars_number, lane, sections)
+        elif (self.is_update_time()):
+            sections = range(self.context.sections_number)
+            speeds_sum = np.zeros((self.context.sections_number, lanes_number))
+            cars_number = np.zeros((self.context.sections_number, lanes_number))
+            for lane in range(1, lanes_number):
+                speeds_sum[:, lane], cars_number[:, lane] = tracker.get_statistics(sections, lane)
+            self.update_speeds_on_statistics(speeds_sum, cars_number)
+
+    def update_speeds_on_statistics(self, speeds_sum, cars_number):
+        """
+        Обновление знаков по сумме скоростей и количеству авто на секциях (массивы формы
+        (sections_number, lanes_number)).
+        """
         if (self.algorithm == 2):
-            for lane in range(1, 3):
-                self.updated_speeds_on_sections_many_times_each_lane(cars, lane)
+            avg_speeds = get_avg_speeds(speeds_sum, cars_number)
+            for lane in range(1, self.context.lanes_number):
+                self.updated_speeds_on_sections_many_times_each_lane(avg_speeds[:, lane],
+                    cars_number[:, lane], lane)
         else:
-            if (time.time() - self.last_update_time > 20.0):
+            if (self.is_update_time()):
+                speeds_sum = np.sum(speeds_sum[:, 1:], axis = 1)
+                cars_number = np.sum(cars_number[:, 1:], axis = 1)
+                avg_speeds = get_avg_speeds(speeds_sum, cars_number)
                 if (self.algorithm == 0):
-                    self.updated_speeds_on_sections_many_times(cars)
+                    self.updated_speeds_on_sections_many_times(avg_speeds, cars_number)
                 elif (self.algorithm == 1):
-                    self.update_speeds_on_sections_pairwise(cars)
-
-    def get_avg_speed_on_sections(self, cars):
-        avg_speed_on_sections = np.zeros(car.Car.sections_number)
-        cars_number_on_each_section = np.zeros(car.Car.sections_number)
-        for lane in [1, 2]:
-            for carr in cars[lane]:
-                if (carr.x_coordinate < self.road_length):
-                    section_number = int(carr.x_coordinate / car.Car.each_section_length)
-                    avg_speed_on_sections[section_number] += carr.speed
-                    cars_number_on_each_section[section_number] += 1
-
-        for i in range(car.Car.sections_number):
-            if (cars_number_on_each_section[i] > 0):
-                avg_speed_on_sections[i] /= cars_number_on_each_section[i]
-        return avg_speed_on_sections, cars_number_on_each_section
-    
-    def get_avg_speed_on_sections_on_lane(self, cars, lane):
-        avg_speed_on_sections = np.zeros(car.Car.sections_number)
-        cars_number_on_each_section = np.zeros(car.Car.sections_number)
-        for carr in cars[lane]:
-            if (carr.x_coordinate < self.road_length):
-                section_number = int(carr.x_coordinate / car.Car.each_section_length)
-                avg_speed_on_sections[section_number] += carr.speed
-                cars_number_on_each_section[section_number] += 1
-
-        for i in range(car.Car.sections_number):
-            if (cars_number_on_each_section[i] > 0):
-                avg_speed_on_sections[i] /= cars_number_on_each_section[i]
-        return avg_speed_on_sections, cars_number_on_each_section                                
-    
+                    self.update_speeds_on_sections_pairwise(avg_speeds, cars_number)
+
+    def get_candidate_sections(self, cars_number, lane):
+        now = self.context.clock.now()
+        return np.flatnonzero((cars_number > 4)
+            | ((self.context.sections_max_speed[:, lane] != self.max_speed)
+            & (now - self.context.sections_last_update[:, lane] > 20.0)))
+
+    def get_section_statistics(self, lanes, x_coordinates, speeds):
+        """
+        Сумма скоростей и количество авто на каждой секции каждой полосы (массивы формы
+        (sections_number, lanes_number)), вычисленные одним проходом np.bincount.
+        """
+        sections_number = self.context.sections_number
+        lanes_number = self.context.lanes_number
+        on_road = x_coordinates < self.road_length
+        section_numbers = (x_coordinates[on_road] / self.context.each_section_length).astype(int)
+        keys = section_numbers * lanes_number + lanes[on_road]
+        cars_number = np.bincount(keys, minlength = sections_number * lanes_number).astype(float)
+        speeds_sum = np.bincount(keys, weights = speeds[on_road],
+            minlength = sections_number * lanes_number).astype(float)
+        return (speeds_sum.reshape(sections_number, lanes_number),
+            cars_number.reshape(sections_number, lanes_number))
+
     def get_safe_speed(self, cur_speed, follow_speed, i):
-        if (follow_speed <= cur_speed):
-            return self.max_speed
-        T = 1.0
-        d_i_j = 1.0 * i * self.each_section_length
-        tau = d_i_j / (follow_speed - cur_speed)
-        rho_i = 1.0 / (follow_speed * T + 15.0)
-        rho_j = 1.0 / (cur_speed * T + 15.0)
-        c = (cur_speed * rho_j - follow_speed * rho_i) / (rho_j - rho_i)
-        safe_speed = cur_speed + (d_i_j + c * tau - cur_speed * T) / tau
-        return safe_speed
-
-    def updated_speeds_on_sections_many_times_each_lane(self, cars, lane):
-        avg_speeds, cars_number = self.get_avg_speed_on_sections_on_lane(cars, lane)
-        
-        for i in range(car.Car.sections_number):
-            section = car.Car.sections[i]
-            if (self.adaptive_top_speed):
-                if (cars_number[i] > 4 and avg_speeds[i] < self.slow_cars_coefficient 
-                        * car.Car.sections[i].max_speed[lane]):
-                    section.max_speed[lane] = self.max_speed * self.reducing_coefficient
-                    section.last_update[lane] = time.time()
-                else:
-                    if (time.time() - section.last_update[lane] > 20.0):
-                        section.max_speed[lane] = self.max_speed
-                        section.last_update[lane] = time.time()
-
-    def updated_speeds_on_sections_many_times(self, cars):
-        avg_speeds, cars_number_on_each_section = self.get_avg_speed_on_sections(cars)
-
-        examined_sections = np.zeros(car.Car.sections_number)
-        smth_updated = False
-        for i in range(car.Car.sections_number):
-            if (i >= 1 and self.adaptive_top_speed):
-                if (cars_number_on_each_section[i] > 0):
-                    if (avg_speeds[i] < self.slow_cars_coefficient
-                            * car.Car.sections[i].max_speed[0]
-                            and cars_number_on_each_section[i] > 5):
-                        for j in range(self.steps_backword):
-                            if (i - j >= 0):
-                                examined_sections[i - j] = 1
-                                if (car.Car.sections[i - j].max_speed[0] == self.max_speed):
-                                    smth_updated = True
-                                for lane in range(2):
-                                    car.Car.sections[i - j].max_speed[lane] = (self.max_speed
-                                        * self.reducing_coefficient)
-                    else:
-                        for j in range(self.steps_backword):
-                            if (i - j >= 0 and examined_sections[i - j] == 0):
-                                if (car.Car.sections[i - j].max_speed[0] != self.max_speed):
-                                    smth_updated = True
-                                for lane in range(2):
-                                    car.Car.sections[i - j].max_speed[lane] = self.max_speed
-                else:
-                    for j in range(self.steps_backword):
-                        if (i - j >= 0 and examined_sections[i - j] == 0):
-                            if (car.Car.sections[i - j].max_speed[0] != self.max_speed):
-                                smth_updated = True
-                            for lane in range(2):
-                                car.Car.sections[i - j].max_speed[lane] = self.max_speed
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            T = 1.0
+            d_i_j = 1.0 * i * self.each_section_length
+            tau = d_i_j / (follow_speed - cur_speed)
+            rho_i = 1.0 / (follow_speed * T + 15.0)
+            rho_j = 1.0 / (cur_speed * T + 15.0)
+            c = (cur_speed * rho_j - follow_speed * rho_i) / (rho_j - rho_i)
+            safe_speed = cur_speed + (d_i_j + c * tau - cur_speed * T) / tau
+        return np.where(follow_speed <= cur_speed, self.max_speed, safe_speed)
+
+    def updated_speeds_on_sections_many_times_each_lane(self, avg_speeds, cars_number, lane,
+            sections = slice(None)):
+        if (not self.adaptive_top_speed):
+            return
+        now = self.context.clock.now()
+        max_speed = self.context.sections_max_speed[sections, lane]
+        last_update = self.context.sections_last_update[sections, lane]
+        reduce = (cars_number > 4) & (avg_speeds < self.slow_cars_coefficient * max_speed)
+        restore = ~reduce & (now - last_update > 20.0)
+        max_speed[reduce] = self.max_speed * self.reducing_coefficient
+        max_speed[restore] = self.max_speed
+        last_update[reduce | restore] = now
+        self.context.sections_max_speed[sections, lane] = max_speed
+        self.context.sections_last_update[sections, lane] = last_update
+
+    def get_sign_lanes(self):
+        """
+        Полосы, на которые алгоритмы 0 и 1 ставят общий знак секции: все, кроме самой левой
+        полосы обгона, но не меньше полосы разгона и первой основной полосы (при 3 полосах -
+        полосы 0 и 1).
+        """
+        return slice(0, max(2, self.context.lanes_number - 1))
+
+    def updated_speeds_on_sections_many_times(self, avg_speeds, cars_number_on_each_section):
+        """
+        Секция, у которой в пределах steps_backword секций впереди (включая её саму) есть
+        медленная секция, получает пониженную скорость; иначе, если там есть хотя бы одна
+        секция с номером не меньше 1, скорость восстанавливается. Нулевая секция сама
+        не рассматривается. Решение принимается по значению на полосе 0, знаки ставятся на
+        полосы get_sign_lanes().
+        """
+        if (not self.adaptive_top_speed):
+            return
+        sections_number = self.context.sections_number
+        max_speed = self.context.sections_max_speed
+        considered = np.arange(sections_number) >= 1
+        slow = (considered & (cars_number_on_each_section > 5)
+            & (avg_speeds < self.slow_cars_coefficient * max_speed[:, 0]))
+        fast = considered & ~slow
+        reduced = np.zeros(sections_number, dtype = bool)
+        restored_first = np.zeros(sections_number, dtype = bool)
+        for j in range(min(self.steps_backword, sections_number)):
+            restored_first[:sections_number - j] |= fast[j:] & ~reduced[:sections_number - j]
+            reduced[:sections_number - j] |= slow[j:]
+        restored = restored_first & ~reduced
+        # знак меняется, если первая запись в секцию меняет его значение или если после
+        # восстановления скорость секции снова понижается
+        is_max = max_speed[:, 0] == self.max_speed
+        smth_updated = np.any((restored_first & (~is_max | reduced))
+            | (reduced & ~restored_first & is_max))
+        lanes = self.get_sign_lanes()
+        max_speed[reduced, lanes] = self.max_speed * self.reducing_coefficient
+        max_speed[restored, lanes] = self.max_speed
         if (smth_updated):
-            self.last_update_time = time.time()
-
-    def update_speeds_on_sections_pairwise(self, cars):
-        avg_speeds, cars_number_on_each_section = self.get_avg_speed_on_sections(cars)
-        smth_updated = False
-        for i in range(car.Car.sections_number - 1):
-            if (cars_number_on_each_section[i] > 0 and cars_number_on_each_section[i + 1] > 0):
-                if (self.adaptive_top_speed):
-                    for lane in range(2):
-                        car.Car.sections[i].max_speed[lane] = max(self.get_safe_speed(avg_speeds[i + 1],
-                            avg_speeds[i], 1), 0.7 * self.max_speed)
-                    smth_updated = True
-                else:
-                    smth_updated = True
-        if smth_updated:
-            self.last_update_time = time.time()
\ No newline at end of file
+            self.last_update_time = self.context.clock.now()
+
+    def update_speeds_on_sections_pairwise(self, avg_speeds, cars_number_on_each_section):
+        both = (cars_number_on_each_section[:-1] > 0) & (cars_number_on_each_section[1:] > 0)
+        if (self.adaptive_top_speed):
+            safe_speed = np.maximum(self.get_safe_speed(avg_speeds[1:], avg_speeds[:-1], 1),
+                0.7 * self.max_speed)
+            lanes = self.get_sign_lanes()
+            self.context.sections_max_speed[:-1][both, lanes] = safe_speed[both, np.newaxis]
+        if (np.any(both)):
+            self.last_update_time = self.context.clock.now()
+
+class SectionTracker():
+    """
+    Количество авто на каждой секции каждой полосы, которое поддерживается по мере движения:
+    авто сообщает о себе (move), только когда въезжает в новую секцию, меняет полосу или
+    покидает дорогу. Суммы скоростей считаются по требованию и только для нужных секций,
+    по отсортированным спискам индекса полос.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.cars_number = np.zeros((context.sections_number, context.lanes_number))
+
+    def get_section(self, carr):
+        if (carr.x_coordinate >= self.context.road_length):
+            return None
+        return int(carr.x_coordinate / self.context.each_section_length)
+
+    def remove(self, carr):
+        if (carr.tracked_section != None):
+            self.cars_number[carr.tracked_section, carr.tracked_lane] -= 1
+        carr.tracked_section = None
+        carr.tracked_end = float('inf')
+
+    def move(self, carr):
+        self.remove(carr)
+        section = self.get_section(carr)
+        carr.tracked_lane = carr.lane
+        if (section != None):
+            self.cars_number[section, carr.lane] += 1
+            carr.tracked_section = section
+            carr.tracked_end = (section + 1) * self.context.each_section_length
+
+    def get_statistics(self, sections, lane):
+        """
+        Суммы скоростей и количества авто на секциях sections полосы lane.
+        """
+        cars = self.context.lane_index.lanes[lane]
+        each_section_length = self.context.each_section_length
+        speeds_sum = np.zeros(len(sections))
+        cars_number = np.zeros(len(sections))
+        for k in range(len(sections)):
+            start = sections[k] * each_section_length
+            end = min(start + each_section_length, self.context.road_length)
+            first = bisect.bisect_left(cars, start, key = lane_index_module.get_x)
+            last = bisect.bisect_left(cars, end, lo = first, key = lane_index_module.get_x)
+            speeds_sum[k] = sum([carr.speed for carr in cars[first:last]])
+            cars_number[k] = last - first
+        return speeds_sum, cars_number
+
+def get_cars_state(cars):
+    """
+    Полосы, координаты и скорости авто на всех полосах, кроме полосы разгона, в виде массивов.
+    """
+    state = [(carr.lane, carr.x_coordinate, carr.speed) for lane in range(1, len(cars))
+        for carr in cars[lane]]
+    state = np.array(state, dtype = float).reshape(-1, 3)
+    return state[:, 0].astype(int), state[:, 1], state[:, 2]
+
+def get_avg_speeds(speeds_sum, cars_number):
+    avg_speeds = np.zeros(speeds_sum.shape)
+    np.divide(speeds_sum, cars_number, out = avg_speeds, where = cars_number > 0)
+    return avg_speeds
@@ -0,0 +1,154 @@
+"""
+Статистика поездок. Для каждого авто, покинувшего дорогу, записываются тип, полосы, по которым
+оно ехало (битовая маска), время въезда и выезда, средние расход топлива и выбросы.
+Записи складываются в заранее выделенные буферы фиксированного размера, по одному массиву на
+поле (trip_columns); заполненные буферы сбрасываются в файл (если он задан) и очищаются, поэтому
+память не зависит от количества авто. В файл и в контрольную точку записи попадают строками
+(trip_dtype, см. get_records).
+Средние значения и стандартные отклонения времени в пути, расхода и выбросов считаются
+на лету (алгоритм Уэлфорда) и доступны в любой момент симуляции.
+"""
+
+import math
+import numpy as np
+
+trip_columns = [('car_type', np.int8),
+                ('lanes_visited', np.uint8),
+                ('entry_time', np.float64),
+                ('exit_time', np.float64),
+                ('consumption', np.float64),
+                ('emissions', np.float64)]
+
+trip_dtype = np.dtype(trip_columns)
+
+class RunningStatistics():
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_array(self, values):
+        """
+        Добавление сразу массива значений (объединение статистик по формуле Чана).
+        """
+        count = len(values)
+        if (count == 0):
+            return
+        mean = float(np.mean(values))
+        m2 = float(np.sum((values - mean) ** 2))
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def get_mean(self):
+        return float(self.mean)
+
+    def get_sd(self):
+        if (self.count < 2):
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+class TripStatistics():
+    def __init__(self, buffer_size = 4096, output = None):
+        """
+        output - открытый на запись двоичный файл, в который буферы записываются
+        последовательными вызовами np.save (см. read_trips).
+        """
+        self.buffer_size = buffer_size
+        self.columns = {name: np.zeros(buffer_size, dtype = dtype) for name, dtype in trip_columns}
+        self.size = 0
+        self.output = output
+        self.time = RunningStatistics()
+        self.consumption = RunningStatistics()
+        self.emissions = RunningStatistics()
+
+    def get_records(self):
+        """
+        Записи, ещё не сброшенные в файл, массивом строк trip_dtype.
+        """
+        records = np.zeros(self.size, dtype = trip_dtype)
+        for name, dtype in trip_columns:
+            records[name] = self.columns[name][:self.size]
+        return records
+
+    def set_records(self, records):
+        for name, dtype in trip_columns:
+            self.columns[name][:len(records)] = records[name]
+        self.size = len(records)
+
+    def flush(self):
+        if (self.output != None and self.size > 0):
+            np.save(self.output, self.get_records())
+        self.size = 0
+
+    def record(self, car_type, lanes_visited, entry_time, exit_time, consumption, emissions):
+        if (self.size == self.buffer_size):
+            self.flush()
+        columns = self.columns
+        size = self.size
+        columns['car_type'][size] = car_type
+        columns['lanes_visited'][size] = lanes_visited
+        columns['entry_time'][size] = entry_time
+        columns['exit_time'][size] = exit_time
+        columns['consumption'][size] = consumption
+        columns['emissions'][size] = emissions
+        self.size += 1
+        self.time.add(exit_time - entry_time)
+        self.consumption.add(consumption)
+        self.emissions.add(emissions)
+
+    def record_arrays(self, car_type, lanes_visited, entry_time, exit_time, consumption,
+            emissions):
+        values = {'car_type': car_type,
+                'lanes_visited': lanes_visited,
+                'entry_time': entry_time,
+                'exit_time': exit_time,
+                'consumption': consumption,
+                'emissions': emissions}
+        start = 0
+        while (start < len(car_type)):
+            if (self.size == self.buffer_size):
+                self.flush()
+            end = min(len(car_type), start + self.buffer_size - self.size)
+            for name, column in self.columns.items():
+                column[self.size:self.size + end - start] = values[name][start:end]
+            self.size += end - start
+            start = end
+        self.time.add_array(exit_time - entry_time)
+        self.consumption.add_array(consumption)
+        self.emissions.add_array(emissions)
+
+    def get_results(self):
+        """
+        Среднее и стандартное отклонение времени в пути, расхода и выбросов.
+        """
+        return (self.time.get_mean(), self.time.get_sd(), self.consumption.get_mean(),
+            self.consumption.get_sd(), self.emissions.get_mean(), self.emissions.get_sd())
+
+    def close(self):
+        self.flush()
+        if (self.output != None):
+            self.output.flush()
+
+def read_trips(path):
+    """
+    Все записи файла, записанного TripStatistics, одним массивом.
+    """
+    chunks = []
+    with open(path, 'rb') as trips_file:
+        while True:
+            try:
+                chunks.append(np.load(trips_file))
+            except EOFError:
+                break
+    if (len(chunks) == 0):
+        return np.zeros(0, dtype = trip_dtype)
+    return np.concatenate(chunks)
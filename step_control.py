@@ -0,0 +1,152 @@
+"""
+Адаптивный шаг модельного времени для безоконного режима (road.Road.run_headless,
+vector_road.VectorRoad.run). Вместо фиксированного шага перед каждым шагом выбирается наибольший
+шаг, при котором:
+    - ни одно авто не сокращает зазор до впереди идущего авто своей полосы (или до конца полосы
+      разгона на полосе 0) больше чем на долю 'gap_fraction' этого зазора, т.е. шаг не больше
+      gap_fraction * зазор / скорость сближения. На свободной дороге шаг растёт до 'max_step',
+      а при догоне, у конца полосы разгона и при резком торможении впереди идущего уменьшается,
+      чтобы правило безопасной скорости (car.get_safe_speed) успевало реагировать;
+    - следующее по расписанию авто появляется не позже чем через 'min_step' после своего
+      времени.
+Шаг не бывает меньше 'min_step' - по умолчанию доли 'min_step_fraction' базового шага
+'base_step' (фиксированного шага, вместо которого используется AdaptiveStep), поэтому в плотном
+потоке шаг становится короче фиксированного; 'max_step' по умолчанию - 'max_step_factor'
+базовых шагов. Вероятность случайного торможения задана на шаг, а торможение
+за шаг пропорционально шагу, поэтому средняя потеря скорости в секунду от шага не зависит.
+Правила перестроений вычисляются на каждом шаге, а расход топлива усредняется по времени
+(car.Car.update_motion), поэтому результаты отличаются от прогона с мелким фиксированным
+шагом; величину отличия и выигрыш в скорости показывает compare_with_reference, а
+fit_to_tolerance уменьшает шаги, пока отличие не станет меньше допуска.
+"""
+
+import math
+import time
+import numpy as np
+
+min_step_fraction = 0.25
+max_step_factor = 3.0
+
+class AdaptiveStep():
+    def __init__(self, base_step = 0.05, min_step = None, max_step = None, gap_fraction = 0.05,
+            min_gap = 1.0):
+        if (min_step == None):
+            min_step = min_step_fraction * base_step
+        if (max_step == None):
+            max_step = max_step_factor * base_step
+        self.base_step = base_step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.gap_fraction = gap_fraction
+        self.min_gap = min_gap
+        self.steps = 0
+        self.limited_steps = 0
+        self.shortened_steps = 0
+
+    def get_motion_step(self, lanes, x_coordinates, speeds, widths, stop_coordinates):
+        """
+        Наибольший шаг по зазорам: stop_coordinates - координата, перед которой авто должно
+        остановиться (конец полосы разгона), или бесконечность.
+        """
+        if (len(lanes) == 0):
+            return self.max_step
+        order = np.lexsort((x_coordinates, lanes))
+        lanes = lanes[order]
+        x_coordinates = x_coordinates[order]
+        speeds = speeds[order]
+        widths = widths[order]
+        gaps = [stop_coordinates[order] - x_coordinates - widths]
+        closing_speeds = [speeds]
+        same_lane = lanes[1:] == lanes[:-1]
+        gaps.append((x_coordinates[1:] - x_coordinates[:-1] - widths[:-1])[same_lane])
+        closing_speeds.append((speeds[:-1] - speeds[1:])[same_lane])
+        gaps = np.maximum(np.concatenate(gaps), self.min_gap)
+        closing_speeds = np.concatenate(closing_speeds)
+        closing = closing_speeds > 0.0
+        if (not np.any(closing)):
+            return self.max_step
+        return self.gap_fraction * float(np.min(gaps[closing] / closing_speeds[closing]))
+
+    def get_production_step(self, my_road):
+        """
+        Время до появления следующего авто по расписанию источников дороги.
+        """
+        if (my_road.hour >= 3):
+            return math.inf
+        now = my_road.context.clock.now()
+        step = math.inf
+        for source in range(len(my_road.sources)):
+            lane, ramp = my_road.sources[source]
+            if (ramp == None):
+                source_demand = my_road.context.demand
+                demand_lane = lane
+            else:
+                source_demand = ramp.get_demand(my_road.context)
+                demand_lane = ramp.demand_lane
+            interval = source_demand.get_interval(my_road.hour, demand_lane)
+            step = min(step, my_road.prev_car_time[source] + interval - now)
+        return step + self.min_step
+
+    def get_step(self, my_road):
+        motion_step = self.get_motion_step(*my_road.get_motion_arrays())
+        step = min(self.max_step, motion_step, self.get_production_step(my_road))
+        self.steps += 1
+        if (motion_step < self.max_step):
+            self.limited_steps += 1
+        step = max(self.min_step, step)
+        if (step < self.base_step):
+            self.shortened_steps += 1
+        return step
+
+def run_road(my_road, time_step, max_time, time_stepper = None):
+    if (hasattr(my_road, 'run_headless')):
+        return my_road.run_headless(time_step, max_time, time_stepper = time_stepper)
+    return my_road.run(time_step, max_time, time_stepper)
+
+def compare_with_reference(make_road, max_time, time_stepper, reference_step = 0.01):
+    """
+    Прогоняет дорогу, построенную make_road(), с шагом time_stepper и с мелким фиксированным
+    шагом reference_step. Возвращает относительные отклонения средних времени в пути, расхода
+    и выбросов от эталона и модельные секунды на секунду процессорного времени обоих прогонов.
+    """
+    reference, reference_speed = run_reference(make_road, max_time, reference_step)
+    errors, speed = get_errors(make_road, max_time, time_stepper, reference, reference_step)
+    return errors, speed, reference_speed
+
+def fit_to_tolerance(make_road, max_time, time_stepper, tolerance = 0.02, reference_step = 0.01,
+        attempts = 4):
+    """
+    То же, что compare_with_reference, но пока наибольшее отклонение больше tolerance, вдвое
+    уменьшает gap_fraction, min_step и max_step time_stepper (не больше attempts раз) и
+    повторяет прогон. Если отклонение так и не стало меньше допуска, ValueError.
+    """
+    reference, reference_speed = run_reference(make_road, max_time, reference_step)
+    for attempt in range(attempts + 1):
+        errors, speed = get_errors(make_road, max_time, time_stepper, reference, reference_step)
+        if (max(errors) <= tolerance):
+            return errors, speed, reference_speed
+        time_stepper.gap_fraction /= 2.0
+        time_stepper.min_step /= 2.0
+        time_stepper.max_step /= 2.0
+    raise ValueError("adaptive step error %.4f exceeds tolerance %.4f" % (max(errors), tolerance))
+
+def run_reference(make_road, max_time, reference_step):
+    start = time.process_time()
+    reference = run_road(make_road(), reference_step, max_time)
+    for index in [0, 2, 4]:
+        # без завершённых поездок средние равны нулю или nan
+        if (not abs(reference[index]) > 0.0):
+            raise ValueError("the reference run completed no trips; increase max_time")
+    return reference, max_time / (time.process_time() - start)
+
+def get_errors(make_road, max_time, time_stepper, reference, reference_step):
+    """
+    Относительные отклонения средних времени в пути, расхода и выбросов прогона с шагом
+    time_stepper от эталона и модельные секунды на секунду процессорного времени прогона.
+    """
+    start = time.process_time()
+    result = run_road(make_road(), reference_step, max_time, time_stepper)
+    speed = max_time / (time.process_time() - start)
+    errors = [abs(result[index] - reference[index]) / abs(reference[index])
+        for index in [0, 2, 4]]
+    return errors, speed
@@ -0,0 +1,144 @@
+"""
+Пакетный запуск сценариев. Задаётся сетка параметров (длина дороги, начало и конец въезда,
+дополнительные въезды [start, end, средний интервал] и съезды [position, exit_fraction],
+алгоритм обновления знаков Updater, adaptive_top_speed, slow_cars_coefficient, steps_backword,
+update_interval, incremental, lane_change_cooldown, количество полос, распределение и профиль
+интервалов между появлениями авто, зерно генератора случайных чисел и т.д.), все их сочетания
+запускаются в безоконном режиме в пуле процессов на всех ядрах, а результаты записываются
+построчно в формате JSON по мере завершения сценариев.
+
+Запуск: python sweep.py grid.json results.jsonl [processes]
+В grid.json хранится словарь вида {"algorithm": [0, 1, 2], "seed": [1, 2, 3], ...}, параметры,
+которых нет в файле, берутся из default_parameters. Движок 'engine': 'object' (road.Road),
+'vector' (vector_road.VectorRoad) или 'hybrid' (hybrid_road.HybridRoad). Экспериментальный
+parallel_road.ParallelRoad в сетку не входит: в процессах пула он выполнял бы отрезки
+последовательно и только медленнее, чем vector_road.VectorRoad. Если задан 'adaptive_step'
+(словарь параметров step_control.AdaptiveStep, например {}), шаг выбирается адаптивно вместо
+'time_step'. 'lane_change_cooldown' поддерживают только движки 'object' и 'hybrid'.
+"""
+
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+
+import context
+import example
+import hybrid_road
+import ramps
+import road
+import speed_manager
+import step_control
+import vector_road
+
+default_parameters = {'road_length': 10000,
+                    'on_ramp_start': 2000,
+                    'on_ramp_end': 3000,
+                    'on_ramps': [],
+                    'off_ramps': [],
+                    'each_section_length': 1000.0,
+                    'algorithm': 2,
+                    'adaptive_top_speed': True,
+                    'slow_cars_coefficient': 0.7,
+                    'steps_backword': 1,
+                    'update_interval': 0.0,
+                    'incremental': False,
+                    'lane_change_cooldown': None,
+                    'seed': 0,
+                    'lanes_number': 3,
+                    'distribution': 'uniform',
+                    'demand_profile': 'intervals',
+                    'engine': 'object',
+                    'time_step': example.time_step,
+                    'adaptive_step': None,
+                    'max_time': None}
+
+def make_scenarios(grid):
+    names = list(grid.keys())
+    scenarios = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        scenario = dict(default_parameters)
+        scenario.update(zip(names, values))
+        scenarios.append(scenario)
+    return scenarios
+
+def run_scenario(parameters):
+    my_context = context.SimulationContext(parameters['road_length'],
+        parameters['on_ramp_start'], parameters['on_ramp_end'], 710, parameters['seed'],
+        parameters['lanes_number'])
+    example.fill_demand(my_context, parameters['distribution'], parameters['demand_profile'])
+    for start, end, mean_interval in parameters['on_ramps']:
+        ramps.add_on_ramp(my_context, start, end, [mean_interval] * len(road.delta_time_for_hour),
+            parameters['distribution'])
+    for position, exit_fraction in parameters['off_ramps']:
+        ramps.add_off_ramp(my_context, position, exit_fraction)
+    my_context.lane_change_cooldown = parameters['lane_change_cooldown']
+
+    updater = speed_manager.Updater(my_context, parameters['each_section_length'],
+        parameters['algorithm'], parameters['adaptive_top_speed'],
+        slow_cars_coefficient = parameters['slow_cars_coefficient'],
+        steps_backword = parameters['steps_backword'],
+        update_interval = parameters['update_interval'],
+        incremental = parameters['incremental'])
+    updater.fill_sections()
+
+    time_stepper = None
+    if (parameters['adaptive_step'] != None):
+        time_stepper = step_control.AdaptiveStep(**parameters['adaptive_step'])
+
+    start = time.time()
+    if (parameters['engine'] == 'vector'):
+        my_road = vector_road.VectorRoad(my_context, updater, parameters['adaptive_top_speed'])
+        result = my_road.run(parameters['time_step'], parameters['max_time'], time_stepper)
+    elif (parameters['engine'] == 'hybrid'):
+        my_road = hybrid_road.HybridRoad(my_context, updater, parameters['adaptive_top_speed'])
+        result = my_road.run_headless(parameters['time_step'], parameters['max_time'],
+            time_stepper = time_stepper)
+    else:
+        my_road = road.Road(my_context, updater, parameters['adaptive_top_speed'])
+        result = my_road.run_headless(parameters['time_step'], parameters['max_time'],
+            time_stepper = time_stepper)
+    avg_time, sd_time, avg_consumption, sd_consumption, avg_emissions, sd_emissions, cars_number \
+        = result
+    return {'parameters': parameters,
+            'avg_time': avg_time,
+            'sd_time': sd_time,
+            'avg_consumption': avg_consumption,
+            'sd_consumption': sd_consumption,
+            'avg_emissions': avg_emissions,
+            'sd_emissions': sd_emissions,
+            'cars_number': cars_number,
+            'wall_time': time.time() - start}
+
+def run_sweep(grid, output, processes = None):
+    """
+    Запускает все сценарии сетки grid и по мере их завершения пишет результаты в файл output,
+    по одной строке JSON на сценарий. Возвращает количество выполненных сценариев.
+    """
+    scenarios = make_scenarios(grid)
+    for scenario in scenarios:
+        if (scenario['engine'] not in ['object', 'vector', 'hybrid']):
+            raise ValueError("unknown engine: " + str(scenario['engine']))
+        if (scenario['lane_change_cooldown'] != None
+                and scenario['engine'] not in ['object', 'hybrid']):
+            raise ValueError("lane_change_cooldown is supported only by the object engines")
+    done = 0
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(run_scenario, scenarios):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            done += 1
+    return done
+
+if __name__ == '__main__':
+    if (len(sys.argv) < 3):
+        print ("Args : grid.json results.jsonl [processes]")
+        sys.exit(0)
+    with open(sys.argv[1]) as grid_file:
+        grid = json.load(grid_file)
+    processes = None
+    if (len(sys.argv) > 3):
+        processes = int(sys.argv[3])
+    with open(sys.argv[2], 'a') as output:
+        run_sweep(grid, output, processes)
@@ -0,0 +1,29 @@
+import batch_road
+import context
+import example
+import speed_manager
+import vector_road
+
+def make_replication(seed):
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, seed)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    return my_context, updater
+
+def test_batch_matches_sequential_runs():
+    seeds = [1, 2, 3]
+    contexts = []
+    updaters = []
+    for seed in seeds:
+        my_context, updater = make_replication(seed)
+        contexts.append(my_context)
+        updaters.append(updater)
+    batch = batch_road.BatchRoad(contexts, updaters, True)
+    batch_results = batch.run(0.05, 200.0)
+    assert batch.vehicle_steps > 0
+    for seed, batch_result in zip(seeds, batch_results):
+        my_context, updater = make_replication(seed)
+        my_road = vector_road.VectorRoad(my_context, updater, True)
+        # реплика пакета в точности повторяет отдельный прогон с тем же зерном
+        assert batch_result == my_road.run(0.05, 200.0)
@@ -0,0 +1,33 @@
+import pygame
+
+import car
+import context
+import example
+import road
+import speed_manager
+
+def test_cars_hold_only_slot_state():
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, 13)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    my_road = road.Road(my_context, updater, True)
+    my_road.run_headless(0.05, 60.0)
+    cars = [carr for group in my_road.pygame_cars_list for carr in group]
+    assert len(cars) > 0
+    for carr in cars:
+        assert not hasattr(carr, '__dict__')
+        assert not isinstance(carr, pygame.sprite.Sprite)
+        # все атрибуты из __slots__ заданы в конструкторе
+        for name in car.Car.__slots__:
+            getattr(carr, name)
+
+def test_car_group_keeps_insertion_order():
+    group = car.CarGroup()
+    for value in [3, 1, 2]:
+        group.add(value)
+    group.remove(1)
+    group.remove(5)
+    group.add(1)
+    assert list(group) == [3, 2, 1]
+    assert len(group) == 3
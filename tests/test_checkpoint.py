@@ -0,0 +1,32 @@
+import checkpoint
+import context
+import example
+import road
+import speed_manager
+
+def make_road(incremental):
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, 3)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True, incremental = incremental)
+    updater.fill_sections()
+    return road.Road(my_context, updater, True)
+
+def test_restored_run_matches_uninterrupted_run(tmp_path):
+    path = str(tmp_path / 'state.npz')
+    for incremental in [False, True]:
+        uninterrupted = make_road(incremental).run_headless(0.05, 200.0)
+        first_half = make_road(incremental)
+        first_half.run_headless(0.05, 100.0)
+        checkpoint.save(first_half, path)
+        assert first_half.context.trips.time.count > 0
+        resumed = make_road(incremental).run_headless(0.05, 200.0, checkpoint_path = path)
+        assert resumed == uninterrupted
+
+def test_reseeded_run_differs(tmp_path):
+    path = str(tmp_path / 'state.npz')
+    first_half = make_road(True)
+    first_half.run_headless(0.05, 100.0)
+    checkpoint.save(first_half, path)
+    resumed = make_road(True).run_headless(0.05, 200.0, checkpoint_path = path)
+    reseeded = make_road(True).run_headless(0.05, 200.0, checkpoint_path = path, seed = 11)
+    assert reseeded[:6] != resumed[:6]
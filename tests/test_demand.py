@@ -0,0 +1,37 @@
+import numpy as np
+
+import demand
+import random_streams
+
+def count_arrivals(my_demand, hour, lane, duration):
+    # авто появляется, когда с появления предыдущего прошёл текущий интервал
+    time = 0.0
+    arrivals = 0
+    while True:
+        time += my_demand.get_interval(hour, lane)
+        if (time > duration):
+            return arrivals
+        my_demand.next_car(lane)
+        arrivals += 1
+
+def test_arrival_counts_follow_mean_intervals():
+    cars_numbers = [[[300, 60], [900, 100]], [[1800, 200], [400, 50]]]
+    mean_intervals = demand.get_mean_intervals_from_counts(cars_numbers, [3600.0, 3600.0])
+    assert mean_intervals[0][1] == 3600.0 / 1000
+    for distribution in demand.distributions:
+        my_demand = demand.Demand(mean_intervals, random_streams.RandomStreams(1).arrivals,
+            distribution)
+        for hour in range(2):
+            for lane in range(2):
+                expected = sum(cars_numbers[hour][lane])
+                arrivals = count_arrivals(my_demand, hour, lane, 3600.0)
+                # пуассоновский поток: стандартное отклонение количества - корень из среднего
+                assert abs(arrivals - expected) < 4 * np.sqrt(expected)
+
+def test_first_interval_scale():
+    my_demand = demand.Demand([[10.0, 10.0]], random_streams.RandomStreams(2).arrivals)
+    my_demand.first_interval_scale[1] = 0.5
+    assert 4.5 <= my_demand.get_interval(0, 1) <= 5.5
+    my_demand.next_car(1)
+    assert 9.0 <= my_demand.get_interval(0, 1) <= 11.0
+    assert 9.0 <= my_demand.get_interval(0, 0) <= 11.0
@@ -0,0 +1,31 @@
+import numpy as np
+
+import car
+import fuel
+
+def make_speeds(number):
+    rng = np.random.default_rng(5)
+    prev_speed = rng.uniform(0.0, 150.0, number)
+    # в том числе большие ускорения, которые car.calculate_consumption суммирует циклом
+    new_speed = np.clip(prev_speed + rng.uniform(-3.0, 3.0, number), 0.0, None)
+    return prev_speed, new_speed
+
+def test_scalar_model_matches_direct_formula():
+    prev_speed, new_speed = make_speeds(2000)
+    for delta_time in [0.05, 0.5]:
+        for prev, new in zip(prev_speed, new_speed):
+            expected = [car.calculate_consumption(prev, new, k, delta_time) for k in range(2)]
+            found = fuel.get_consumption_and_emissions(prev, new, delta_time)
+            assert np.allclose(found, expected, rtol = 1e-10, atol = 0.0)
+
+def test_array_model_matches_direct_formula():
+    prev_speed, new_speed = make_speeds(2000)
+    grid = fuel.ConsumptionGrid()
+    for delta_time in [0.05, 0.5]:
+        expected = np.array([[car.calculate_consumption(prev, new, k, delta_time)
+            for prev, new in zip(prev_speed, new_speed)] for k in range(2)])
+        found = fuel.get_consumption_and_emissions_on_arrays(prev_speed, new_speed, delta_time)
+        assert np.allclose(found, expected, rtol = 1e-10, atol = 0.0)
+        interpolated = fuel.get_consumption_and_emissions_on_arrays(prev_speed, new_speed,
+            delta_time, grid)
+        assert np.allclose(interpolated, expected, rtol = 1e-2, atol = 0.0)
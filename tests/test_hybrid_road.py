@@ -0,0 +1,19 @@
+import context
+import example
+import hybrid_road
+import road
+import speed_manager
+
+def run(engine):
+    my_context = context.SimulationContext(8000, 2000, 3000, 710, 4)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True, incremental = False)
+    updater.fill_sections()
+    return engine(my_context, updater, True).run_headless(0.05, 500.0)
+
+def test_hybrid_results_are_close_to_micro():
+    # дорога и зерно не те, на которых получены hybrid_road.calibrated_cruise_factors
+    micro = run(road.Road)
+    hybrid = run(hybrid_road.HybridRoad)
+    for index, tolerance in [(0, 0.05), (2, 0.05), (4, 0.2)]:
+        assert abs(hybrid[index] - micro[index]) <= tolerance * micro[index]
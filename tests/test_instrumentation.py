@@ -0,0 +1,33 @@
+import context
+import example
+import instrumentation
+import road
+import speed_manager
+
+def run_road(my_instrumentation):
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, 12)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    my_road = road.Road(my_context, updater, True, instrumentation = my_instrumentation)
+    return my_road.run_headless(0.05, 200.0), my_context
+
+def test_instrumentation_does_not_change_results():
+    snapshots = []
+    my_instrumentation = instrumentation.Instrumentation(50.0, snapshots.append)
+    results, my_context = run_road(my_instrumentation)
+    assert run_road(None)[0] == results
+
+    assert my_instrumentation.steps == 4000
+    # снимки через 50 секунд после первого шага; до 200.05 прогон не доходит
+    assert snapshots == my_instrumentation.snapshots
+    assert [round(snapshot['time']) for snapshot in snapshots] == [50, 100, 150]
+    assert snapshots[0]['counters']['merges'] <= snapshots[-1]['counters']['merges']
+    counters = my_instrumentation.counters
+    assert counters['merges'] > 0
+    assert counters['lane_changes'] >= counters['merges']
+    assert counters['lane_change_attempts'] >= counters['lane_changes']
+    assert counters['find_prev_next'] >= counters['lane_change_attempts']
+    assert len(my_instrumentation.cars_on_road) == my_context.lanes_number
+    times = my_instrumentation.times
+    assert times['update'] >= times['update_lane'] + times['update_motion'] > 0.0
@@ -0,0 +1,75 @@
+import math
+import types
+import numpy as np
+
+import lane_index
+
+def make_car(lane, x_coordinate):
+    return types.SimpleNamespace(lane = lane, x_coordinate = x_coordinate, width = 4.0,
+        prev = None, next = None, lane_check_time = 10.0)
+
+def find_prev_next_by_scan(cars, start, end):
+    # перебор всех авто полосы, как до индекса
+    prev = None
+    nextt = None
+    for carr in cars:
+        if (carr.x_coordinate <= end and carr.x_coordinate + carr.width >= start):
+            return None, None, True
+        if (carr.x_coordinate < start and (prev == None or carr.x_coordinate > prev.x_coordinate)):
+            prev = carr
+        if (carr.x_coordinate > end and (nextt == None or carr.x_coordinate < nextt.x_coordinate)):
+            nextt = carr
+    return prev, nextt, False
+
+def test_neighbour_lookup_matches_scan():
+    rng = np.random.default_rng(3)
+    index = lane_index.LaneIndex(3)
+    cars = []
+    for x_coordinate in rng.uniform(0.0, 2000.0, 200):
+        carr = make_car(int(rng.integers(3)), float(x_coordinate))
+        carr.width = float(rng.choice([4.0, 6.0, 12.0]))
+        index.add(carr)
+        cars.append(carr)
+    for start in rng.uniform(-50.0, 2050.0, 500):
+        for lane in range(3):
+            expected = find_prev_next_by_scan([carr for carr in cars if carr.lane == lane],
+                start, start + 5.0)
+            found = index.find_prev_next(lane, start, start + 5.0)
+            assert found[2] == expected[2]
+            assert found[0] is expected[0] and found[1] is expected[1]
+    # ссылки prev/next совпадают с порядком полосы
+    for lane in range(3):
+        ordered = sorted([carr for carr in cars if carr.lane == lane],
+            key = lane_index.get_x)
+        for behind, ahead in zip(ordered, ordered[1:]):
+            assert behind.next is ahead and ahead.prev is behind
+
+def test_entering_neighbour_wakes_postponed_checks():
+    index = lane_index.LaneIndex(3, True)
+    behind = make_car(2, 100.0)
+    ahead = make_car(2, 300.0)
+    between = make_car(1, 200.0)
+    beyond = make_car(1, 400.0)
+    for carr in [behind, ahead, between, beyond]:
+        index.add(carr)
+        carr.lane_check_time = 10.0
+    # новое авто на полосе 2 становится ближайшим соседом только для авто между behind и ahead
+    entering = make_car(2, 210.0)
+    index.add(entering)
+    assert between.lane_check_time == -math.inf
+    assert beyond.lane_check_time == 10.0
+    between.lane_check_time = 10.0
+    index.remove(entering, 2)
+    assert between.lane_check_time == -math.inf
+    assert beyond.lane_check_time == 10.0
+    between.lane_check_time = 10.0
+    # после ухода ahead ближайшим соседом спереди для beyond больше никто не является
+    index.remove(ahead, 2)
+    assert beyond.lane_check_time == -math.inf
+
+def test_wake_is_off_by_default():
+    index = lane_index.LaneIndex(3)
+    other = make_car(1, 200.0)
+    index.add(other)
+    index.add(make_car(2, 200.0))
+    assert other.lane_check_time == 10.0
@@ -0,0 +1,32 @@
+import pytest
+
+import context
+import demand
+import parallel_road
+import speed_manager
+
+def make_road(processes):
+    my_context = context.SimulationContext(6000, 2000, 3000, seed = 0)
+    my_context.demand = demand.Demand([[6.0, 3.0, 3.0]] * 3, my_context.random.arrivals)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    return parallel_road.ParallelRoad(my_context, updater, True, 3, processes)
+
+def test_result_does_not_depend_on_processes():
+    my_road = make_road(0)
+    inline = my_road.run(0.05, 200.0)
+    assert my_road.context.trips.time.count > 0
+    assert make_road(2).run(0.05, 200.0) == inline
+
+def test_run_releases_workers_on_error():
+    my_road = make_road(2)
+    def fail():
+        raise KeyError('step')
+    my_road.step = fail
+    with pytest.raises(KeyError):
+        my_road.run(0.05, 10.0)
+    assert my_road.workers == []
+    assert my_road.state_block == None
+    assert my_road.signs_block == None
+    for segment_road in my_road.segments:
+        assert segment_road.fleet.blocks == []
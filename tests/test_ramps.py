@@ -0,0 +1,13 @@
+import context
+import ramps
+
+def test_braking_end_follows_governing_ramp():
+    my_context = context.SimulationContext(20000, 2000, 3000, seed = 0)
+    ramps.add_on_ramp(my_context, 8000, 8800, [14.0] * 3)
+    # до первого въезда и на нём действует конец первого въезда
+    assert ramps.get_braking_end(my_context, 500.0) == 3000
+    assert ramps.get_braking_end(my_context, 2500.0) == 3000
+    # между въездами торможение уже редкое, а на втором въезде - до его собственного конца
+    assert ramps.get_braking_end(my_context, 5000.0) == 3000
+    assert ramps.get_braking_end(my_context, 8500.0) == 8800
+    assert ramps.get_braking_end(my_context, 15000.0) == 8800
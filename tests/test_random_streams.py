@@ -0,0 +1,43 @@
+import random
+import numpy as np
+
+import context
+import example
+import random_streams
+import speed_manager
+import vector_road
+
+def test_buffered_draws_follow_generator_sequence():
+    streams = random_streams.RandomStreams(7, block_size = 16)
+    children = np.random.SeedSequence(7).spawn(len(random_streams.stream_names))
+    expected = np.random.default_rng(children[0]).random(40)
+    # три блока подряд дают ту же последовательность, что и один вызов генератора
+    assert [streams.braking.random() for i in range(40)] == expected.tolist()
+
+def test_streams_are_independent():
+    first = random_streams.RandomStreams(3)
+    second = random_streams.RandomStreams(3)
+    for i in range(1000):
+        first.braking.random()
+    assert ([first.types.random() for i in range(100)]
+        == [second.types.random() for i in range(100)])
+    other = random_streams.RandomStreams(4)
+    assert first.arrivals.random() != other.arrivals.random()
+
+def run_road(seed):
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, seed)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    return vector_road.VectorRoad(my_context, updater, True).run(0.05, 150.0)
+
+def test_seeded_run_ignores_global_random_state():
+    random.seed(1)
+    np.random.seed(1)
+    first = run_road(8)
+    random.seed(2)
+    np.random.seed(2)
+    random.random()
+    np.random.random(10)
+    assert run_road(8) == first
+    assert run_road(9)[:6] != first[:6]
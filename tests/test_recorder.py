@@ -0,0 +1,58 @@
+import numpy as np
+
+import context
+import recorder
+import replay
+import speed_manager
+
+def make_frames(number):
+    rng = np.random.default_rng(6)
+    frames = []
+    for i in range(number):
+        size = int(rng.integers(0, 12))
+        frames.append({'id': np.arange(size) + i,
+                    'x_coordinate': rng.uniform(0.0, 5000.0, size),
+                    'speed': rng.uniform(0.0, 120.0, size)})
+    return frames
+
+def test_recorded_frames_read_back(tmp_path):
+    frames = make_frames(40)
+    for compress in [False, True]:
+        path = str(tmp_path / str(compress))
+        my_context = context.SimulationContext(5000, 2000, 3000, seed = 0)
+        speed_manager.Updater(my_context, 1000.0, 2, True).fill_sections()
+        my_recorder = recorder.TrajectoryRecorder(path, 0.5, recorder.every_nth_vehicle(2),
+            chunk_rows = 16, compress = compress)
+        my_recorder.start(my_context)
+        for number, frame in enumerate(frames):
+            size = len(frame['id'])
+            signs = np.full((my_context.sections_number, my_context.lanes_number), number)
+            my_recorder.record(0.5 * number, frame['id'], frame['x_coordinate'],
+                np.zeros(size), frame['speed'], np.ones(size), np.zeros(size), signs)
+        my_recorder.close()
+
+        reader = replay.TrajectoryReader(path)
+        assert reader.get_frames_number() == len(frames)
+        # кадр целиком попадает в один блок, поэтому блоков несколько
+        assert reader.frames['chunk'][-1] > 0
+        assert np.all(reader.frames['offset'] + reader.frames['rows'] <= 16)
+        for number, frame in enumerate(frames):
+            cars, signs = reader.get_frame(number)
+            recorded = frame['id'] % 2 == 0
+            assert np.array_equal(cars['id'], frame['id'][recorded])
+            assert np.array_equal(cars['x_coordinate'],
+                frame['x_coordinate'][recorded].astype(np.float32))
+            assert np.all(signs == number)
+        assert reader.find_frame(3.2) == 7
+
+def test_sampling_interval():
+    my_recorder = recorder.TrajectoryRecorder('unused', 0.5)
+    my_recorder.next_sample_time = None
+    # модельное время, накопленное шагами 0.05, попадает на кадры несмотря на округление
+    due = []
+    now = 0.0
+    for step in range(101):
+        if (my_recorder.is_due(now)):
+            due.append(step)
+        now += 0.05
+    assert due == list(range(0, 101, 10))
@@ -0,0 +1,20 @@
+import numpy as np
+
+import context
+import recorder
+import replay
+import speed_manager
+
+def test_replayed_signs_match_recorded_values(tmp_path):
+    my_context = context.SimulationContext(5000, 2000, 3000, seed = 0)
+    speed_manager.Updater(my_context, 1000.0, 2, True).fill_sections()
+    my_recorder = recorder.TrajectoryRecorder(str(tmp_path), 1.0, compress = False)
+    my_recorder.start(my_context)
+    # значения, которые не представимы точно в float32
+    signs = np.full((my_context.sections_number, my_context.lanes_number), 59.7)
+    signs[1, 1] = 83.3
+    my_recorder.record(0.0, [0], [10.0], [20.0], [50.0], [1], [0], signs)
+    my_recorder.close()
+    cars, replayed = replay.TrajectoryReader(str(tmp_path)).get_frame(0)
+    assert np.array_equal(replayed, signs)
+    assert list(cars['id']) == [0]
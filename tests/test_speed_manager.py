@@ -0,0 +1,122 @@
+import numpy as np
+
+import clock
+import context
+import example
+import road
+import speed_manager
+
+def make_updater(algorithm, lanes_number):
+    my_context = context.SimulationContext(5000, 2000, 3000, seed = 0,
+        lanes_number = lanes_number)
+    my_context.clock = clock.SimulatedClock()
+    updater = speed_manager.Updater(my_context, 1000.0, algorithm, True)
+    updater.fill_sections()
+    # алгоритмы 0 и 1 обновляют знаки не чаще, чем раз в 20 секунд
+    my_context.clock.advance(30.0)
+    return my_context, updater
+
+def get_statistics(my_context, avg_speeds, cars_number):
+    """
+    Статистика секций, в которой на каждой основной полосе секции i cars_number[i] авто
+    со средней скоростью avg_speeds[i].
+    """
+    shape = (my_context.sections_number, my_context.lanes_number)
+    numbers = np.zeros(shape)
+    numbers[:, 1:] = np.array(cars_number, dtype = float)[:, np.newaxis]
+    speeds_sum = numbers * np.array(avg_speeds, dtype = float)[:, np.newaxis]
+    return speeds_sum, numbers
+
+def get_sign_lanes_number(lanes_number):
+    # все полосы, кроме самой левой, но не меньше двух (при 3 полосах - полосы 0 и 1)
+    return max(2, lanes_number - 1)
+
+def test_algorithm_0_reduces_and_restores_sign_lanes():
+    for lanes_number in [2, 3, 5, 8]:
+        my_context, updater = make_updater(0, lanes_number)
+        signed = get_sign_lanes_number(lanes_number)
+        slow = [100.0, 100.0, 30.0, 100.0, 100.0]
+        updater.update_speeds_on_statistics(*get_statistics(my_context, slow, [10] * 5))
+        reduced = updater.max_speed * updater.reducing_coefficient
+        assert np.all(my_context.sections_max_speed[2, :signed] == reduced)
+        assert np.all(my_context.sections_max_speed[2, signed:] == updater.max_speed)
+        assert np.all(my_context.sections_max_speed[3] == updater.max_speed)
+
+        my_context.clock.advance(30.0)
+        fast = [100.0] * 5
+        updater.update_speeds_on_statistics(*get_statistics(my_context, fast, [10] * 5))
+        assert np.all(my_context.sections_max_speed == updater.max_speed)
+
+def test_algorithm_1_sets_sign_lanes():
+    for lanes_number in [2, 3, 6]:
+        my_context, updater = make_updater(1, lanes_number)
+        signed = get_sign_lanes_number(lanes_number)
+        avg_speeds = [100.0, 30.0, 100.0, 100.0, 100.0]
+        updater.update_speeds_on_statistics(*get_statistics(my_context, avg_speeds, [10] * 5))
+        signs = my_context.sections_max_speed
+        assert signs[0, 1] < updater.max_speed
+        assert np.all(signs[0, :signed] == signs[0, 1])
+        assert np.all(signs[0, signed:] == updater.max_speed)
+
+def test_section_statistics_match_per_car_loop():
+    my_context, updater = make_updater(2, 3)
+    rng = np.random.default_rng(1)
+    lanes = rng.integers(0, 3, 500)
+    x_coordinates = rng.uniform(0.0, my_context.road_length + 100.0, 500)
+    speeds = rng.uniform(0.0, 120.0, 500)
+    speeds_sum, cars_number = updater.get_section_statistics(lanes, x_coordinates, speeds)
+    expected_sum = np.zeros(speeds_sum.shape)
+    expected_number = np.zeros(cars_number.shape)
+    for lane, x_coordinate, speed in zip(lanes, x_coordinates, speeds):
+        if (x_coordinate < my_context.road_length):
+            section = int(x_coordinate / my_context.each_section_length)
+            expected_sum[section, lane] += speed
+            expected_number[section, lane] += 1
+    assert np.array_equal(cars_number, expected_number)
+    assert np.allclose(speeds_sum, expected_sum, rtol = 1e-12)
+
+def test_algorithm_2_matches_per_section_loop():
+    rng = np.random.default_rng(2)
+    for attempt in range(20):
+        my_context, updater = make_updater(2, 3)
+        my_context.sections_max_speed[:, 1] = rng.choice([100.0, 85.0], 5)
+        my_context.sections_last_update[:, 1] = rng.uniform(0.0, 30.0, 5)
+        avg_speeds = rng.uniform(40.0, 100.0, 5)
+        cars_number = rng.integers(0, 10, 5).astype(float)
+        # поэлементный вариант решения, как до векторизации
+        expected_speed = my_context.sections_max_speed[:, 1].copy()
+        expected_update = my_context.sections_last_update[:, 1].copy()
+        now = my_context.clock.now()
+        for i in range(5):
+            if (cars_number[i] > 4
+                    and avg_speeds[i] < updater.slow_cars_coefficient * expected_speed[i]):
+                expected_speed[i] = updater.max_speed * updater.reducing_coefficient
+                expected_update[i] = now
+            elif (now - expected_update[i] > 20.0):
+                expected_speed[i] = updater.max_speed
+                expected_update[i] = now
+        updater.updated_speeds_on_sections_many_times_each_lane(avg_speeds, cars_number, 1)
+        assert np.array_equal(my_context.sections_max_speed[:, 1], expected_speed)
+        assert np.array_equal(my_context.sections_last_update[:, 1], expected_update)
+
+def run_road(algorithm, incremental):
+    my_context = context.SimulationContext(5000, 2000, 3000, 710, 6)
+    example.fill_demand(my_context)
+    updater = speed_manager.Updater(my_context, 1000.0, algorithm, True,
+        incremental = incremental)
+    updater.fill_sections()
+    results = road.Road(my_context, updater, True).run_headless(0.05, 300.0)
+    return results, my_context.sections_max_speed.copy()
+
+def test_incremental_signs_match_full_signs():
+    for algorithm in [0, 2]:
+        full_results, full_signs = run_road(algorithm, False)
+        results, signs = run_road(algorithm, True)
+        assert np.array_equal(signs, full_signs)
+        assert results == full_results
+    # у алгоритма 1 суммы скоростей складываются в другом порядке
+    full_results, full_signs = run_road(1, False)
+    results, signs = run_road(1, True)
+    assert np.allclose(signs, full_signs, rtol = 1e-9)
+    assert np.allclose(results[:6], full_results[:6], rtol = 1e-9)
+    assert results[6] == full_results[6]
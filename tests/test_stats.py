@@ -0,0 +1,47 @@
+import numpy as np
+
+import stats
+
+def test_running_statistics_match_batch_formulas():
+    rng = np.random.default_rng(4)
+    values = rng.normal(100.0, 15.0, 1000)
+    running = stats.RunningStatistics()
+    # одиночные значения (Уэлфорд) вперемешку с массивами (Чан)
+    for value in values[:300]:
+        running.add(value)
+    running.add_array(values[300:700])
+    running.add_array(values[700:700])
+    for value in values[700:750]:
+        running.add(value)
+    running.add_array(values[750:])
+    assert running.count == len(values)
+    assert np.isclose(running.get_mean(), np.mean(values), rtol = 1e-12)
+    assert np.isclose(running.get_sd(), np.sqrt(np.var(values, ddof = 1)), rtol = 1e-12)
+
+def test_trip_buffers_flush_to_file(tmp_path):
+    path = str(tmp_path / 'trips.npy')
+    rng = np.random.default_rng(5)
+    number = 50
+    car_type = rng.integers(0, 4, number)
+    lanes_visited = rng.integers(1, 8, number)
+    entry_time = rng.uniform(0.0, 100.0, number)
+    exit_time = entry_time + rng.uniform(50.0, 150.0, number)
+    consumption = rng.uniform(5.0, 15.0, number)
+    emissions = rng.uniform(5.0, 15.0, number)
+    with open(path, 'wb') as output:
+        trips = stats.TripStatistics(buffer_size = 8, output = output)
+        for i in range(20):
+            trips.record(car_type[i], lanes_visited[i], entry_time[i], exit_time[i],
+                consumption[i], emissions[i])
+        trips.record_arrays(car_type[20:], lanes_visited[20:], entry_time[20:], exit_time[20:],
+            consumption[20:], emissions[20:])
+        assert trips.size <= 8
+        trips.close()
+    records = stats.read_trips(path)
+    assert len(records) == number
+    assert np.array_equal(records['car_type'], car_type)
+    assert np.array_equal(records['lanes_visited'], lanes_visited)
+    assert np.array_equal(records['exit_time'], exit_time)
+    assert np.array_equal(records['emissions'], emissions)
+    assert np.isclose(trips.time.get_mean(), np.mean(exit_time - entry_time), rtol = 1e-12)
+    assert np.isclose(trips.consumption.get_sd(), np.std(consumption, ddof = 1), rtol = 1e-12)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import clock
+import context
+import demand
+import speed_manager
+import step_control
+import vector_road
+
+def test_default_bounds_follow_base_step():
+    stepper = step_control.AdaptiveStep(base_step = 0.1)
+    assert stepper.min_step < 0.1 < stepper.max_step
+
+def test_motion_step_shrinks_when_closing_in():
+    stepper = step_control.AdaptiveStep()
+    lanes = np.array([1, 1])
+    x_coordinates = np.array([100.0, 108.0])
+    widths = np.array([5.0, 5.0])
+    stop_coordinates = np.full(2, np.inf)
+    free = stepper.get_motion_step(lanes, x_coordinates, np.array([20.0, 20.0]), widths,
+        stop_coordinates)
+    closing = stepper.get_motion_step(lanes, x_coordinates, np.array([30.0, 5.0]), widths,
+        stop_coordinates)
+    assert free >= stepper.max_step
+    assert closing < stepper.base_step
+
+def test_step_shrinks_under_congestion():
+    my_context = context.SimulationContext(5000, 2000, 3000, seed = 1)
+    my_context.clock = clock.SimulatedClock()
+    my_context.demand = demand.Demand([[2.0, 1.0, 1.0]] * 3, my_context.random.arrivals)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    my_road = vector_road.VectorRoad(my_context, updater, True)
+    my_road.init_state()
+    stepper = step_control.AdaptiveStep()
+    steps = []
+    while (my_context.clock.now() < 200.0):
+        steps.append(stepper.get_step(my_road))
+        my_context.clock.advance(steps[-1])
+        my_road.step()
+    assert min(steps) < stepper.base_step
+    assert stepper.shortened_steps > 0
+    assert max(steps) > stepper.base_step
+
+def make_road():
+    my_context = context.SimulationContext(3000, 1000, 1500, seed = 2)
+    my_context.demand = demand.Demand([[6.0, 2.0, 2.0]] * 3, my_context.random.arrivals)
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    return vector_road.VectorRoad(my_context, updater, True)
+
+def test_reference_without_trips_is_rejected():
+    with pytest.raises(ValueError):
+        step_control.compare_with_reference(make_road, 20.0, step_control.AdaptiveStep())
+
+def test_error_is_within_tolerance():
+    stepper = step_control.AdaptiveStep()
+    errors, speed, reference_speed = step_control.fit_to_tolerance(make_road, 150.0, stepper,
+        tolerance = 0.05, reference_step = 0.02)
+    assert max(errors) <= 0.05
+    # с шагами по умолчанию отклонение выбросов больше допуска, поэтому шаги уменьшены
+    assert stepper.gap_fraction < step_control.AdaptiveStep().gap_fraction
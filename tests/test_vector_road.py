@@ -0,0 +1,13 @@
+import pytest
+
+import context
+import speed_manager
+import vector_road
+
+def test_lane_change_cooldown_is_rejected():
+    my_context = context.SimulationContext(5000, 2000, 3000, seed = 0)
+    my_context.lane_change_cooldown = 1.0
+    updater = speed_manager.Updater(my_context, 1000.0, 2, True)
+    updater.fill_sections()
+    with pytest.raises(ValueError):
+        vector_road.VectorRoad(my_context, updater, True)
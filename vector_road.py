@@ -0,0 +1,681 @@
+"""
+Векторизованный движок симуляции. Состояние всех автомобилей хранится не в отдельных объектах
+car.Car, а в непрерывных массивах NumPy (структура массивов, класс Fleet): координаты, скорости,
+полосы, ускорения, замедления, максимальные скорости и т.д. Продольная динамика (безопасная
+скорость, ограничение максимальной скорости, случайное торможение, интегрирование координаты)
+и перестроения вычисляются для всего потока сразу несколькими операциями над массивами.
+
+Правила движения совпадают с car.Car.update, с одним отличием: все автомобили обновляются
+одновременно по состоянию на начало шага, тогда как в car.Car.update авто, обновляемое позже,
+уже видит новые координаты обновлённых ранее соседей. Если на одном шаге несколько авто
+претендуют на один и тот же промежуток на соседней полосе, перестраивается только переднее из них.
+"""
+
+import collections
+import numpy as np
+
+import car
+import clock
+import context as context_module
+import fuel
+import ramps
+import road
+import stats
+
+"""
+Столбцы структуры массивов: имя, тип и количество значений на один автомобиль ('lanes' -
+по значению на каждую полосу).
+"""
+fleet_columns = [('id', np.int64, 1),
+                ('x_coordinate', np.float64, 1),
+                ('y_coordinate', np.float64, 1),
+                ('speed', np.float64, 1),
+                ('lane', np.int64, 1),
+                ('lanes_visited', np.uint8, 1),
+                ('acceleration', np.float64, 1),
+                ('deceleration', np.float64, 1),
+                ('width', np.float64, 1),
+                ('self_top_speed', np.float64, 1),
+                ('cur_top_speed', np.float64, 'lanes'),
+                ('car_type', np.int64, 1),
+                ('start_time', np.float64, 1),
+                ('time_on_left', np.float64, 1),
+                ('speed_increased', np.bool_, 1),
+                ('only_right', np.bool_, 1),
+                ('top_speed_updated_times', np.int64, 1),
+                ('consumption', np.float64, 1),
+                ('emissions', np.float64, 1),
+                ('consumption_number', np.float64, 1),
+                ('ramp', np.int64, 1),
+                ('exit_ramp', np.int64, 1)]
+
+def get_safe_speed(speed, next_speed, x_coordinate, next_x_coordinate, width, dec):
+    """
+    Векторный аналог car.get_safe_speed.
+    """
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        reaction_time = 0.5
+        dist_between_cars = next_x_coordinate - x_coordinate - width
+        braking_time = (speed - next_speed) / dec
+        safe_speed = (next_speed + (dist_between_cars - car.get_safe_distance(speed))
+            / (braking_time + reaction_time))
+    safe_speed = np.where(speed <= next_speed, 200.0, safe_speed)
+    return np.where(x_coordinate >= next_x_coordinate - 10.0, next_speed, safe_speed)
+
+def get_leader_safe_speed(speed, x_coordinate, width, dec, has_next, next_speed,
+        next_x_coordinate):
+    """
+    Векторный аналог car.Car.get_safe_speed (безопасная скорость относительно впереди идущего).
+    """
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        reaction_time = 1.0
+        dist_between_cars = next_x_coordinate - x_coordinate - width
+        braking_time = (speed - next_speed) / dec
+        safe_speed = (next_speed + (dist_between_cars - car.get_safe_distance(speed))
+            / (braking_time + reaction_time))
+    safe_speed = np.where(x_coordinate >= next_x_coordinate - 10.0, next_speed, safe_speed)
+    return np.where(~has_next | (speed <= next_speed), 200.0, safe_speed)
+
+def find_leaders(lanes, x_coordinates):
+    """
+    Возвращает порядок авто, отсортированных по полосе и координате, и индекс впереди идущего
+    авто на той же полосе для каждого авто (-1, если такого нет).
+    """
+    order = np.lexsort((x_coordinates, lanes))
+    leaders = np.full(len(lanes), -1, dtype = np.int64)
+    same_lane = lanes[order[1:]] == lanes[order[:-1]]
+    leaders[order[:-1][same_lane]] = order[1:][same_lane]
+    return order, leaders
+
+class Fleet():
+    def __init__(self, capacity = 1024, lanes_number = 3, columns = None):
+        if (columns == None):
+            columns = fleet_columns
+        self.size = 0
+        self.capacity = capacity
+        self.columns = [(name, dtype, lanes_number if count == 'lanes' else count)
+            for name, dtype, count in columns]
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Создаёт пустые столбцы на capacity авто.
+        """
+        for name, dtype, count in self.columns:
+            if (count == 1):
+                setattr(self, name, np.zeros(capacity, dtype = dtype))
+            else:
+                setattr(self, name, np.zeros((capacity, count), dtype = dtype))
+
+    def grow(self, capacity = None):
+        if (capacity == None):
+            capacity = 2 * self.capacity
+        old = dict((name, getattr(self, name)[:self.size]) for name, dtype, count in self.columns)
+        self.capacity = capacity
+        self.allocate(capacity)
+        for name, dtype, count in self.columns:
+            getattr(self, name)[:self.size] = old[name]
+
+    def add(self, values):
+        if (self.size == self.capacity):
+            self.grow()
+        for name, value in values.items():
+            getattr(self, name)[self.size] = value
+        self.size += 1
+
+    def append_from(self, fleet, indices):
+        """
+        Добавляет в конец копии авто fleet с индексами indices.
+        """
+        new_size = self.size + len(indices)
+        if (new_size > self.capacity):
+            self.grow(max(2 * self.capacity, new_size))
+        for name, dtype, count in self.columns:
+            getattr(self, name)[self.size:new_size] = getattr(fleet, name)[indices]
+        self.size = new_size
+
+    def remove(self, mask):
+        keep = ~mask
+        new_size = int(np.count_nonzero(keep))
+        for name, dtype, count in self.columns:
+            column = getattr(self, name)
+            column[:new_size] = column[:self.size][keep]
+        self.size = new_size
+
+    def find(self, car_id):
+        """
+        Индекс авто по его id или -1. Авто добавляются с возрастающими id, а удаление сохраняет
+        порядок, поэтому массив id всегда отсортирован.
+        """
+        index = int(np.searchsorted(self.id[:self.size], car_id))
+        if (index < self.size and self.id[index] == car_id):
+            return index
+        return -1
+
+class VectorRoad():
+    def __init__(self, context, updater, adaptive_top_speed, consumption_grid = None,
+            trips_path = None, recorder = None):
+        # векторные движки проверяют соседей для перестроения всех авто на каждом шаге
+        if (context.lane_change_cooldown != None):
+            raise ValueError("lane_change_cooldown is supported only by road.Road")
+        self.context = context
+        self.updater = updater
+        self.width = context.road_length
+        self.height = context.height
+        self.avg_time = 0.0
+        self.sd_time = 0.0
+        self.avg_consumption = 0.0
+        self.sd_consumption = 0.0
+        self.avg_emissions = 0.0
+        self.sd_emissions = 0.0
+        self.adaptive_top_speed = adaptive_top_speed
+        self.consumption_grid = consumption_grid
+        self.trips_path = trips_path
+        self.recorder = recorder
+
+    def init_state(self):
+        now = self.context.clock.now()
+        lanes_number = self.context.lanes_number
+        self.fleet = Fleet(lanes_number = lanes_number)
+        self.next_id = 0
+        self.cars_number = [[[0, 0] for lane in range(lanes_number)]
+            for hour in range(len(road.delta_time_for_hour))]
+        self.produced = [0] * lanes_number
+        self.sources = road.get_sources(self.context)
+        self.prev_car_time = [now] * len(self.sources)
+        self.cur_time = now
+        self.cars_queue = [collections.deque() for source in self.sources]
+        self.last_car = [None] * len(self.sources)
+        self.init_ramps()
+        trips_output = None
+        if (self.trips_path != None):
+            trips_output = open(self.trips_path, 'wb')
+        self.context.trips = stats.TripStatistics(output = trips_output)
+        if (self.recorder != None):
+            self.recorder.start(self.context)
+        self.hour = 0
+        self.start_time = now
+        self.updater.reset_timers()
+
+    def init_ramps(self):
+        # номер въезда и съезда авто -1 (нет въезда или съезда) указывает на последний элемент
+        on_ramps = self.context.on_ramps
+        off_ramps = self.context.off_ramps
+        self.ramp_starts = np.array([ramp.start for ramp in on_ramps] + [0.0])
+        self.ramp_ends = np.array([ramp.end for ramp in on_ramps] + [np.inf])
+        self.exit_positions = np.array([ramp.position for ramp in off_ramps] + [np.inf])
+        self.exit_approaches = np.array([ramp.position - ramp.approach for ramp in off_ramps]
+            + [np.inf])
+        # въезды по возрастанию начала для ramps.get_braking_end
+        order = np.argsort([ramp.start for ramp in on_ramps], kind = 'stable')
+        self.braking_starts = np.array([on_ramps[i].start for i in order], dtype = np.float64)
+        self.braking_ends = np.array([on_ramps[i].end for i in order], dtype = np.float64)
+
+    def produce_car(self, source):
+        # ----cars production----
+        now = self.context.clock.now()
+        lane, ramp = self.sources[source]
+        if (ramp == None):
+            source_demand = self.context.demand
+            demand_lane = lane
+        else:
+            source_demand = ramp.get_demand(self.context)
+            demand_lane = ramp.demand_lane
+        time_interval = source_demand.get_interval(self.hour, demand_lane)
+        if (now - self.prev_car_time[source] > time_interval):
+            hour = self.hour
+            cars_numbers = road.get_cars_numbers(hour, lane)
+            A_B_type_probability = 1.0 * cars_numbers[0] / (cars_numbers[0] + cars_numbers[1])
+            A_B = int(self.context.random.types.bernoulli(1.0 - A_B_type_probability))
+            first_or_second = int(self.context.random.types.bernoulli(0.5))
+            car_type = 2 * A_B + first_or_second
+            startX = -road.cars_sizes[car_type]
+            ramp_number = -1
+            if (ramp != None):
+                startX += ramp.start
+                ramp_number = self.context.on_ramps.index(ramp)
+            top_speed = road.max_speeds[car_type]
+            if (lane == 0):
+                top_speed *= 0.8
+            jitter = self.context.random.jitter
+            new_car = {'id': self.next_id,
+                        'x_coordinate': startX,
+                        'y_coordinate': context_module.get_lane_y(lane, self.height),
+                        'speed': top_speed,
+                        'lane': lane,
+                        'lanes_visited': 1 << lane,
+                        'acceleration': jitter.uniform(0.95, 1.05) * road.accelerations[car_type],
+                        'deceleration': jitter.uniform(0.95, 1.05) * road.decelerations[car_type],
+                        'width': road.cars_sizes[car_type],
+                        'self_top_speed': road.max_speeds[car_type],
+                        'cur_top_speed': top_speed,
+                        'car_type': car_type,
+                        'start_time': now,
+                        'time_on_left': now,
+                        'speed_increased': False,
+                        'only_right': self.context.random.types.bernoulli(0.2),
+                        'top_speed_updated_times': 0,
+                        'consumption': 0.0,
+                        'emissions': 0.0,
+                        'consumption_number': 0.0,
+                        'ramp': ramp_number,
+                        'exit_ramp': -1}
+            if (len(self.context.off_ramps) > 0):
+                off_ramp = ramps.choose_off_ramp(self.context, startX)
+                if (off_ramp != None):
+                    new_car['exit_ramp'] = self.context.off_ramps.index(off_ramp)
+            self.next_id += 1
+            if (self.last_car[source] == None):
+                self.last_car[source] = new_car['id']
+                self.add_car(new_car)
+            else:
+                self.cars_queue[source].append(new_car)
+            self.cars_number[hour][lane][A_B] += 1
+            self.produced[lane] += 1
+            self.prev_car_time[source] = now
+            source_demand.next_car(demand_lane)
+        # -----------------------
+
+    def add_car_on_road(self, source):
+        # ----cars adding----
+        lane, ramp = self.sources[source]
+        dist = 25.0
+        if (ramp != None):
+            dist += ramp.start
+        if (len(self.cars_queue[source]) > 0):
+            x = self.get_car_x(self.last_car[source])
+            if (x == None or np.floor(x + 0.5) > dist):
+                new_car = self.cars_queue[source].popleft()
+                self.last_car[source] = new_car['id']
+                self.add_car(new_car)
+        # -------------------
+
+    def add_car(self, new_car):
+        self.fleet.add(new_car)
+
+    def get_car_x(self, car_id):
+        """
+        Координата авто car_id или None, если авто уже покинуло дорогу.
+        """
+        index = self.fleet.find(car_id)
+        if (index == -1):
+            return None
+        return self.fleet.x_coordinate[index]
+
+    def update_lateral_movement(self):
+        fleet = self.fleet
+        n = fleet.size
+        y = fleet.y_coordinate[:n]
+        target = context_module.get_lane_y(fleet.lane[:n], self.height)
+        moving = y != target
+        up = moving & (y > target)
+        down = moving & (y < target)
+        y[up] = np.maximum(y[up] - self.context.delta_time * 20, target[up])
+        y[down] = np.minimum(y[down] + self.context.delta_time * 20, target[down])
+        arrived_left = up & (y == target) & (fleet.lane[:n] >= 2)
+        fleet.time_on_left[:n][arrived_left] = self.context.clock.now()
+        fleet.speed_increased[:n][arrived_left] = False
+        return y != target
+
+    def update_top_speeds(self, sections_max_speeds):
+        fleet = self.fleet
+        n = fleet.size
+        times = fleet.top_speed_updated_times[:n]
+        rect_x = np.floor(fleet.x_coordinate[:n] + 0.5)
+        entered = ((self.context.each_section_length * times < rect_x) & (fleet.lane[:n] != 0)
+            & (times < len(sections_max_speeds)))
+        indices = np.flatnonzero(entered)
+        if (len(indices) == 0):
+            return
+        for lane in range(1, self.context.lanes_number):
+            minimum = np.minimum(sections_max_speeds[times[indices], lane],
+                fleet.self_top_speed[indices])
+            fleet.cur_top_speed[indices, lane] = self.context.random.jitter.uniform_array(
+                0.95 * minimum, 1.01 * minimum)
+        fleet.speed_increased[indices] = False
+        fleet.top_speed_updated_times[indices] += 1
+
+    def find_lane_change_targets(self, order, bounds, candidates, desirable_lane):
+        """
+        Векторный аналог car.Car.find_prev_next: для каждого кандидата находит соседей на
+        полосе desirable_lane и проверяет, не пересекается ли кандидат с авто на этой полосе.
+        Авто полосы lane занимают в order отрезок от bounds[lane] до bounds[lane + 1].
+        """
+        fleet = self.fleet
+        lane_cars = order[bounds[desirable_lane]:bounds[desirable_lane + 1]]
+        start = fleet.x_coordinate[candidates]
+        end = start + fleet.width[candidates]
+        if (len(lane_cars) == 0):
+            no_cars = np.zeros(len(candidates), dtype = bool)
+            return no_cars, no_cars, no_cars, candidates, candidates
+        lane_x = fleet.x_coordinate[lane_cars]
+        lane_ends = np.maximum.accumulate(lane_x + fleet.width[lane_cars])
+        position = np.searchsorted(lane_x, start, 'left')
+        has_prev = position > 0
+        has_next = position < len(lane_cars)
+        prev_position = np.maximum(position - 1, 0)
+        intersection = ((has_prev & (lane_ends[prev_position] >= start))
+            | (np.searchsorted(lane_x, end, 'right') > position))
+        prev = lane_cars[prev_position]
+        nextt = lane_cars[np.minimum(position, len(lane_cars) - 1)]
+        return intersection, has_prev, has_next, prev, nextt
+
+    def is_safe_moving(self, candidates, intersection, has_prev, has_next, prev, nextt):
+        """
+        Векторный аналог car.Car.is_safe_moving.
+        """
+        fleet = self.fleet
+        speed = fleet.speed[candidates]
+        x = fleet.x_coordinate[candidates]
+        width = fleet.width[candidates]
+        prev_speed = fleet.speed[prev]
+        prev_x = fleet.x_coordinate[prev]
+        prev_width = fleet.width[prev]
+        safe_speed_for_prev = get_safe_speed(prev_speed, speed, prev_x, x, prev_width,
+            fleet.deceleration[prev])
+        prev_ok = ~has_prev | ((prev_speed - 5 < safe_speed_for_prev)
+            & (x - (prev_x + prev_width) > car.get_safe_distance(prev_speed)))
+        next_x = fleet.x_coordinate[nextt]
+        safe_speed_for_me = get_safe_speed(speed, fleet.speed[nextt], x, next_x, width,
+            fleet.deceleration[candidates])
+        next_bad = has_next & ((speed >= safe_speed_for_me + 5)
+            | (next_x - (x + width) < car.get_safe_distance(speed)))
+        return ~intersection & prev_ok & ~next_bad
+
+    def change_lanes(self, order, leaders, moving):
+        fleet = self.fleet
+        n = fleet.size
+        lanes = fleet.lane[:n]
+        x = fleet.x_coordinate[:n]
+        has_leader = leaders >= 0
+        leader = np.maximum(leaders, 0)
+        safe_speed = get_leader_safe_speed(fleet.speed[:n], x, fleet.width[:n],
+            fleet.deceleration[:n], has_leader, fleet.speed[leader], x[leader])
+
+        lanes_number = self.context.lanes_number
+        keys = self.get_lane_keys(lanes)
+        bounds = np.searchsorted(keys[order], np.arange(self.get_lane_keys_number() + 1))
+        # перестроения вправо, влево и с полосы разгона; авто, которое может перестроиться
+        # вправо, влево не перестраивается, а авто перед своим съездом перестраивается вправо
+        # без проверки скоростей и не обгоняет
+        exiting = x > self.exit_approaches[fleet.exit_ramp[:n]]
+        to_right = (lanes >= 2) & ~moving & (x > 50.0)
+        to_left = ((lanes >= 1) & (lanes < lanes_number - 1) & ~moving & ~fleet.only_right[:n]
+            & ~exiting & (x > 50.0))
+        # кандидаты на въезд ищутся только среди авто полосы разгона
+        ramp_cars = np.flatnonzero(lanes == 0)
+        merging = np.zeros(n, dtype = bool)
+        merging[ramp_cars[x[ramp_cars] > 50.0 + self.ramp_starts[fleet.ramp[ramp_cars]]]] = True
+        right_safe = np.zeros(n, dtype = bool)
+        changed = []
+        targets = []
+        new_lanes = []
+        for direction, mask in [(-1, to_right), (1, to_left), (0, merging)]:
+            if (direction == 1):
+                mask &= ~right_safe
+            all_candidates = np.flatnonzero(mask)
+            if (len(all_candidates) == 0):
+                continue
+            if (direction == 0):
+                desirable_lanes = np.ones(len(all_candidates), dtype = np.int64)
+            else:
+                desirable_lanes = lanes[all_candidates] + direction
+            for desirable_lane in np.unique(desirable_lanes):
+                candidates = all_candidates[desirable_lanes == desirable_lane]
+                intersection, has_prev, has_next, prev, nextt = self.find_lane_change_targets(
+                    order, bounds, candidates, desirable_lane)
+                safe = self.is_safe_moving(candidates, intersection, has_prev, has_next, prev,
+                    nextt)
+                if (direction != 0):
+                    safe_speed_other = np.where(has_next, get_safe_speed(fleet.speed[candidates],
+                        fleet.speed[nextt], x[candidates], x[nextt], fleet.width[candidates],
+                        fleet.deceleration[candidates]), 200.0)
+                    own_safe_speed = safe_speed[candidates]
+                    own_top_speed = fleet.cur_top_speed[candidates, lanes[candidates]]
+                    if (direction == -1):
+                        safe &= (exiting[candidates] | ((own_safe_speed > own_top_speed)
+                            & (safe_speed_other > fleet.cur_top_speed[candidates, desirable_lane])))
+                        right_safe[candidates[safe]] = True
+                    else:
+                        congested = ((own_safe_speed < car.trash_speed)
+                            & (safe_speed_other < car.trash_speed))
+                        safe &= (own_safe_speed < own_top_speed) & ~congested
+                # ----one car per gap----
+                gap = np.where(has_next, nextt, -1)
+                desirable_keys = keys[candidates] - lanes[candidates] + desirable_lane
+                changed.append(candidates[safe])
+                targets.append(desirable_keys[safe] * (n + 1) + gap[safe] + 1)
+                new_lanes.append(np.full(np.count_nonzero(safe), desirable_lane))
+        if (len(changed) == 0):
+            return
+        changed = np.concatenate(changed)
+        targets = np.concatenate(targets)
+        new_lanes = np.concatenate(new_lanes)
+        by_gap = np.lexsort((-x[changed], targets))
+        first_in_gap = np.ones(len(by_gap), dtype = bool)
+        first_in_gap[1:] = targets[by_gap[1:]] != targets[by_gap[:-1]]
+        selected = by_gap[first_in_gap]
+        changed = changed[selected]
+        lanes[changed] = new_lanes[selected]
+        fleet.lanes_visited[changed] |= (1 << lanes[changed]).astype(np.uint8)
+
+    def update_speeds(self, leaders):
+        fleet = self.fleet
+        n = fleet.size
+        lanes = fleet.lane[:n]
+        speed = fleet.speed[:n]
+        x = fleet.x_coordinate[:n]
+        dt = self.context.delta_time
+        cur_top_speed = fleet.cur_top_speed[np.arange(n), lanes]
+
+        br_pr = np.where(lanes >= 2, 0.08, 0.3)
+        br_pr[speed < 40.0] = 0.05
+        braking_ends = self.braking_ends[np.maximum(
+            np.searchsorted(self.braking_starts, x, side = 'right') - 1, 0)]
+        br_pr[x > braking_ends] = 0.05
+
+        has_leader = leaders >= 0
+        leader = np.maximum(leaders, 0)
+        safe_speed = get_leader_safe_speed(speed, x, fleet.width[:n], fleet.deceleration[:n],
+            has_leader, fleet.speed[leader], x[leader])
+        ramp = fleet.ramp[:n]
+        on_ramp_alone = (lanes == 0) & (~has_leader | (ramp[leader] != ramp))
+        if (np.any(on_ramp_alone)):
+            safe_speed[on_ramp_alone] = get_safe_speed(speed[on_ramp_alone], 0.0,
+                x[on_ramp_alone], self.ramp_ends[ramp[on_ramp_alone]],
+                fleet.width[:n][on_ramp_alone], fleet.deceleration[:n][on_ramp_alone])
+
+        new_speed = np.minimum(np.minimum(cur_top_speed, speed + fleet.acceleration[:n] * dt),
+            safe_speed)
+        braking = self.draw_random('braking', n) < br_pr
+        new_speed[braking] -= fleet.deceleration[:n][braking] * dt
+        new_speed = np.where(lanes > 0, np.maximum(new_speed, 10.0), np.maximum(new_speed, 0.0))
+        too_fast = speed > cur_top_speed
+        new_speed[too_fast] = speed[too_fast] - fleet.deceleration[:n][too_fast] * dt
+
+        consumption, emissions = fuel.get_consumption_and_emissions_on_arrays(speed, new_speed, dt,
+            self.consumption_grid)
+        fleet.consumption[:n] += consumption * dt
+        fleet.emissions[:n] += emissions * dt
+        fleet.consumption_number[:n] += 2 * dt
+        speed[:] = new_speed
+        x += speed * dt
+
+    def remove_finished_cars(self):
+        fleet = self.fleet
+        n = fleet.size
+        x = fleet.x_coordinate[:n]
+        finished = np.floor(x + 0.5) > self.context.road_length
+        # у съезда авто покидает дорогу с первой полосы, иначе проезжает съезд
+        at_exit = x >= self.exit_positions[fleet.exit_ramp[:n]]
+        finished |= at_exit & (fleet.lane[:n] == 1)
+        fleet.exit_ramp[:n][at_exit & ~finished] = -1
+        if (np.any(finished)):
+            self.record_trips(finished)
+            fleet.remove(finished)
+
+    def record_trips(self, finished):
+        """
+        Записывает в статистику поездок авто, отмеченные маской finished.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        consumption_number = fleet.consumption_number[:n][finished]
+        self.context.trips.record_arrays(fleet.car_type[:n][finished],
+            fleet.lanes_visited[:n][finished], fleet.start_time[:n][finished],
+            np.full(len(consumption_number), self.context.clock.now()),
+            fleet.consumption[:n][finished] / consumption_number,
+            fleet.emissions[:n][finished] / consumption_number)
+
+    def update_time(self, now):
+        #----update hour----
+        if (self.hour < 3 and now - self.start_time > road.delta_time_for_hour[self.hour]):
+            self.hour += 1
+            self.start_time = now
+        #-------------------
+
+        self.context.delta_time = now - self.cur_time
+        self.cur_time = now
+
+    def update_signs(self):
+        n = self.fleet.size
+        self.updater.update_speeds_on_arrays(self.fleet.lane[:n], self.fleet.x_coordinate[:n],
+            self.fleet.speed[:n])
+
+    def produce_cars(self):
+        # ----cars production----
+        if (self.hour < 3):
+            for source in range(len(self.sources)):
+                self.produce_car(source)
+        # -----------------------
+
+    def add_cars(self):
+        # ----cars adding----
+        for source in range(len(self.sources)):
+            self.add_car_on_road(source)
+        # -------------------
+
+    def step(self):
+        now = self.context.clock.now()
+        self.update_time(now)
+
+        # ----updating max speeds on sections----
+        self.update_signs()
+        # ---------------------------------------
+
+        self.produce_cars()
+        self.add_cars()
+
+        if (self.fleet.size == 0):
+            return
+        self.update_lanes(now)
+        self.update_motion()
+        self.remove_finished_cars()
+
+        if (self.recorder != None and self.recorder.is_due(now)):
+            self.record_frame(now)
+
+    def update_lanes(self, now):
+        """
+        Смена полосы: обновление желаемых скоростей, движение между полосами и перестроения.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        # ----time on the left lane----
+        lanes = fleet.lane[:n]
+        bonus = np.flatnonzero((lanes >= 2) & ~fleet.speed_increased[:n]
+            & (now - fleet.time_on_left[:n] > 10.0))
+        fleet.cur_top_speed[bonus, lanes[bonus]] += 10.0
+        fleet.speed_increased[:n][bonus] = True
+        fleet.time_on_left[:n][bonus] = now
+        # -----------------------------
+
+        self.update_top_speeds(self.context.sections_max_speed)
+        moving = self.update_lateral_movement()
+
+        order, leaders = find_leaders(self.get_lane_keys(fleet.lane[:n]), fleet.x_coordinate[:n])
+        self.change_lanes(order, leaders, moving)
+
+    def update_motion(self):
+        """
+        Продольное движение по полосам, занятым после перестроений.
+        """
+        fleet = self.fleet
+        n = fleet.size
+        order, leaders = find_leaders(self.get_lane_keys(fleet.lane[:n]), fleet.x_coordinate[:n])
+        self.update_speeds(leaders)
+
+    def get_lane_keys(self, lanes):
+        """
+        Ключи полос для поиска соседей: авто видят друг друга, только если ключи их полос
+        совпадают. У одной дороги ключ - сама полоса (см. batch_road).
+        """
+        return lanes
+
+    def get_lane_keys_number(self):
+        return self.context.lanes_number
+
+    def draw_random(self, name, size):
+        """
+        size равномерно распределённых на [0, 1) чисел из потока name генераторов контекста.
+        """
+        return getattr(self.context.random, name).random_array(size)
+
+    def get_motion_arrays(self):
+        fleet = self.fleet
+        n = fleet.size
+        lanes = fleet.lane[:n]
+        return (lanes, fleet.x_coordinate[:n], fleet.speed[:n], fleet.width[:n],
+            np.where(lanes == 0, self.ramp_ends[fleet.ramp[:n]], np.inf))
+
+    def record_frame(self, now):
+        fleet = self.fleet
+        n = fleet.size
+        self.recorder.record(now, fleet.id[:n], fleet.x_coordinate[:n], fleet.y_coordinate[:n],
+            fleet.speed[:n], fleet.lane[:n], fleet.car_type[:n], self.context.sections_max_speed)
+
+    def is_production_finished(self):
+        """
+        Авто уже выпускались и очереди появления на основных полосах пусты.
+        """
+        lanes = range(1, self.context.lanes_number)
+        return (any(self.produced[lane] > 0 for lane in lanes)
+            and all(len(self.cars_queue[source]) == 0
+            for source in range(len(self.sources)) if self.sources[source][1] == None))
+
+    def is_finished(self):
+        n = self.fleet.size
+        return self.is_production_finished() and not np.any(self.fleet.lane[:n] > 0)
+
+    def finish(self):
+        if (self.recorder != None):
+            self.recorder.close()
+        self.context.trips.close()
+        if (self.context.trips.output != None):
+            self.context.trips.output.close()
+
+    def get_results(self):
+        (self.avg_time, self.sd_time, self.avg_consumption, self.sd_consumption, self.avg_emissions,
+            self.sd_emissions) = self.context.trips.get_results()
+        return (self.avg_time, self.sd_time, self.avg_consumption, self.sd_consumption,
+            self.avg_emissions, self.sd_emissions, self.cars_number)
+
+    def run(self, time_step = 0.05, max_time = None, time_stepper = None):
+        """
+        Безоконный прогон с шагом time_step или с шагом, который выбирает time_stepper
+        (step_control.AdaptiveStep).
+        """
+        self.context.clock = clock.SimulatedClock()
+        self.init_state()
+        try:
+            while not self.is_finished():
+                if (time_stepper != None):
+                    time_step = time_stepper.get_step(self)
+                self.context.clock.advance(time_step)
+                self.step()
+                if (max_time != None and self.context.clock.now() >= max_time):
+                    break
+        finally:
+            # parallel_road.ParallelRoad освобождает здесь процессы и разделяемую память
+            self.finish()
+        return self.get_results()